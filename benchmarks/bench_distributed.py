@@ -0,0 +1,138 @@
+"""
+Benchmark: crawl throughput of one crawler process vs N sharded workers.
+
+Serves synthetic HTML pages (unique per URL, ``--page-kb`` each, so
+parsing and scoring cost real CPU) from a local aiohttp server on
+``--hosts`` loopback addresses, each a separate site, then crawls the same
+URL list once with ``crawl_all_topics`` and once with
+``crawl_distributed`` per worker count. Every run starts from an empty
+output directory (no cache hits). Throughput can only scale up to the
+number of free cores; the server process needs one as well.
+
+Usage:
+    python benchmarks/bench_distributed.py --urls 4000 --workers 1,2,4,8
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Workers re-import this module; they must see the same scratch config.
+if "BENCH_DISTRIBUTED_DIR" not in os.environ:
+    os.environ["BENCH_DISTRIBUTED_DIR"] = tempfile.mkdtemp(prefix="bench_distributed_")
+    _config_path = Path(os.environ["BENCH_DISTRIBUTED_DIR"]) / "crawler_config.yaml"
+    _config_path.write_text(
+        json.dumps(
+            {
+                "output_dir": str(Path(os.environ["BENCH_DISTRIBUTED_DIR"]) / "out"),
+                "concurrency": 50,
+                "rate_limit": 0.0,
+                "log_level": "WARNING",
+                "dedup": {"near_duplicates": "off"},
+                "topics": [{"id": 1, "name": "Bench", "keywords": ["deep learning"]}],
+            }
+        )
+    )
+    os.environ["CRAWLER_CONFIG"] = str(_config_path)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.async_crawler import crawl_all_topics
+from crawlers.distributed import crawl_distributed
+
+PORT = 8799
+WORDS = "deep learning model design network data system guide paper index".split()
+
+
+def serve(page_kb: int, latency: float) -> None:
+    from aiohttp import web
+
+    paragraph = " ".join(WORDS * 4)
+    count = max(1, page_kb * 1024 // (len(paragraph) + 40))
+
+    async def page(request):
+        await asyncio.sleep(latency)
+        n = request.match_info["n"]
+        body = "".join(
+            f"<p>{paragraph} {n}-{i} <a href='/p/{n}-{i}'>link</a></p>" for i in range(count)
+        )
+        return web.Response(
+            text=f"<html><head><title>Page {n}</title></head><body>{body}</body></html>",
+            content_type="text/html",
+        )
+
+    app = web.Application()
+    app.router.add_get("/p/{n}", page)
+    web.run_app(app, host="0.0.0.0", port=PORT, print=None)
+
+
+def reset_output() -> None:
+    for path in config.BASE_DIR.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+    config.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    config.PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def seed(urls) -> None:
+    discovered = {"1": {"tech_id": 1, "urls": urls, "count": len(urls)}}
+    (config.BASE_DIR / "discovered_urls_enhanced.json").write_text(json.dumps(discovered))
+
+
+def timed(run) -> float:
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=4000)
+    parser.add_argument("--hosts", type=int, default=32, help="Distinct sites (127.0.0.N)")
+    parser.add_argument("--page-kb", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    args = parser.parse_args()
+
+    server = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(args.page_kb, args.latency_ms / 1000), daemon=True
+    )
+    server.start()
+    time.sleep(2)
+    urls = [f"http://127.0.0.{i % args.hosts + 1}:{PORT}/p/{i}" for i in range(args.urls)]
+    print(
+        f"{args.urls} URLs on {args.hosts} hosts, {args.page_kb} KB pages, "
+        f"{os.cpu_count()} cores"
+    )
+    try:
+        reset_output()
+        seed(urls)
+        seconds = timed(lambda: asyncio.run(crawl_all_topics(max_urls_per_topic=args.urls)))
+        baseline = args.urls / seconds
+        print(f"single process:  {baseline:8.1f} pages/s  ({seconds:.1f} s)")
+        for workers in [int(value) for value in args.workers.split(",")]:
+            reset_output()
+            seed(urls)
+            seconds = timed(
+                lambda: crawl_distributed(workers=workers, max_urls_per_topic=args.urls)
+            )
+            rate = args.urls / seconds
+            print(
+                f"{workers:2d} workers:      {rate:8.1f} pages/s  ({seconds:.1f} s, "
+                f"{rate / baseline:.2f}x)"
+            )
+    finally:
+        server.terminate()
+        shutil.rmtree(os.environ["BENCH_DISTRIBUTED_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
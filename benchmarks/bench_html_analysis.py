@@ -0,0 +1,90 @@
+"""
+Benchmark: single-pass lxml analysis vs the old two-BeautifulSoup-parse path.
+
+The crawler used to build one BeautifulSoup tree for link extraction and a
+second one for relevance scoring on every page. This compares that against
+``analyze_html`` on synthetic pages of configurable size.
+
+Usage:
+    python benchmarks/bench_html_analysis.py --pages 200 --links 150 --paragraphs 80
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from crawlers.html_analysis import analyze_html
+
+WORDS = (
+    "aeration design sizing calculation membrane bioreactor performance sludge "
+    "nitrogen removal specification installation clarifier blower diffuser manual"
+).split()
+
+
+def make_page(rng: random.Random, links: int, paragraphs: int) -> str:
+    body = []
+    for i in range(paragraphs):
+        words = " ".join(rng.choice(WORDS) for _ in range(60))
+        body.append(f"<p>{words} <a href='/doc/{i}-{rng.randrange(10**6)}'>ref {i}</a></p>")
+    for i in range(links):
+        body.append(f"<li><a href='https://example.org/p/{i}?q={rng.randrange(1000)}'>link</a></li>")
+    return (
+        "<html><head><title>Synthetic page</title>"
+        "<meta name='description' content='benchmark'>"
+        "<link rel='canonical' href='/canonical'>"
+        "<script>var x = 1;</script><style>p { color: red }</style></head>"
+        f"<body>{''.join(body)}</body></html>"
+    )
+
+
+def two_parse(html: str, url: str, keywords):
+    soup = BeautifulSoup(html, "lxml")
+    links = []
+    for link in soup.find_all("a", href=True):
+        absolute_url = urljoin(url, link["href"])
+        if absolute_url.startswith("http"):
+            links.append(absolute_url)
+    text = BeautifulSoup(html, "lxml").get_text().lower()
+    return links, sum(text.count(keyword) for keyword in keywords)
+
+
+def single_pass(html: str, url: str, keywords):
+    analysis = analyze_html(html, url)
+    text = analysis["text"].lower()
+    return analysis["links"], sum(text.count(keyword) for keyword in keywords)
+
+
+def bench(fn, pages, keywords) -> float:
+    start = time.process_time()
+    for html in pages:
+        fn(html, "https://example.com/dir/page.html", keywords)
+    return (time.process_time() - start) / len(pages) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--links", type=int, default=150)
+    parser.add_argument("--paragraphs", type=int, default=80)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    pages = [make_page(rng, args.links, args.paragraphs) for _ in range(args.pages)]
+    keywords = ["aeration", "membrane", "sludge"]
+    size_kb = sum(len(page) for page in pages) / len(pages) / 1024
+
+    old = bench(two_parse, pages, keywords)
+    new = bench(single_pass, pages, keywords)
+    print(f"{args.pages} pages, ~{size_kb:.0f} KB each")
+    print(f"two BeautifulSoup parses: {old:7.2f} ms/page CPU")
+    print(f"single-pass lxml:         {new:7.2f} ms/page CPU")
+    print(f"speedup:                  {old / new:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
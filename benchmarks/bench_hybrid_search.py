@@ -0,0 +1,123 @@
+"""
+Benchmark: hybrid search latency (p50/p99) at several corpus sizes.
+
+Builds synthetic indexes with ``VectorStore`` (random unit vectors, Zipf-
+distributed text over a fixed vocabulary, chunks spread over the configured
+topics), then times keyword, semantic, hybrid and topic-filtered hybrid
+queries through ``HybridSearcher``. Query vectors are precomputed, so the
+numbers cover search only; add the model's encode time (a few ms per query
+on CPU for MiniLM) for uncached semantic queries.
+
+Usage:
+    python benchmarks/bench_hybrid_search.py --sizes 10000 100000 --queries 200
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from indexing.query_vectordb import HybridSearcher
+from indexing.vector_store import VectorStore
+
+
+class RandomEmbedder:
+    """Deterministic random unit vectors per text, standing in for a model."""
+
+    model_name = "bench-random"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.stack(
+            [
+                np.random.default_rng(abs(hash(text)) % 2**32).standard_normal(self.dim)
+                for text in texts
+            ]
+        ).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_index(directory: Path, size: int, dim: int, rng: np.random.Generator, words: int) -> float:
+    vocabulary = np.array([f"term{i}" for i in range(20000)])
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    topic_ids = [topic["id"] for topic in config.TECHNOLOGIES]
+    batch = 10000
+    started = time.perf_counter()
+    with VectorStore(directory, model_name=RandomEmbedder.model_name, dim=dim) as store:
+        for start in range(0, size, batch):
+            count = min(batch, size - start)
+            documents, chunks = [], []
+            for offset in range(count):
+                content_hash = f"{start + offset:064x}"
+                documents.append(
+                    {
+                        "content_hash": content_hash,
+                        "url": f"https://example.com/{start + offset}",
+                        "topic_id": topic_ids[(start + offset) % len(topic_ids)],
+                    }
+                )
+                text = " ".join(rng.choice(vocabulary, size=words, p=weights))
+                chunks.append((content_hash, 0, text))
+            vectors = rng.standard_normal((count, dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            store.add(documents, chunks, vectors)
+    return time.perf_counter() - started
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.array(samples) * 1000
+    return {"p50": float(np.percentile(values, 50)), "p99": float(np.percentile(values, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--words", type=int, default=80, help="Words per synthetic chunk")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    embedder = RandomEmbedder(args.dim)
+    queries = [" ".join(f"term{i}" for i in rng.integers(0, 2000, size=3)) for _ in range(args.queries)]
+    topic = str(config.TECHNOLOGIES[0]["id"])
+
+    print(f"{'chunks':>8} {'build s':>8} {'open ms':>8}  {'mode':<16} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            build_s = build_index(Path(tmp), size, args.dim, rng, args.words)
+            started = time.perf_counter()
+            searcher = HybridSearcher(Path(tmp), embedder=embedder)
+            open_ms = (time.perf_counter() - started) * 1000
+            for query in queries:  # embeddings come from the LRU cache from here on
+                searcher.embed(query)
+
+            cases = [
+                ("keyword", {"mode": "keyword"}),
+                ("semantic", {"mode": "semantic"}),
+                ("hybrid", {"mode": "hybrid"}),
+                ("hybrid+topic", {"mode": "hybrid", "topics": [topic]}),
+            ]
+            for index, (label, options) in enumerate(cases):
+                timings = []
+                for query in queries:
+                    started = time.perf_counter()
+                    searcher.search(query, k=args.k, **options)
+                    timings.append(time.perf_counter() - started)
+                stats = percentiles(timings)
+                prefix = f"{size:>8} {build_s:>8.1f} {open_ms:>8.1f}" if index == 0 else " " * 26
+                print(f"{prefix}  {label:<16} {stats['p50']:>8.2f} {stats['p99']:>8.2f}")
+            searcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: per-keyword ``str.count`` scoring vs the shared keyword matcher.
+
+Scores synthetic pages against every topic of an example config, once with
+the original loop (one scan per keyword and indicator, per topic) and once
+with ``RelevanceScorer.score_matrix`` (one scan per page for all topics).
+
+Usage:
+    python benchmarks/bench_relevance.py --config examples/pharma_research.yaml --pages 200
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from crawlers.keyword_matcher import RELEVANCE_INDICATORS, RelevanceScorer
+
+
+def legacy_score(text: str, keywords) -> float:
+    score = 0.0
+    for keyword in keywords:
+        count = text.count(keyword.lower())
+        score += min(count * 0.05, 0.3)
+    for term in RELEVANCE_INDICATORS:
+        if term in text:
+            score += 0.05
+    return min(score, 1.0)
+
+
+FILLER = "the of and to in a is that for with as on by this from at are be or an".split()
+
+
+def make_text(rng: random.Random, vocabulary, words: int, density: float = 0.05) -> str:
+    return " ".join(
+        rng.choice(vocabulary) if rng.random() < density else rng.choice(FILLER)
+        for _ in range(words)
+    ).lower()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--config", default="examples/pharma_research.yaml")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--words", type=int, default=8000)
+    parser.add_argument(
+        "--extra-keywords",
+        type=int,
+        default=0,
+        help="Synthetic keywords added to every topic (to model larger configs)",
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    topics = yaml.safe_load(Path(args.config).read_text(encoding="utf-8"))["topics"]
+    topic_keywords = [
+        list(topic.get("keywords", []))
+        + [f"term{rng.randrange(10**6)} phrase" for _ in range(args.extra_keywords)]
+        for topic in topics
+    ]
+    vocabulary = [word for keywords in topic_keywords for kw in keywords for word in kw.split()]
+    texts = [make_text(rng, vocabulary, args.words) for _ in range(args.pages)]
+
+    start = time.perf_counter()
+    legacy = np.array([[legacy_score(text, kws) for kws in topic_keywords] for text in texts])
+    legacy_ms = (time.perf_counter() - start) / len(texts) * 1000
+
+    scorer = RelevanceScorer(topic_keywords)
+    start = time.perf_counter()
+    matrix = scorer.score_matrix(texts)
+    matrix_ms = (time.perf_counter() - start) / len(texts) * 1000
+
+    backend = "aho-corasick" if scorer.matcher._automaton is not None else "str.count"
+    patterns = len(scorer.matcher.patterns)
+    print(f"{len(texts)} pages x {len(topic_keywords)} topics, {patterns} distinct patterns")
+    print(f"per-keyword str.count loop:  {legacy_ms:7.2f} ms/page")
+    print(f"score_matrix ({backend}): {matrix_ms:7.2f} ms/page")
+    print(f"speedup: {legacy_ms / matrix_ms:.1f}x, max abs diff {np.abs(legacy - matrix).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
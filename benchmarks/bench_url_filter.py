@@ -0,0 +1,96 @@
+"""
+Benchmark: substring-scan ``is_relevant_url`` vs the compiled ``URLFilter``.
+
+Classifies synthetic candidate URLs (hosts drawn from a few thousand
+domains, a share of them on rule domains or subdomains of them) against
+exclude/priority domain lists padded with synthetic rules, once with the
+original linear ``any(substring in url)`` scans and once with
+``URLFilter.classify``. Also reports how many verdicts differ; differences
+are substring false positives such as ``x.com`` matching ``example.com``.
+
+Usage:
+    python benchmarks/bench_url_filter.py --urls 200000 --rules 5000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.url_filter import DENY, EXCLUDE_EXTENSIONS, EXCLUDE_PATTERNS, PREFER_PATTERNS
+from crawlers.url_filter import URLFilter
+
+
+def legacy_is_relevant(url: str, exclude_domains, priority_domains) -> bool:
+    url_lower = url.lower()
+    if any(domain in url_lower for domain in exclude_domains):
+        return False
+    exclude_patterns = list(EXCLUDE_PATTERNS) + list(EXCLUDE_EXTENSIONS)
+    exclude_patterns += ["ad.doubleclick", "facebook.net"]
+    if any(pattern in url_lower for pattern in exclude_patterns):
+        return False
+    is_priority = any(domain in url_lower for domain in priority_domains)
+    has_preferred = any(pattern in url_lower for pattern in PREFER_PATTERNS)
+    return is_priority or has_preferred or len(url) < 200
+
+
+WORDS = "data model system design cloud energy grid storage network guide paper index".split()
+
+
+def make_urls(rng: random.Random, count: int, rule_domains, hosts: int):
+    domains = [f"site{index}.{rng.choice(['com', 'org', 'net', 'io'])}" for index in range(hosts)]
+    urls = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.1:
+            host = rng.choice(rule_domains)
+        elif roll < 0.15:
+            host = "www." + rng.choice(rule_domains)
+        elif roll < 0.16:  # look-alike host, e.g. myfacebook.com
+            host = "my" + rng.choice(rule_domains)
+        else:
+            host = rng.choice(domains)
+        path = "/".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+        suffix = rng.choice(["", ".html", ".pdf", ".js", "?id=42", "/" + "x" * rng.randint(0, 220)])
+        urls.append(f"https://{host}/{path}{suffix}")
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=200000)
+    parser.add_argument("--rules", type=int, default=5000, help="Synthetic exclude-domain rules")
+    parser.add_argument("--hosts", type=int, default=5000, help="Distinct non-rule hosts")
+    parser.add_argument(
+        "--legacy-sample", type=int, default=20000, help="URLs timed with the substring scan"
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    exclude = list(config.EXCLUDE_DOMAINS) + [f"blocked{i}.com" for i in range(args.rules)]
+    priority = list(config.PRIORITY_DOMAINS)
+    urls = make_urls(rng, args.urls, exclude[:50] + priority, args.hosts)
+
+    started = time.perf_counter()
+    url_filter = URLFilter(exclude, priority)
+    build_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    verdicts = url_filter.classify(urls)
+    filter_us = (time.perf_counter() - started) / len(urls) * 1e6
+
+    sample = urls[: args.legacy_sample]
+    started = time.perf_counter()
+    legacy = [legacy_is_relevant(url, exclude, priority) for url in sample]
+    legacy_us = (time.perf_counter() - started) / len(sample) * 1e6
+
+    differ = sum(1 for old, new in zip(legacy, verdicts) if old != (new != DENY))
+    print(f"{len(urls)} URLs, {len(exclude)} exclude rules, {len(priority)} priority domains")
+    print(f"substring scans:      {legacy_us:8.2f} us/url  (first {len(sample)} URLs)")
+    print(f"URLFilter.classify:   {filter_us:8.2f} us/url  (build {build_ms:.1f} ms)")
+    print(f"speedup: {legacy_us / filter_us:.0f}x; {differ} of {len(sample)} verdicts differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -36,7 +36,7 @@ BASE_DIR = _output_dir_path.resolve()
 RAW_DATA_DIR = BASE_DIR / "raw"
 PROCESSED_DIR = BASE_DIR / "processed"
 CACHE_DIR = BASE_DIR / "cache"
-QUEUE_FILE = BASE_DIR / "queue.json"
+QUEUE_FILE = BASE_DIR / "queue.db"
 CHECKPOINT_FILE = BASE_DIR / "checkpoint.json"
 RESULTS_DB = BASE_DIR / "results.db"
 
@@ -56,6 +56,97 @@ USER_AGENT = _config.get(
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
 )
 
+_fetch_cfg = _config.get("fetch", {})
+FETCH_MAX_BYTES = int(_fetch_cfg.get("max_content_length", 10 * 1024 * 1024))
+FETCH_ALLOWED_TYPES: List[str] = [
+    str(content_type).lower()
+    for content_type in _fetch_cfg.get(
+        "allowed_content_types", ["text/html", "application/xhtml+xml", "text/plain"]
+    )
+]
+FETCH_CHUNK_SIZE = int(_fetch_cfg.get("chunk_size", 64 * 1024))
+FETCH_BINARY_TYPES: List[str] = [
+    str(content_type).lower()
+    for content_type in _fetch_cfg.get("binary_content_types", ["application/pdf"])
+]
+FETCH_MAX_BINARY_BYTES = int(_fetch_cfg.get("max_binary_length", 50 * 1024 * 1024))
+
+_rate_cfg = _config.get("rate_limits", {})
+RATE_LIMIT_BURST = int(_rate_cfg.get("burst", 1))
+PRIORITY_RATE_MULTIPLIER = float(_rate_cfg.get("priority_multiplier", 2.0))
+RATE_LIMIT_MAX_WAIT = float(_rate_cfg.get("max_inline_wait_seconds", 5))
+RATE_LIMIT_BACKOFF = float(_rate_cfg.get("default_backoff_seconds", 30))
+DOMAIN_RATE_LIMITS: Dict[str, float] = {
+    str(domain): float(interval) for domain, interval in (_rate_cfg.get("domains") or {}).items()
+}
+
+_host_cfg = _config.get("host_concurrency", {})
+HOST_CONCURRENCY_INITIAL = int(_host_cfg.get("initial", 10))
+HOST_CONCURRENCY_MIN = int(_host_cfg.get("min", 1))
+HOST_CONCURRENCY_MAX = int(_host_cfg.get("max", 50))
+HOST_LATENCY_TARGET = float(_host_cfg.get("latency_target_ms", 2000)) / 1000
+HOST_ERROR_THRESHOLD = float(_host_cfg.get("error_rate_threshold", 0.1))
+HOST_CONCURRENCY_WINDOW = int(_host_cfg.get("window", 50))
+HOST_DECREASE_FACTOR = float(_host_cfg.get("decrease_factor", 0.5))
+HOST_DECREASE_COOLDOWN = float(_host_cfg.get("cooldown_seconds", 5))
+
+_cache_cfg = _config.get("cache", {})
+CACHE_TTL = float(_cache_cfg.get("ttl_seconds", 0))
+CACHE_MAX_BYTES = int(_cache_cfg.get("max_bytes", 0))
+CACHE_EVICTION = str(_cache_cfg.get("eviction", "lru")).lower()
+CACHE_REVALIDATE = str(_cache_cfg.get("revalidate", "stale")).lower()
+CACHE_BACKEND = str(_cache_cfg.get("backend", "files")).lower()
+CACHE_SEGMENT_MAX_BYTES = int(_cache_cfg.get("segment_max_bytes", 256 * 1024 * 1024))
+CACHE_COMPACT_RATIO = float(_cache_cfg.get("compact_dead_ratio", 0.5))
+
+CHECKPOINT_INTERVAL = float(_config.get("checkpoint_interval_seconds", 30))
+
+_results_cfg = _config.get("results", {})
+RESULTS_SINK = str(_results_cfg.get("sink", "sqlite")).lower()
+RESULTS_BATCH_SIZE = int(_results_cfg.get("batch_size", 500))
+RESULTS_FLUSH_INTERVAL = float(_results_cfg.get("flush_interval_seconds", 5))
+
+_offload_cfg = _config.get("offload", {})
+CPU_WORKERS = int(_offload_cfg.get("cpu_workers", max(1, (os.cpu_count() or 2) - 1)))
+IO_WORKERS = int(_offload_cfg.get("io_workers", 8))
+LOOP_LAG_INTERVAL = float(_offload_cfg.get("loop_lag_interval_ms", 100)) / 1000
+
+_frontier_cfg = _config.get("frontier", {})
+FRONTIER_BATCH_SIZE = int(_frontier_cfg.get("batch_size", 500))
+FRONTIER_INSERT_BATCH_SIZE = int(_frontier_cfg.get("insert_batch_size", 10000))
+SCHEDULER_QUANTUM = int(_frontier_cfg.get("scheduler_quantum", 20))
+
+_recursive_cfg = _config.get("recursive", {})
+RECURSIVE_ENABLED = bool(_recursive_cfg.get("enabled", False))
+RECURSIVE_MAX_DEPTH = int(_recursive_cfg.get("max_depth", 2))
+RECURSIVE_PAGES_PER_TOPIC = int(_recursive_cfg.get("pages_per_topic", 500))
+RECURSIVE_MAX_PAGES_PER_DOMAIN = int(_recursive_cfg.get("max_pages_per_domain", 50))
+RECURSIVE_MAX_LINKS_PER_PAGE = int(_recursive_cfg.get("max_links_per_page", 50))
+RECURSIVE_LINK_POLICY = str(_recursive_cfg.get("link_policy", "same_site")).lower()
+RECURSIVE_MIN_RELEVANCE = float(_recursive_cfg.get("min_parent_relevance", 0.1))
+RECURSIVE_SEED_PRIORITY = float(_recursive_cfg.get("seed_priority", 0.5))
+RECURSIVE_DEPTH_DECAY = float(_recursive_cfg.get("depth_decay", 0.8))
+_link_weights_cfg = _recursive_cfg.get("weights") or {}
+RECURSIVE_LINK_WEIGHTS: Dict[str, float] = {
+    "parent_relevance": float(_link_weights_cfg.get("parent_relevance", 1.0)),
+    "anchor": float(_link_weights_cfg.get("anchor", 1.0)),
+    "priority_domain": float(_link_weights_cfg.get("priority_domain", 0.5)),
+}
+
+_distributed_cfg = _config.get("distributed", {})
+DISTRIBUTED_WORKERS = int(_distributed_cfg.get("workers", 0)) or (os.cpu_count() or 1)
+DISTRIBUTED_SHARDS = max(1, int(_distributed_cfg.get("shards", 256)))
+DISTRIBUTED_HEARTBEAT = float(_distributed_cfg.get("heartbeat_seconds", 2))
+DISTRIBUTED_LEASE = float(_distributed_cfg.get("lease_seconds", 30))
+COORDINATOR_DB = BASE_DIR / "coordinator.db"
+WORKERS_DIR = BASE_DIR / "workers"
+
+_dedup_cfg = _config.get("dedup", {})
+CANONICAL_STRIP_PARAMS: List[str] = [str(name) for name in _dedup_cfg.get("strip_params", [])]
+NEAR_DUPLICATES = str(_dedup_cfg.get("near_duplicates", "skip")).lower()
+SIMHASH_MAX_DISTANCE = int(_dedup_cfg.get("simhash_max_distance", 3))
+DEDUP_DB = BASE_DIR / "dedup.db"
+
 _discovery_cfg = _config.get("discovery", {})
 DISCOVERY_MAX_RESULTS = int(_discovery_cfg.get("max_results_per_query", 20))
 DISCOVERY_QUERIES_PER_TOPIC = int(_discovery_cfg.get("max_queries_per_topic", 8))
@@ -63,11 +154,50 @@ DISCOVERY_ENABLE_BING = bool(_discovery_cfg.get("enable_bing", True))
 DISCOVERY_ENABLE_SCHOLAR = bool(_discovery_cfg.get("enable_scholar", False))
 DISCOVERY_CONCURRENCY = int(_discovery_cfg.get("max_concurrent", 10))
 DISCOVERY_QUERY_DELAY = float(_discovery_cfg.get("per_query_delay_seconds", 2))
+DISCOVERY_ENABLE_DUCKDUCKGO = bool(_discovery_cfg.get("enable_duckduckgo", True))
+DISCOVERY_FIXTURE_FILE = _discovery_cfg.get("fixture_file")
+DISCOVERY_EXECUTOR_WORKERS = int(_discovery_cfg.get("executor_workers", 8))
+DISCOVERY_PROVIDER_CONCURRENCY: Dict[str, int] = {
+    "duckduckgo": 4,
+    "bing": 4,
+    "scholar": 1,
+    "fixture": 16,
+    **{
+        str(name): int(limit)
+        for name, limit in (_discovery_cfg.get("provider_concurrency") or {}).items()
+    },
+}
+# Seconds between queries to one provider; others use DISCOVERY_QUERY_DELAY.
+DISCOVERY_PROVIDER_INTERVALS: Dict[str, float] = {
+    "fixture": 0.0,
+    **{
+        str(name): float(interval)
+        for name, interval in (_discovery_cfg.get("provider_rate_limits") or {}).items()
+    },
+}
+DISCOVERY_RATE_BURST = int(_discovery_cfg.get("rate_burst", 1))
+DISCOVERY_THROTTLE_BACKOFF = float(_discovery_cfg.get("throttle_backoff_seconds", 60))
+DISCOVERY_MAX_RETRIES = int(_discovery_cfg.get("max_retries", 2))
+DISCOVERY_CACHE_TTL = float(_discovery_cfg.get("cache_ttl_seconds", 7 * 24 * 3600))
+SEARCH_CACHE_DB = BASE_DIR / "search_cache.db"
+DISCOVERY_STREAM_FILE = BASE_DIR / "discovered_urls.ndjson"
 
 _domains_cfg = _load_yaml(PROJECT_ROOT / "config" / "domains_priority.yaml")
 PRIORITY_DOMAINS: List[str] = _domains_cfg.get("priority_domains", [])
 EXCLUDE_DOMAINS: List[str] = _domains_cfg.get("exclude_domains", [])
 
+_indexing_cfg = _load_yaml(PROJECT_ROOT / "config" / "indexing_config.yaml")
+EMBEDDING_MODEL = str(_indexing_cfg.get("embedding_model", "all-MiniLM-L6-v2"))
+EMBEDDING_DEVICE = str(_indexing_cfg.get("device", "cpu"))
+EMBEDDING_BATCH_SIZE = int(_indexing_cfg.get("encode_batch_size", 256))
+CHUNK_SIZE = int(_indexing_cfg.get("chunk_size", 500))
+CHUNK_OVERLAP = int(_indexing_cfg.get("chunk_overlap", 50))
+INDEX_BATCH_SIZE = int(_indexing_cfg.get("batch_size", 10000))
+_vector_db_path = Path(_indexing_cfg.get("vector_db_path", BASE_DIR / "vectordb"))
+if not _vector_db_path.is_absolute():
+    _vector_db_path = PROJECT_ROOT / _vector_db_path
+VECTOR_DB_DIR = _vector_db_path.resolve()
+
 _topics = _config.get("topics", [])
 if not _topics:
     raise ValueError(
@@ -89,5 +219,6 @@ for index, topic in enumerate(_topics, start=1):
             "keywords": topic.get("keywords", []),
             "vendors": topic.get("vendors", []),
             "category": topic.get("category", ""),
+            "weight": float(topic.get("weight", 1.0)),
         }
     )
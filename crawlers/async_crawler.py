@@ -1,21 +1,36 @@
 """
 High-performance async crawler using aiohttp.
 """
+import argparse
 import asyncio
 import aiohttp
-import json
-import hashlib
+import inspect
 import time
 from pathlib import Path
-from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Tuple, Union
 import sys
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 import config
+from crawlers.checkpoint import CrawlCheckpoint
+from crawlers.dedup import NearDuplicateIndex
+from crawlers.discovery_stream import latest_discovery_file, load_discovered
+from crawlers.documents import extract_document
+from crawlers.frontier import URLFrontier
+from crawlers.html_analysis import analyze_html
+from crawlers.host_concurrency import AdaptiveHostLimiter
+from crawlers.http_body import BodyRejected, decode_body, document_type, read_body, stream_to_file
+from crawlers.keyword_matcher import score_relevance
+from crawlers.link_expander import LinkExpander
+from crawlers.offload import LoopLagMonitor, Offloader, process_document, process_page
+from crawlers.rate_limiter import DomainRateLimiter, parse_retry_after
+from crawlers.result_sink import ResultSink, make_sink
+from crawlers.scheduler import TopicScheduler
+from crawlers.smart_cache import SmartCache
+from crawlers.urls import canonicalize_url, url_key
 
 log_handlers = [logging.StreamHandler()]
 try:
@@ -32,112 +47,200 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-class SmartCache:
-    """Content-addressable cache to avoid duplicate downloads."""
-
-    def __init__(self, cache_dir: Path):
-        self.cache_dir = cache_dir
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.url_to_hash: Dict[str, str] = {}
-        self.hits = 0
-        self.misses = 0
-
-    def _get_cache_path(self, content_hash: str) -> Path:
-        return self.cache_dir / content_hash[:2] / content_hash[2:4] / content_hash
-
-    def _hash_content(self, content: str) -> str:
-        return hashlib.sha256(content.encode("utf-8")).hexdigest()
-
-    def get(self, url: str) -> Optional[str]:
-        if url in self.url_to_hash:
-            content_hash = self.url_to_hash[url]
-            cache_path = self._get_cache_path(content_hash)
-            if cache_path.exists():
-                self.hits += 1
-                logger.debug("Cache HIT: %s", url)
-                return cache_path.read_text(encoding="utf-8", errors="ignore")
-        self.misses += 1
-        return None
-
-    def put(self, url: str, content: str) -> str:
-        content_hash = self._hash_content(content)
-        cache_path = self._get_cache_path(content_hash)
-
-        if not cache_path.exists():
-            cache_path.parent.mkdir(parents=True, exist_ok=True)
-            cache_path.write_text(content, encoding="utf-8")
-            logger.debug("Cached: %s -> %s", url, content_hash[:8])
-        else:
-            logger.debug("Content already cached (duplicate): %s", content_hash[:8])
-
-        self.url_to_hash[url] = content_hash
-        return content_hash
-
-    def stats(self) -> Dict[str, float]:
-        total = self.hits + self.misses
-        hit_rate = (self.hits / total * 100) if total > 0 else 0
-        return {
-            "hits": self.hits,
-            "misses": self.misses,
-            "total_requests": total,
-            "hit_rate_percent": hit_rate,
-        }
-
-
 class AsyncCrawler:
-    """High-performance async web crawler."""
+    """High-performance async web crawler.
+
+    ``sink`` replaces the configured result sink; ``cpu_workers`` sizes the
+    parsing pool (several crawler processes on one machine share its cores).
+    """
 
-    def __init__(self):
+    def __init__(
+        self, sink: Optional[ResultSink] = None, cpu_workers: int = config.CPU_WORKERS
+    ):
         self.cache = SmartCache(config.CACHE_DIR)
         self.session: Optional[aiohttp.ClientSession] = None
         self.semaphore = asyncio.Semaphore(config.CONCURRENCY)
-        self.domain_delays: Dict[str, float] = {}
+        self.rate_limiter = DomainRateLimiter()
+        self.host_limiter = AdaptiveHostLimiter()
+        self.offload = Offloader(cpu_workers=cpu_workers)
+        self.loop_lag = LoopLagMonitor()
+        self.dedup = NearDuplicateIndex() if config.NEAR_DUPLICATES != "off" else None
+        self.sink = sink if sink is not None else make_sink()
+        # url_key -> [fetch task, waiter count]
+        self._inflight: Dict[str, List] = {}
 
     async def __aenter__(self):
-        connector = aiohttp.TCPConnector(limit=config.CONCURRENCY, limit_per_host=10)
+        # Per-host parallelism is governed by host_limiter; the connector only caps it.
+        connector = aiohttp.TCPConnector(
+            limit=config.CONCURRENCY, limit_per_host=config.HOST_CONCURRENCY_MAX
+        )
         timeout = aiohttp.ClientTimeout(total=config.TIMEOUT)
         self.session = aiohttp.ClientSession(
             connector=connector,
             timeout=timeout,
             headers={"User-Agent": config.USER_AGENT},
         )
+        self.loop_lag.start()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.loop_lag.stop()
         if self.session:
             await self.session.close()
+        self.offload.close()
+        self.sink.close()
+        self.cache.close()
+        if self.dedup:
+            self.dedup.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.cache.stats(),
+            "hosts": self.host_limiter.stats(),
+            "loop_lag": self.loop_lag.stats(),
+        }
 
     async def _rate_limit(self, domain: str):
-        now = time.time()
-        if domain in self.domain_delays:
-            elapsed = now - self.domain_delays[domain]
-            if elapsed < config.RATE_LIMIT:
-                await asyncio.sleep(config.RATE_LIMIT - elapsed)
-        self.domain_delays[domain] = time.time()
-
-    async def fetch_url(self, url: str, topic_name: str) -> Optional[Dict]:
-        cached = self.cache.get(url)
-        if cached:
-            return {
-                "url": url,
-                "content": cached,
-                "topic_name": topic_name,
-                "timestamp": datetime.now().isoformat(),
-                "from_cache": True,
-            }
-
-        async with self.semaphore:
-            domain = urlparse(url).netloc
-            await self._rate_limit(domain)
-
-            for attempt in range(config.MAX_RETRIES):
-                try:
-                    async with self.session.get(url, allow_redirects=True) as response:
-                        if response.status == 200:
-                            content = await response.text()
-                            content_hash = self.cache.put(url, content)
+        await self.rate_limiter.acquire(domain)
+
+    @staticmethod
+    def _conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    async def fetch_url(
+        self, url: str, topic_name: str, max_wait: Optional[float] = None
+    ) -> Optional[Dict]:
+        """Fetch ``url``, sharing one request between concurrent callers for the same URL.
+
+        A URL queued for several topics is claimed once per topic; whoever asks
+        second waits for the first fetch and gets its own copy of the result.
+        The request is cancelled only when all of its waiters are.
+
+        If the host is throttled for longer than ``max_wait`` seconds (or a
+        429/503 asks for more than ``RATE_LIMIT_MAX_WAIT``), the result carries
+        ``deferred`` (the delay) instead of content, so the caller can
+        reschedule the URL. Without ``max_wait`` the rate limit is waited out.
+        """
+        key = url_key(url)
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._fetch_url(url, topic_name, max_wait))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda done: self._fetch_finished(key, done))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+        return None if result is None else {**result, "topic_name": topic_name}
+
+    def _fetch_finished(self, key: str, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter was cancelled
+
+    async def _fetch_url(
+        self, url: str, topic_name: str, max_wait: Optional[float]
+    ) -> Optional[Dict]:
+        url = canonicalize_url(url)
+        if config.CACHE_REVALIDATE != "always":
+            cached = await self.offload.run_io(self.cache.get_entry, url)
+            if cached:
+                return {
+                    "url": url,
+                    **cached,
+                    "topic_name": topic_name,
+                    "timestamp": datetime.now().isoformat(),
+                    "from_cache": True,
+                }
+
+        entry = None
+        if config.CACHE_REVALIDATE != "off":
+            entry = await self.offload.run_io(self.cache.lookup, url)
+        headers = self._conditional_headers(entry)
+
+        domain = urlparse(url).netloc.lower()
+        for attempt in range(config.MAX_RETRIES):
+            if max_wait is None:
+                await self._rate_limit(domain)
+            else:
+                # Decide and book in one step, so workers cannot all pass a check
+                # and then queue up behind each other's reservations.
+                delay = self.rate_limiter.try_reserve(domain)
+                if delay > max_wait:
+                    return {"url": url, "topic_name": topic_name, "deferred": delay}
+                if delay > 0:
+                    await self._rate_limit(domain)
+            try:
+                async with self.host_limiter.slot(domain) as slot, self.semaphore:
+                    async with self.session.get(
+                        url, allow_redirects=True, headers=headers
+                    ) as response:
+                        slot.status = response.status
+                        if response.status == 304 and headers:
+                            refreshed = await self.offload.run_io(
+                                self.cache.refresh,
+                                url,
+                                etag=response.headers.get("ETag"),
+                                last_modified=response.headers.get("Last-Modified"),
+                            )
+                            if refreshed:
+                                logger.info("[304] Not modified: %s", url)
+                                return {
+                                    "url": url,
+                                    "final_url": str(response.url),
+                                    **refreshed,
+                                    "topic_name": topic_name,
+                                    "timestamp": datetime.now().isoformat(),
+                                    "status_code": response.status,
+                                    "from_cache": True,
+                                    "revalidated": True,
+                                }
+                            # Cached body vanished underneath us; fetch it unconditionally.
+                            headers = {}
+                            continue
 
-                            logger.info("[OK] Fetched: %s (%d bytes)", url, len(content))
+                        if response.status == 200:
+                            content_type = response.headers.get("Content-Type")
+                            binary_type = document_type(content_type, str(response.url))
+                            try:
+                                if binary_type:
+                                    return await self._fetch_document(
+                                        url, topic_name, response, binary_type
+                                    )
+                                data, raw_hash = await read_body(response)
+                            except BodyRejected as exc:
+                                logger.info("[SKIP] %s: %s", url, exc)
+                                return {
+                                    "url": url,
+                                    "topic_name": topic_name,
+                                    "status_code": response.status,
+                                    "rejected": str(exc),
+                                }
+                            content, encoding = decode_body(data, content_type)
+                            content_hash = await self.offload.run_io(
+                                self.cache.put,
+                                url,
+                                content,
+                                etag=response.headers.get("ETag"),
+                                last_modified=response.headers.get("Last-Modified"),
+                                # The streamed hash is the text hash when the body was UTF-8.
+                                content_hash=raw_hash if encoding == "utf-8" else None,
+                                content_type=content_type,
+                            )
+
+                            logger.info("[OK] Fetched: %s (%d bytes)", url, len(data))
 
                             return {
                                 "url": url,
@@ -147,174 +250,605 @@ class AsyncCrawler:
                                 "topic_name": topic_name,
                                 "timestamp": datetime.now().isoformat(),
                                 "status_code": response.status,
+                                "content_type": content_type,
+                                "binary": False,
+                                "encoding": encoding,
                                 "from_cache": False,
                             }
 
+                        if response.status in (429, 503):
+                            delay = self.rate_limiter.backoff(
+                                domain, parse_retry_after(response.headers.get("Retry-After"))
+                            )
+                            logger.warning(
+                                "[THROTTLED] HTTP %s, backing off %s for %.1fs: %s",
+                                response.status,
+                                domain,
+                                delay,
+                                url,
+                            )
+                            if delay > config.RATE_LIMIT_MAX_WAIT:
+                                # Let the caller reschedule instead of parking this worker.
+                                return {"url": url, "topic_name": topic_name, "deferred": delay}
+                            continue
+
                         logger.warning("[FAIL] HTTP %s: %s", response.status, url)
 
-                except asyncio.TimeoutError:
-                    logger.warning(
-                        "[TIMEOUT] Attempt %d/%d: %s",
-                        attempt + 1,
-                        config.MAX_RETRIES,
-                        url,
-                    )
-                    if attempt < config.MAX_RETRIES - 1:
-                        await asyncio.sleep(config.BACKOFF_FACTOR**attempt)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "[TIMEOUT] Attempt %d/%d: %s",
+                    attempt + 1,
+                    config.MAX_RETRIES,
+                    url,
+                )
+                if attempt < config.MAX_RETRIES - 1:
+                    await asyncio.sleep(config.BACKOFF_FACTOR**attempt)
+
+            except Exception as exc:
+                logger.error("[ERROR] Fetching %s: %s", url, exc)
+                if attempt < config.MAX_RETRIES - 1:
+                    await asyncio.sleep(config.BACKOFF_FACTOR**attempt)
+
+        return None
+
+    async def _fetch_document(
+        self, url: str, topic_name: str, response: aiohttp.ClientResponse, content_type: str
+    ) -> Dict:
+        """Stream a binary document straight into the cache; its text is extracted later."""
+        path, content_hash, size = await stream_to_file(response, self.cache.incoming_dir)
+        try:
+            await self.offload.run_io(
+                self.cache.put_file,
+                url,
+                path,
+                content_hash,
+                content_type=content_type,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        finally:
+            path.unlink(missing_ok=True)
+        logger.info("[OK] Fetched document: %s (%d bytes)", url, size)
+        return {
+            "url": url,
+            "final_url": str(response.url),
+            "content": None,
+            "content_hash": content_hash,
+            "topic_name": topic_name,
+            "timestamp": datetime.now().isoformat(),
+            "status_code": response.status,
+            "content_type": content_type,
+            "binary": True,
+            "from_cache": False,
+        }
 
+    async def crawl_stream(
+        self,
+        items: Union[Iterable[Dict], AsyncIterable[Dict]],
+        on_result: Callable[[Dict, Optional[Dict]], Any],
+        workers: int = config.CONCURRENCY,
+        on_defer: Optional[Callable[[Dict, float], Any]] = None,
+        process: Optional[Callable[[Dict, Dict], Any]] = None,
+    ) -> None:
+        """Fetch items with a fixed worker pool, streaming results as they finish.
+
+        Items are fed through a bounded queue, so the producer blocks once the
+        workers are saturated. Every finished fetch is handed to
+        ``on_result(item, result)`` (``result`` is None on failure) by a single
+        persistence task, keeping memory proportional to ``workers`` rather
+        than to the number of items. Responses refused because of their type
+        or size come back as a result carrying ``rejected`` and no ``content``;
+        binary documents come back with ``binary`` set and no ``content``
+        until ``extract_text`` has run.
+        With ``on_defer``, items whose host is rate-limited or throttled for
+        longer than ``RATE_LIMIT_MAX_WAIT`` are handed back as
+        ``on_defer(item, delay)`` instead of parking a worker; without it they
+        count as failed. ``process(item,
+        result)`` runs in the fetch worker for every successful fetch, so
+        CPU work it hands to the offload pool overlaps across workers instead
+        of queueing behind the single persistence task.
+        """
+        work_queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        done_queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+
+        async def produce():
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await work_queue.put(item)
+            else:
+                for item in items:
+                    await work_queue.put(item)
+            for _ in range(workers):
+                await work_queue.put(None)
+
+        async def fetch_worker():
+            while True:
+                item = await work_queue.get()
+                if item is None:
+                    return
+                max_wait = config.RATE_LIMIT_MAX_WAIT if on_defer is not None else None
+                try:
+                    result = await self.fetch_url(item["url"], item["topic_name"], max_wait)
+                    if result is not None and "deferred" in result:
+                        if on_defer is not None:
+                            on_defer(item, result["deferred"])
+                            continue
+                        result = None
+                    if result is not None and process is not None and "rejected" not in result:
+                        outcome = process(item, result)
+                        if inspect.isawaitable(outcome):
+                            await outcome
+                except Exception as exc:
+                    logger.error("[ERROR] Worker failed on %s: %s", item["url"], exc)
+                    result = None
+                await done_queue.put((item, result))
+
+        async def persist():
+            while True:
+                entry = await done_queue.get()
+                if entry is None:
+                    return
+                item, result = entry
+                try:
+                    outcome = on_result(item, result)
+                    if inspect.isawaitable(outcome):
+                        await outcome
                 except Exception as exc:
-                    logger.error("[ERROR] Fetching %s: %s", url, exc)
-                    if attempt < config.MAX_RETRIES - 1:
-                        await asyncio.sleep(config.BACKOFF_FACTOR**attempt)
+                    logger.error("Error persisting %s: %s", item["url"], exc)
 
-        return None
+        persister = asyncio.create_task(persist())
+        fetchers = [asyncio.create_task(fetch_worker()) for _ in range(workers)]
+        try:
+            await produce()
+            await asyncio.gather(*fetchers)
+        finally:
+            for task in fetchers:
+                task.cancel()
+            await done_queue.put(None)
+            await persister
 
     async def crawl_batch(self, urls: List[Dict]) -> List[Dict]:
         logger.info("Starting batch crawl: %d URLs", len(urls))
-        tasks = [self.fetch_url(url_data["url"], url_data["topic_name"]) for url_data in urls]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        valid_results = [r for r in results if r is not None and not isinstance(r, Exception)]
+        valid_results: List[Dict] = []
+
+        def collect(item: Dict, result: Optional[Dict]):
+            if result is not None and "rejected" not in result:
+                valid_results.append(result)
+
+        workers = min(config.CONCURRENCY, max(len(urls), 1))
+        await self.crawl_stream(urls, collect, workers=workers)
         logger.info("Completed batch: %d/%d successful", len(valid_results), len(urls))
         return valid_results
 
-    def extract_links(self, html: str, base_url: str) -> List[str]:
+    async def crawl_frontier(
+        self,
+        frontier: URLFrontier,
+        topic_id: Optional[int] = None,
+        batch_size: int = config.FRONTIER_BATCH_SIZE,
+        checkpoint: Optional[CrawlCheckpoint] = None,
+        on_result: Optional[Callable[[Dict, Dict], Any]] = None,
+        scheduler: Optional[TopicScheduler] = None,
+        process: Optional[Callable[[Dict, Dict], Any]] = None,
+        feed_done: Optional[asyncio.Event] = None,
+    ) -> Dict[str, int]:
+        """Stream URLs from the frontier through the worker pool until it drains.
+
+        With a ``scheduler``, URLs from all of its topics are interleaved;
+        otherwise only ``topic_id`` (or everything, if None) is claimed.
+        ``on_result(item, result)`` is called for every successful fetch as
+        soon as it completes; frontier state is updated behind it. ``process``
+        is passed through to ``crawl_stream``. While ``feed_done`` is unset,
+        something else is still adding URLs, so an empty frontier waits for
+        them instead of ending the crawl.
+        """
+        in_flight: Dict[int, str] = {}
+        done_ids: List[int] = []
+        stats = {"done": 0, "failed": 0, "rejected": 0}
+        flushed_at = time.monotonic()
+
+        async def flush():
+            nonlocal flushed_at
+            flushed_at = time.monotonic()
+            if not done_ids:
+                return
+            ids = list(done_ids)
+            done_ids.clear()
+            # Results first: a URL the frontier calls done must already be stored.
+            await self.offload.run_io(self.sink.flush)
+            frontier.mark_done(ids)
+
+        async def claim():
+            while True:
+                if scheduler:
+                    batch = scheduler.pop_batch(batch_size)
+                else:
+                    batch = frontier.pop_batch(batch_size, topic_id=topic_id)
+                for item in batch:
+                    in_flight[item["id"]] = item["url"]
+                    yield item
+                if batch:
+                    continue
+                if scheduler:
+                    next_at = scheduler.next_eligible_at()
+                else:
+                    next_at = frontier.next_eligible_at(topic_id)
+                if next_at is None and not in_flight:
+                    if feed_done is None or feed_done.is_set():
+                        return
+                await flush()
+                wait = 0.1 if next_at is None else next_at - time.time()
+                await asyncio.sleep(min(max(wait, 0.01), 1.0))
+
+        async def handle(item: Dict, result: Optional[Dict]):
+            failed = 0
+            if result is None:
+                failed = frontier.mark_failed([item["id"]], error="fetch failed")
+                stats["failed"] += failed
+            elif "rejected" in result:
+                failed = frontier.mark_failed(
+                    [item["id"]], error=result["rejected"], retry=False
+                )
+                stats["rejected"] += 1
+                result = None
+            else:
+                if on_result:
+                    outcome = on_result(item, result)
+                    if inspect.isawaitable(outcome):
+                        await outcome
+                done_ids.append(item["id"])
+                stats["done"] += 1
+                if (
+                    len(done_ids) >= batch_size
+                    or time.monotonic() - flushed_at >= self.sink.flush_interval
+                ):
+                    await flush()
+            in_flight.pop(item["id"], None)
+            if checkpoint:
+                checkpoint.record_progress(
+                    completed=1 if result is not None else 0, failed=failed
+                )
+
+        def defer(item: Dict, delay: float):
+            frontier.defer([item["id"]], delay)
+            in_flight.pop(item["id"], None)
+
         try:
-            soup = BeautifulSoup(html, "lxml")
-            links = []
-            for a_tag in soup.find_all("a", href=True):
-                href = a_tag["href"]
-                absolute_url = urljoin(base_url, href)
-                if absolute_url.startswith("http"):
-                    links.append(absolute_url)
-            return links
-        except Exception as exc:
-            logger.error("Error extracting links: %s", exc)
-            return []
+            await self.crawl_stream(claim(), handle, on_defer=defer, process=process)
+        finally:
+            await flush()
+        return stats
 
-    def calculate_relevance(self, html: str, keywords: List[str]) -> float:
+    def analyze(self, html: str, base_url: str) -> Dict:
         try:
-            text = BeautifulSoup(html, "lxml").get_text().lower()
-            score = 0.0
-
-            for keyword in keywords:
-                count = text.count(keyword.lower())
-                score += min(count * 0.05, 0.3)
-
-            indicators = [
-                "design",
-                "sizing",
-                "calculation",
-                "specification",
-                "installation",
-                "performance",
-                "case study",
-                "manual",
-            ]
-            for term in indicators:
-                if term in text:
-                    score += 0.05
-
-            return min(score, 1.0)
+            return analyze_html(html, base_url)
+        except Exception as exc:
+            logger.error("Error analyzing %s: %s", base_url, exc)
+            return analyze_html("", base_url)
+
+    def extract_links(
+        self, html: str, base_url: str, analysis: Optional[Dict] = None
+    ) -> List[str]:
+        analysis = analysis or self.analyze(html, base_url)
+        return [link for link, _ in analysis["links"]]
+
+    def calculate_relevance(
+        self, html: str, keywords: List[str], analysis: Optional[Dict] = None
+    ) -> float:
+        text = (analysis or self.analyze(html, ""))["text"].lower()
+        return score_relevance(text, keywords)
+
+    async def extract_text(self, result: Dict) -> Dict:
+        """Fill in ``content`` (and ``title``) of a binary document result.
+
+        Text is extracted in the CPU pool and cached by content hash, so a
+        document already seen under any URL is never extracted twice.
+        """
+        content_hash = result["content_hash"]
+        extracted = await self.offload.run_io(self.cache.get_extracted, content_hash)
+        if extracted is None:
+            # Workers read the stored file themselves when the store keeps one.
+            source = self.cache.document_path(content_hash)
+            if source is None:
+                source = await self.offload.run_io(self.cache.read_document, content_hash)
+            if source is None:
+                raise FileNotFoundError(f"document {content_hash[:8]} missing from cache")
+            extracted = await self.offload.run_cpu(
+                extract_document, source, result["content_type"]
+            )
+            await self.offload.run_io(self.cache.put_extracted, content_hash, extracted)
+        result["content"] = extracted["text"]
+        result["title"] = extracted["title"]
+        return result
+
+    async def annotate(self, result: Dict, keywords: List[str]) -> Dict:
+        """Parse and score the page in the CPU pool, attaching title, links and relevance.
+
+        Binary documents have their text extracted first.
+        """
+        base_url = result.get("final_url", result["url"])
+        try:
+            if result.get("binary"):
+                await self.extract_text(result)
+                page = await self.offload.run_cpu(
+                    process_document, result["content"], base_url, keywords, result["title"]
+                )
+            else:
+                page = await self.offload.run_cpu(
+                    process_page, result["content"], base_url, keywords
+                )
         except Exception as exc:
-            logger.error("Error calculating relevance: %s", exc)
-            return 0.0
+            logger.error("Error analyzing %s: %s", base_url, exc)
+            result["content"] = result["content"] or ""
+            page = process_page("", base_url, keywords)
+        result.update(page)
+        return result
+
+    def is_duplicate(self, result: Dict, topic_id: int) -> bool:
+        """Check ``result`` against pages already stored for the topic.
+
+        Near-duplicates get ``duplicate_of``; returns True if, per the
+        ``dedup.near_duplicates`` setting, the page should not be stored.
+        """
+        if self.dedup is None:
+            return False
+        match = self.dedup.check(topic_id, result)
+        if match is None:
+            return False
+        result["duplicate_of"] = match["url"]
+        logger.debug(
+            "[DUP] %s ~ %s (%d bits)", result["url"], match["url"], match["distance"]
+        )
+        return config.NEAR_DUPLICATES == "skip"
 
     def save_result(self, result: Dict, topic_id: int):
+        """Queue an annotated result for the batched result sink (blocking; use run_io)."""
         try:
-            topic_dir = config.RAW_DATA_DIR / f"topic_{topic_id:03d}"
-            topic_dir.mkdir(exist_ok=True)
-
-            filename = f"{result['content_hash'][:16]}.json"
-            filepath = topic_dir / filename
-
-            metadata = {
-                "url": result["url"],
-                "final_url": result.get("final_url", result["url"]),
-                "content_hash": result["content_hash"],
-                "topic_name": result["topic_name"],
-                "timestamp": result["timestamp"],
-                "content_length": len(result["content"]),
-                "from_cache": result.get("from_cache", False),
-            }
-
-            filepath.write_text(json.dumps(metadata, indent=2), encoding="utf-8")
-            logger.debug("Saved result: %s", filepath)
-
+            self.sink.add(result, topic_id)
         except Exception as exc:
             logger.error("Error saving result: %s", exc)
 
 
-async def crawl_topic(topic: Dict, discovered_urls: List[Dict], max_urls: int = 100):
-    logger.info("%s", "=" * 60)
-    logger.info("Starting crawl for: %s (ID: %s)", topic["name"], topic["id"])
-    logger.info("%s", "=" * 60)
-
-    seed_urls = [
-        {"url": url_data["url"], "topic_name": topic["name"]}
-        for url_data in discovered_urls[:max_urls]
-    ]
+def reset_crawl_state(frontier: URLFrontier) -> None:
+    """Empty the frontier and the near-duplicate index before a fresh, non-resumed run.
 
-    if not seed_urls:
-        logger.warning("No URLs found for %s, skipping", topic["name"])
-        return []
-
-    logger.info("Crawling %d discovered URLs", len(seed_urls))
+    Fingerprints left over from an earlier run would otherwise mark this
+    run's pages as duplicates of documents it never stored.
+    """
+    frontier.reset()
+    if config.DEDUP_DB.exists():
+        dedup = NearDuplicateIndex()
+        try:
+            dedup.reset()
+        finally:
+            dedup.close()
+
+
+def queue_discovered(
+    frontier: URLFrontier, topic: Dict, urls: List, max_urls: int, recursive: bool
+) -> int:
+    queued = frontier.seed_topic(
+        topic,
+        urls,
+        max_urls=max_urls,
+        priority=config.RECURSIVE_SEED_PRIORITY if recursive else 0.0,
+    )
+    logger.info("Queued %d URLs for %s", queued, topic["name"])
+    return queued
+
+
+def topic_budgets(topics: List[Dict], recursive: bool) -> Optional[Dict[int, int]]:
+    """Per-topic page budgets for ``TopicScheduler`` (recursive crawls only)."""
+    if not recursive:
+        return None
+    return {topic["id"]: config.RECURSIVE_PAGES_PER_TOPIC for topic in topics}
+
+
+async def crawl_topics(
+    frontier: URLFrontier,
+    topics: List[Dict],
+    checkpoint: Optional[CrawlCheckpoint],
+    recursive: bool = config.RECURSIVE_ENABLED,
+    feed_done: Optional[asyncio.Event] = None,
+    scheduler: Optional[TopicScheduler] = None,
+    crawler: Optional[AsyncCrawler] = None,
+    batch_size: Optional[int] = None,
+):
+    """Crawl ``topics`` from the frontier with one shared crawler.
+
+    Returns the number of URLs crawled and the results location. With
+    ``feed_done``, the crawl keeps waiting for newly queued URLs until the
+    event is set (see ``crawlers/pipeline.py``). ``scheduler`` and
+    ``crawler`` replace the defaults (see ``crawlers/distributed.py``);
+    without a ``checkpoint`` topic completion is left to the caller.
+    ``batch_size`` overrides the number of URLs claimed from the frontier at once.
+    """
+    topics_by_id = {topic["id"]: topic for topic in topics}
+    expander = LinkExpander(frontier) if recursive else None
+    if scheduler is None:
+        scheduler = TopicScheduler(frontier, topics, budgets=topic_budgets(topics, recursive))
+    async with crawler or AsyncCrawler() as crawler:
+
+        async def process(item: Dict, result: Dict):
+            result["depth"] = item.get("depth", 0)
+            result["parent_url"] = item.get("parent_url")
+            await crawler.annotate(result, topics_by_id[item["topic_id"]]["keywords"])
+
+        async def persist(item: Dict, result: Dict):
+            if crawler.is_duplicate(result, item["topic_id"]):
+                return
+            await crawler.offload.run_io(crawler.save_result, result, item["topic_id"])
+            if expander:
+                expander.expand(item, result, topics_by_id[item["topic_id"]]["keywords"])
+
+        if batch_size is None:
+            # Small claims keep best-first ordering responsive to newly found links.
+            batch_size = (
+                min(config.FRONTIER_BATCH_SIZE, config.CONCURRENCY * 2)
+                if recursive
+                else config.FRONTIER_BATCH_SIZE
+            )
+        stats = await crawler.crawl_frontier(
+            frontier,
+            batch_size=batch_size,
+            checkpoint=checkpoint,
+            scheduler=scheduler,
+            process=process,
+            on_result=persist,
+            feed_done=feed_done,
+        )
+        total_crawled = stats["done"]
+        results_location = crawler.sink.location
+        if expander:
+            logger.info("Followed links queued: %d", expander.queued)
+        if crawler.dedup:
+            logger.info("Near-duplicate pages: %d", crawler.dedup.duplicates)
+        crawler_stats = crawler.stats()
+        logger.info("Cache hit rate: %.1f%%", crawler_stats["cache"]["hit_rate_percent"])
+        logger.info(
+            "Event loop lag: mean %.1f ms, p99 %.1f ms, max %.1f ms",
+            crawler_stats["loop_lag"]["mean_ms"],
+            crawler_stats["loop_lag"]["p99_ms"],
+            crawler_stats["loop_lag"]["max_ms"],
+        )
+        for host, host_stats in sorted(
+            crawler_stats["hosts"].items(), key=lambda kv: -kv[1]["limit"]
+        )[:20]:
+            logger.info(
+                "  %s: concurrency %d, p95 %.0f ms, errors %.1f%%",
+                host,
+                host_stats["limit"],
+                host_stats["p95_latency_ms"],
+                host_stats["error_rate"] * 100,
+            )
+
+    if checkpoint is not None:
+        complete_topics(frontier, topics, checkpoint)
+    return total_crawled, results_location
+
+
+def complete_topics(frontier: URLFrontier, topics: List[Dict], checkpoint: CrawlCheckpoint):
+    """Log each topic's outcome and checkpoint the ones with nothing left to fetch."""
+    for topic in topics:
+        counts = frontier.counts(topic["id"])
+        logger.info(
+            "Topic %s: %d done, %d failed, %d skipped",
+            topic["name"],
+            counts["done"],
+            counts["failed"],
+            counts["skipped"],
+        )
+        if not counts["pending"] and not counts["in_flight"]:
+            checkpoint.mark_topic_complete(topic["id"])
+    checkpoint.save()
+
+
+def prepare_frontier(
+    frontier: URLFrontier, max_urls_per_topic: int, resume: bool, recursive: bool
+) -> Optional[Tuple[CrawlCheckpoint, List[Dict]]]:
+    """Queue the latest discovery output; returns the checkpoint and topics to crawl.
+
+    A fresh run empties the frontier first; with ``resume`` the last
+    checkpoint is continued and its in-flight URLs are requeued. Returns
+    None when there is no discovery output to crawl.
+    """
+    discovered_file = latest_discovery_file()
+    if discovered_file is None:
+        logger.error("No discovered URLs found in %s", config.BASE_DIR)
+        logger.error("Please run discovery/url_discovery.py first!")
+        return None
 
-    async with AsyncCrawler() as crawler:
-        results = await crawler.crawl_batch(seed_urls)
-        for result in results:
-            crawler.save_result(result, topic["id"])
+    logger.info("Loading discovered URLs from %s", discovered_file)
+    discovered_data = load_discovered(discovered_file)
+
+    checkpoint = CrawlCheckpoint.load() if resume else None
+    if resume and checkpoint is None:
+        logger.warning("No checkpoint at %s, starting a fresh crawl", config.CHECKPOINT_FILE)
+
+    if checkpoint:
+        requeued = frontier.requeue_in_flight()
+        logger.info(
+            "Resuming: %d topics complete, %d URLs done, %d in-flight URLs requeued",
+            len(checkpoint.completed_topics),
+            checkpoint.completed_urls,
+            requeued,
+        )
+    else:
+        reset_crawl_state(frontier)
+        checkpoint = CrawlCheckpoint()
+        checkpoint.save()
 
-        cache_stats = crawler.cache.stats()
-        logger.info("Topic: %s", topic["name"])
-        logger.info("  URLs crawled: %d", len(results))
-        logger.info("  Cache hit rate: %.1f%%", cache_stats["hit_rate_percent"])
-        logger.info("  Data saved to: %s", config.RAW_DATA_DIR / f"topic_{topic['id']:03d}")
+    for topic in config.TECHNOLOGIES:
+        topic_id = str(topic["id"])
+        if topic_id in discovered_data:
+            urls = discovered_data[topic_id]["urls"]
+            queue_discovered(frontier, topic, urls, max_urls_per_topic, recursive)
+        else:
+            logger.warning("No discovered URLs for %s", topic["name"])
+    del discovered_data
 
-    return results
+    topics = []
+    for topic in config.TECHNOLOGIES:
+        pending = frontier.counts(topic["id"])["pending"]
+        if checkpoint.is_topic_complete(topic["id"]) and not pending:
+            logger.info("Skipping completed topic: %s", topic["name"])
+        else:
+            topics.append(topic)
+    return checkpoint, topics
 
 
-async def crawl_all_topics(max_urls_per_topic: int = 50):
+async def crawl_all_topics(
+    max_urls_per_topic: int = 50,
+    resume: bool = False,
+    recursive: bool = config.RECURSIVE_ENABLED,
+):
     logger.info("Starting crawl for %d topics", len(config.TECHNOLOGIES))
     logger.info("Max URLs per topic: %d", max_urls_per_topic)
+    if recursive:
+        logger.info(
+            "Recursive crawl: depth %d, %d pages per topic, %d per domain, policy %s",
+            config.RECURSIVE_MAX_DEPTH,
+            config.RECURSIVE_PAGES_PER_TOPIC,
+            config.RECURSIVE_MAX_PAGES_PER_DOMAIN,
+            config.RECURSIVE_LINK_POLICY,
+        )
     logger.info("Storage location: %s", config.BASE_DIR)
 
-    discovered_file = config.BASE_DIR / "discovered_urls_enhanced.json"
-    if not discovered_file.exists():
-        discovered_file = config.BASE_DIR / "discovered_urls.json"
-    if not discovered_file.exists():
-        logger.error("No discovered URLs file found at %s", discovered_file)
-        logger.error("Please run discovery/url_discovery.py first!")
-        return
-
-    logger.info("Loading discovered URLs from %s", discovered_file)
-    discovered_data = json.loads(discovered_file.read_text())
-
     start_time = time.time()
-    total_crawled = 0
-
-    for topic in config.TECHNOLOGIES:
-        try:
-            topic_id = str(topic["id"])
-            if topic_id in discovered_data:
-                urls = discovered_data[topic_id]["urls"]
-                logger.info("Found %d URLs for %s", len(urls), topic["name"])
-                await crawl_topic(topic, urls, max_urls=max_urls_per_topic)
-                total_crawled += min(len(urls), max_urls_per_topic)
-            else:
-                logger.warning("No discovered URLs for %s", topic["name"])
-        except Exception as exc:
-            logger.error("Failed to crawl %s: %s", topic["name"], exc)
-            continue
+    with URLFrontier() as frontier:
+        prepared = prepare_frontier(frontier, max_urls_per_topic, resume, recursive)
+        if prepared is None:
+            return
+        checkpoint, topics = prepared
+        total_crawled, results_location = await crawl_topics(
+            frontier, topics, checkpoint, recursive=recursive
+        )
 
     elapsed = time.time() - start_time
     logger.info("%s", "=" * 60)
     logger.info("Crawl complete!")
     logger.info("Total URLs crawled: %d", total_crawled)
     logger.info("Total time: %.1f minutes", elapsed / 60)
-    logger.info("Results saved to: %s", config.RAW_DATA_DIR)
+    logger.info("Results saved to: %s", results_location)
     logger.info("%s", "=" * 60)
 
 
 if __name__ == "__main__":
-    asyncio.run(crawl_all_topics(max_urls_per_topic=50))
+    parser = argparse.ArgumentParser(description="Crawl discovered URLs for all topics")
+    parser.add_argument("--max-urls", type=int, default=50, help="Max URLs per topic")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the last checkpoint instead of starting over",
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        default=config.RECURSIVE_ENABLED,
+        help="Follow links best-first within the limits of the 'recursive' config section",
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        crawl_all_topics(
+            max_urls_per_topic=args.max_urls, resume=args.resume, recursive=args.recursive
+        )
+    )
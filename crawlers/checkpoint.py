@@ -0,0 +1,99 @@
+"""
+Crash-safe crawl checkpoints.
+
+The checkpoint records which topics are finished and how many URLs were
+completed or permanently failed, so an interrupted run can resume without
+re-fetching completed work. Per-URL state (including what was in flight)
+lives in the frontier database and cached bodies in the persistent
+SmartCache index; the checkpoint keeps the run-level view on top.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+class CrawlCheckpoint:
+    """Periodically and atomically persisted crawl progress."""
+
+    def __init__(
+        self,
+        path: Path = config.CHECKPOINT_FILE,
+        interval: float = config.CHECKPOINT_INTERVAL,
+    ):
+        self.path = Path(path)
+        self.interval = interval
+        self.started_at = time.time()
+        self.completed_topics: List[int] = []
+        self.completed_urls = 0
+        self.failed_urls = 0
+        self._last_save = 0.0
+
+    @classmethod
+    def load(cls, path: Path = config.CHECKPOINT_FILE) -> Optional["CrawlCheckpoint"]:
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            logger.error("Unreadable checkpoint %s: %s", path, exc)
+            return None
+
+        checkpoint = cls(path)
+        checkpoint.started_at = data.get("started_at", checkpoint.started_at)
+        checkpoint.completed_topics = [int(t) for t in data.get("completed_topics", [])]
+        checkpoint.completed_urls = int(data.get("completed_urls", 0))
+        checkpoint.failed_urls = int(data.get("failed_urls", 0))
+        return checkpoint
+
+    def is_topic_complete(self, topic_id: int) -> bool:
+        return int(topic_id) in self.completed_topics
+
+    def mark_topic_complete(self, topic_id: int) -> None:
+        if not self.is_topic_complete(topic_id):
+            self.completed_topics.append(int(topic_id))
+        self.save()
+
+    def record_progress(self, completed: int = 0, failed: int = 0) -> None:
+        """Count finished URLs; ``failed`` only counts URLs out of attempts."""
+        self.completed_urls += completed
+        self.failed_urls += failed
+        self.maybe_save()
+
+    def maybe_save(self) -> None:
+        if time.time() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self) -> None:
+        """Write to a temp file, fsync, then rename over the old checkpoint."""
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "completed_topics": self.completed_topics,
+            "completed_urls": self.completed_urls,
+            "failed_urls": self.failed_urls,
+        }
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump(data, handle)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_path, self.path)
+            self._last_save = time.time()
+            logger.debug("Checkpoint saved: %s", self.path)
+        except OSError as exc:
+            logger.error("Failed to write checkpoint %s: %s", self.path, exc)
+            tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,180 @@
+"""
+Near-duplicate detection for fetched pages.
+
+Pages are fingerprinted with a 64-bit SimHash over word 3-shingles: mirrors,
+reprints and pages differing only in boilerplate land within a few bits of
+each other. Fingerprints are split into ``max_distance + 1`` bands and kept in
+a SQLite LSH index; by the pigeonhole principle two fingerprints within
+``max_distance`` bits share at least one band exactly, so candidates come
+from indexed equality lookups rather than a scan of every stored document.
+"""
+import hashlib
+import re
+import sqlite3
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+SHINGLE_SIZE = 3
+MIN_TOKENS = 20
+_WORD = re.compile(r"\w+", re.UNICODE)
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    topic_id INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    url TEXT NOT NULL,
+    fingerprint INTEGER NOT NULL,
+    PRIMARY KEY (topic_id, content_hash)
+);
+CREATE TABLE IF NOT EXISTS bands (
+    topic_id INTEGER NOT NULL,
+    band INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bands_lookup ON bands (topic_id, band, value);
+"""
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash of ``text``, or None if it is too short to fingerprint reliably."""
+    tokens = _WORD.findall(text.lower())
+    if len(tokens) < MIN_TOKENS:
+        return None
+    shingles = Counter(
+        " ".join(tokens[i : i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    )
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in shingles
+        ),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    weights = np.fromiter(shingles.values(), dtype=np.int64, count=len(shingles))
+    bits = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).astype(np.int64)
+    votes = (weights[:, None] * (2 * bits - 1)).sum(axis=0)
+    return sum(1 << bit for bit in range(64) if votes[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class NearDuplicateIndex:
+    """Per-topic SimHash LSH index of stored pages."""
+
+    def __init__(
+        self,
+        db_path: Path = config.DEDUP_DB,
+        max_distance: int = config.SIMHASH_MAX_DISTANCE,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_distance = max(0, min(max_distance, 15))
+        self.band_count = self.max_distance + 1
+        self.conn = sqlite3.connect(str(self.db_path), isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.duplicates = 0
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def reset(self) -> None:
+        """Forget every stored fingerprint (used for fresh, non-resumed runs)."""
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute("DELETE FROM documents")
+            self.conn.execute("DELETE FROM bands")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _bands(self, fingerprint: int) -> List[int]:
+        width = 64 // self.band_count
+        bands = []
+        for band in range(self.band_count):
+            shift = band * width
+            bits = 64 - shift if band == self.band_count - 1 else width
+            bands.append(_to_signed((fingerprint >> shift) & ((1 << bits) - 1)))
+        return bands
+
+    def find(self, topic_id: int, fingerprint: int) -> Optional[Dict]:
+        """Closest stored document within ``max_distance`` bits, if any."""
+        candidates = set()
+        for band, value in enumerate(self._bands(fingerprint)):
+            candidates.update(
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT content_hash FROM bands WHERE topic_id = ? AND band = ? AND value = ?",
+                    (int(topic_id), band, value),
+                )
+            )
+        best = None
+        for content_hash in candidates:
+            url, stored = self.conn.execute(
+                "SELECT url, fingerprint FROM documents WHERE topic_id = ? AND content_hash = ?",
+                (int(topic_id), content_hash),
+            ).fetchone()
+            distance = hamming(fingerprint, stored % (1 << 64))
+            if distance <= self.max_distance and (best is None or distance < best["distance"]):
+                best = {"content_hash": content_hash, "url": url, "distance": distance}
+        return best
+
+    def add(self, topic_id: int, content_hash: str, url: str, fingerprint: int) -> None:
+        self.conn.execute("BEGIN")
+        try:
+            inserted = self.conn.execute(
+                "INSERT OR IGNORE INTO documents (topic_id, content_hash, url, fingerprint) "
+                "VALUES (?, ?, ?, ?)",
+                (int(topic_id), content_hash, url, _to_signed(fingerprint)),
+            ).rowcount
+            if inserted:
+                self.conn.executemany(
+                    "INSERT INTO bands (topic_id, band, value, content_hash) VALUES (?, ?, ?, ?)",
+                    [
+                        (int(topic_id), band, value, content_hash)
+                        for band, value in enumerate(self._bands(fingerprint))
+                    ],
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def check(self, topic_id: int, result: Dict) -> Optional[Dict]:
+        """Return the earlier page ``result`` duplicates, or record it as new.
+
+        Identical content under another URL counts as a duplicate (distance
+        0); a re-fetch of the same URL does not. Pages without a fingerprint
+        (too short) are never flagged.
+        """
+        fingerprint = result.get("simhash")
+        if fingerprint is None:
+            return None
+        url = result.get("final_url", result["url"])
+        match = self.find(topic_id, fingerprint)
+        if match is not None and match["url"] != url:
+            self.duplicates += 1
+            return match
+        self.add(topic_id, result["content_hash"], url, fingerprint)
+        return None
@@ -0,0 +1,78 @@
+"""
+Append-only handoff of discovered URLs from discovery to the crawler.
+
+Discovery appends one JSON line per finished topic (``tech_id``,
+``tech_name``, ``urls`` and ``count``) and flushes it, so the crawler can
+queue a topic as soon as its search results are in, rather than after the
+whole run has been written out as one JSON document. Readers take the last
+record per topic and accept the older whole-file JSON layouts as well.
+"""
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+logger = logging.getLogger(__name__)
+
+LEGACY_FILES = ("discovered_urls_enhanced.json", "discovered_urls.json")
+
+
+class DiscoveryStream:
+    """Writer for ``DISCOVERY_STREAM_FILE``; a new run starts a new stream."""
+
+    def __init__(self, path: Path = config.DISCOVERY_STREAM_FILE, append: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = self.path.open("a" if append else "w", encoding="utf-8")
+        self.topics = 0
+
+    def write(self, record: Dict) -> None:
+        """Append one topic record and make it visible to readers."""
+        self._handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._handle.flush()
+        self.topics += 1
+
+    def close(self) -> None:
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def iter_records(path: Path) -> Iterator[Dict]:
+    """Topic records of an NDJSON stream; a partly written last line is skipped."""
+    with Path(path).open(encoding="utf-8") as handle:
+        for line in handle:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning("Skipping malformed discovery record in %s", path)
+
+
+def load_discovered(path: Path) -> Dict[str, Dict]:
+    """Discovered URLs keyed by topic id (as a string) from a stream or JSON file."""
+    path = Path(path)
+    if path.suffix == ".ndjson":
+        return {str(record["tech_id"]): record for record in iter_records(path)}
+    return {str(topic_id): entry for topic_id, entry in json.loads(path.read_text()).items()}
+
+
+def latest_discovery_file(directory: Path = config.BASE_DIR) -> Optional[Path]:
+    """Most recently written discovery output in ``directory``, if any."""
+    candidates = [Path(directory) / config.DISCOVERY_STREAM_FILE.name]
+    candidates += [Path(directory) / name for name in LEGACY_FILES]
+    existing = [path for path in candidates if path.exists()]
+    if not existing:
+        return None
+    return max(existing, key=lambda path: path.stat().st_mtime)
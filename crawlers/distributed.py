@@ -0,0 +1,603 @@
+"""
+Sharded crawling with several worker processes.
+
+The frontier partitions URLs into shards by a hash of their registrable
+domain (``distributed.shards`` in the config). The coordinator queues the
+discovery output, deals the shards out to N worker processes and waits.
+Each worker is an ordinary ``AsyncCrawler`` restricted to the shards it
+holds, so a site is fetched by one process at a time: its rate limit and
+adaptive concurrency stay local, and workers share no in-memory state.
+
+Workers report through a small SQLite database next to the frontier
+(``coordinator.db``) instead of a network protocol. They register there,
+heartbeat their progress and renew leases on their shards. A worker that
+runs out of work first takes shards nobody holds, including those of a
+worker whose lease expired (their in-flight URLs are requeued). Otherwise it
+steals the largest pending shards of the busiest worker, up to half of that
+worker's backlog. A worker with a single busy shard is left alone, since
+one site only goes as fast as its own rate limit. The old owner learns of a
+steal at its next heartbeat.
+
+Each worker writes results to its own sink under ``WORKERS_DIR``. The
+coordinator merges them into the configured sink once the workers are done,
+or at the start of the next run after a crash. ``--join`` adds workers to a
+running crawl; they crawl the topics that crawl prepared, which the
+coordinator records with its recursive setting. Worker ids carry the host
+name, but SQLite in WAL mode needs every process on one host, so workers on
+other machines would need the frontier and coordination databases behind a
+server.
+
+Usage:
+    python crawlers/distributed.py --workers 8 --max-urls 50
+    python crawlers/distributed.py --join --workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.async_crawler import (
+    AsyncCrawler,
+    complete_topics,
+    crawl_topics,
+    prepare_frontier,
+    topic_budgets,
+)
+from crawlers.frontier import URLFrontier
+from crawlers.result_sink import ResultSink, make_sink, merge_results
+from crawlers.scheduler import TopicScheduler
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    shard INTEGER PRIMARY KEY,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_shards_owner ON shards (owner);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    claimed INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    steals INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def worker_id(index: int) -> str:
+    """Id of the ``index``-th worker launched from this process."""
+    return f"{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+class ShardCoordinator:
+    """Shard ownership, leases and worker progress in ``COORDINATOR_DB``.
+
+    Every method is a short transaction, so the coordinator process and all
+    workers can hold their own connection to the same database.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = config.COORDINATOR_DB,
+        shards: int = config.DISTRIBUTED_SHARDS,
+        lease: float = config.DISTRIBUTED_LEASE,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.shards = max(1, shards)
+        self.lease = lease
+        self.conn = sqlite3.connect(str(self.db_path), isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def reset(self, topics: Optional[List[Dict]] = None, recursive: bool = False) -> None:
+        """Start a new run: forget earlier workers and leave every shard unowned.
+
+        ``topics`` and ``recursive`` are what the run's workers crawl; they
+        are kept for workers that join later (see ``run_settings``).
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("DELETE FROM workers")
+            self.conn.execute("DELETE FROM shards")
+            self.conn.execute("DELETE FROM meta")
+            self.conn.executemany(
+                "INSERT INTO shards (shard) VALUES (?)", [(shard,) for shard in range(self.shards)]
+            )
+            if topics is not None:
+                self.conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('run', ?)",
+                    (json.dumps({"topics": topics, "recursive": recursive}),),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def run_settings(self) -> Optional[Tuple[List[Dict], bool]]:
+        """Topics and recursive flag of the current run; None if no run recorded them."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'run'").fetchone()
+        if row is None:
+            return None
+        run = json.loads(row[0])
+        return run["topics"], run["recursive"]
+
+    def assign(self, worker_ids: List[str], pending: Dict[int, int]) -> None:
+        """Deal every shard out so the workers start with similar backlogs.
+
+        Shards go largest first to the worker with the least pending work so
+        far; empty shards (which recursive crawls may fill) are spread evenly.
+        """
+        loads = {worker: 0 for worker in worker_ids}
+        held = {worker: 0 for worker in worker_ids}
+        lease_until = time.time() + self.lease
+        rows = []
+        for shard in sorted(range(self.shards), key=lambda shard: -pending.get(shard, 0)):
+            owner = min(worker_ids, key=lambda worker: (loads[worker], held[worker]))
+            loads[owner] += pending.get(shard, 0)
+            held[owner] += 1
+            rows.append((owner, lease_until, shard))
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "UPDATE shards SET owner = ?, lease_until = ? WHERE shard = ?", rows
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def register(self, worker_id: str) -> None:
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO workers (worker_id, host, pid, started_at, heartbeat) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (worker_id, socket.gethostname(), os.getpid(), now, now),
+        )
+
+    def owned(self, worker_id: str) -> Set[int]:
+        rows = self.conn.execute("SELECT shard FROM shards WHERE owner = ?", (worker_id,))
+        return {row[0] for row in rows}
+
+    def heartbeat(self, worker_id: str, claimed: int) -> Set[int]:
+        """Record progress and renew the worker's leases; returns the shards it holds."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE workers SET heartbeat = ?, claimed = ? WHERE worker_id = ?",
+                (now, claimed, worker_id),
+            )
+            self.conn.execute(
+                "UPDATE shards SET lease_until = ? WHERE owner = ?", (now + self.lease, worker_id)
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return self.owned(worker_id)
+
+    def steal(self, worker_id: str, frontier: URLFrontier) -> List[int]:
+        """Give an idle worker more shards; returns the shards it gained.
+
+        Unowned shards and shards with an expired lease that still have
+        pending URLs come first; in-flight URLs of expired shards are
+        requeued, as their worker is presumed dead. Failing that, the
+        busiest worker with more than one pending shard gives up its
+        largest ones, up to half of its backlog.
+        """
+        pending = frontier.pending_by_shard()
+        if not pending:
+            return []
+        now = time.time()
+        gained: List[int] = []
+        expired: List[int] = []
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            backlog: Dict[str, List[int]] = {}
+            rows = self.conn.execute("SELECT shard, owner, lease_until FROM shards").fetchall()
+            for shard, owner, lease_until in rows:
+                if not pending.get(shard) or owner == worker_id:
+                    continue
+                if owner is None:
+                    gained.append(shard)
+                elif lease_until < now:
+                    gained.append(shard)
+                    expired.append(shard)
+                else:
+                    backlog.setdefault(owner, []).append(shard)
+            victims = [owner for owner, shards in backlog.items() if len(shards) > 1]
+            if gained:
+                logger.info("%s takes over %d unowned shards", worker_id, len(gained))
+            elif victims:
+                victim = max(victims, key=lambda owner: sum(pending[s] for s in backlog[owner]))
+                shards = sorted(backlog[victim], key=lambda shard: -pending[shard])
+                half = sum(pending[shard] for shard in shards) / 2
+                taken = 0
+                for shard in shards[:-1]:
+                    if taken >= half:
+                        break
+                    gained.append(shard)
+                    taken += pending[shard]
+                logger.info(
+                    "%s steals %d shards (%d URLs) from %s", worker_id, len(gained), taken, victim
+                )
+            if gained:
+                self.conn.executemany(
+                    "UPDATE shards SET owner = ?, lease_until = ? WHERE shard = ?",
+                    [(worker_id, now + self.lease, shard) for shard in gained],
+                )
+                self.conn.execute(
+                    "UPDATE workers SET steals = steals + ? WHERE worker_id = ?",
+                    (len(gained), worker_id),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        if expired:
+            requeued = frontier.requeue_in_flight(shards=expired)
+            logger.warning(
+                "%s took over %d expired shards, %d in-flight URLs requeued",
+                worker_id,
+                len(expired),
+                requeued,
+            )
+        return gained
+
+    def release(self, worker_id: str) -> List[int]:
+        """Give up a worker's shards; returns them."""
+        shards = sorted(self.owned(worker_id))
+        self.conn.execute(
+            "UPDATE shards SET owner = NULL, lease_until = 0 WHERE owner = ?", (worker_id,)
+        )
+        return shards
+
+    def finish(self, worker_id: str, claimed: int, done: int) -> None:
+        """Record a worker's final counts and release its shards."""
+        now = time.time()
+        self.conn.execute(
+            "UPDATE workers SET heartbeat = ?, finished_at = ?, claimed = ?, done = ? "
+            "WHERE worker_id = ?",
+            (now, now, claimed, done, worker_id),
+        )
+        self.release(worker_id)
+
+    def workers(self) -> List[Dict]:
+        cursor = self.conn.execute(
+            "SELECT worker_id, host, pid, started_at, heartbeat, claimed, done, steals, "
+            "finished_at FROM workers ORDER BY started_at, worker_id"
+        )
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def active_workers(self) -> int:
+        """Workers that have not finished and whose lease is still running."""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM workers WHERE finished_at IS NULL AND heartbeat >= ?",
+            (time.time() - self.lease,),
+        ).fetchone()[0]
+
+
+class ShardScheduler(TopicScheduler):
+    """``TopicScheduler`` over one worker's shards that takes on more when they run dry.
+
+    ``next_eligible_at`` returns None, ending the worker's crawl, only once
+    nothing is pending or in flight anywhere: until then another worker's
+    pages may still queue links into shards this one can take over. Topic
+    page budgets are checked against the shared frontier, so workers claiming
+    at the same moment can overshoot one by a few pages. Once the worker's
+    ``heartbeat`` task has died its leases are about to lapse, and claiming
+    stops with an error rather than racing the worker that takes them over.
+    """
+
+    def __init__(
+        self,
+        frontier: URLFrontier,
+        topics: List[Dict],
+        coordinator: ShardCoordinator,
+        worker_id: str,
+        budgets: Optional[Dict[int, int]] = None,
+        steal_interval: float = config.DISTRIBUTED_HEARTBEAT,
+    ):
+        super().__init__(frontier, topics, budgets=budgets, shards=coordinator.owned(worker_id))
+        self.coordinator = coordinator
+        self.worker_id = worker_id
+        self.steal_interval = steal_interval
+        self.heartbeat: Optional[asyncio.Future] = None
+        self._next_steal = 0.0
+
+    def _check_heartbeat(self) -> None:
+        beat = self.heartbeat
+        if beat is not None and beat.done():
+            error = None if beat.cancelled() else beat.exception()
+            raise RuntimeError(f"worker {self.worker_id} stopped heartbeating") from error
+
+    def pop_batch(self, limit: int) -> List[Dict]:
+        self._check_heartbeat()
+        return super().pop_batch(limit)
+
+    def next_eligible_at(self) -> Optional[float]:
+        self._check_heartbeat()
+        next_at = super().next_eligible_at()
+        if next_at is not None:
+            return next_at
+        now = time.time()
+        if now >= self._next_steal:
+            self._next_steal = now + self.steal_interval
+            gained = self.coordinator.steal(self.worker_id, self.frontier)
+            if gained:
+                self.shards = set(self.shards) | set(gained)
+                next_at = super().next_eligible_at()
+                if next_at is not None:
+                    return next_at
+        return self._next_steal if self.frontier.has_unfinished() else None
+
+
+def worker_sink(worker_id: str) -> ResultSink:
+    """The configured kind of result sink, private to one worker."""
+    directory = config.WORKERS_DIR / worker_id
+    if config.RESULTS_SINK == "sqlite":
+        return make_sink(db_path=directory / config.RESULTS_DB.name)
+    return make_sink(directory=directory)
+
+
+def collect_results() -> int:
+    """Merge the workers' result sinks into the configured sink and remove them."""
+    if not config.WORKERS_DIR.exists():
+        return 0
+    merged = 0
+    with make_sink() as sink:
+        for directory in sorted(path for path in config.WORKERS_DIR.iterdir() if path.is_dir()):
+            database = directory / config.RESULTS_DB.name
+            merged += merge_results(database if database.exists() else directory, sink)
+            shutil.rmtree(directory)
+    return merged
+
+
+async def crawl_shards(
+    worker_id: str, topics: List[Dict], recursive: bool, cpu_workers: int
+) -> int:
+    """Crawl the shards this worker holds or takes over; returns the URLs crawled."""
+    with URLFrontier() as frontier, ShardCoordinator() as coordinator:
+        coordinator.register(worker_id)
+        scheduler = ShardScheduler(
+            frontier, topics, coordinator, worker_id, budgets=topic_budgets(topics, recursive)
+        )
+        logger.info("Worker %s starting with %d shards", worker_id, len(scheduler.shards))
+
+        async def heartbeat():
+            last_beat = time.time()
+            while True:
+                await asyncio.sleep(config.DISTRIBUTED_HEARTBEAT)
+                try:
+                    claimed = sum(scheduler.claimed.values())
+                    scheduler.shards = coordinator.heartbeat(worker_id, claimed)
+                    last_beat = time.time()
+                except Exception as exc:
+                    logger.error("Worker %s heartbeat failed: %s", worker_id, exc)
+                    # Past the lease the shards are being handed to other workers.
+                    if time.time() - last_beat >= config.DISTRIBUTED_LEASE:
+                        raise
+
+        beat = scheduler.heartbeat = asyncio.ensure_future(heartbeat())
+        try:
+            crawled, _ = await crawl_topics(
+                frontier,
+                topics,
+                None,
+                recursive=recursive,
+                scheduler=scheduler,
+                crawler=AsyncCrawler(sink=worker_sink(worker_id), cpu_workers=cpu_workers),
+                # Unclaimed URLs are what idle workers can steal, so claim little at a time.
+                batch_size=min(config.FRONTIER_BATCH_SIZE, config.CONCURRENCY * 2),
+            )
+        finally:
+            beat.cancel()
+        coordinator.finish(worker_id, sum(scheduler.claimed.values()), crawled)
+    logger.info("Worker %s finished: %d URLs crawled", worker_id, crawled)
+    return crawled
+
+
+def run_worker(worker_id: str, topics: List[Dict], recursive: bool, cpu_workers: int) -> None:
+    """Worker process entry point."""
+    asyncio.run(crawl_shards(worker_id, topics, recursive, cpu_workers))
+
+
+def launch_workers(
+    worker_ids: List[str], topics: List[Dict], recursive: bool
+) -> Dict[str, multiprocessing.Process]:
+    # The workers already spread over the cores; they split the parsing pool too.
+    cpu_workers = config.CPU_WORKERS // max(1, len(worker_ids))
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+    for wid in worker_ids:
+        process = context.Process(
+            target=run_worker, args=(wid, topics, recursive, cpu_workers), name=wid
+        )
+        process.start()
+        processes[wid] = process
+    return processes
+
+
+def wait_for_workers(
+    processes: Dict[str, multiprocessing.Process],
+    coordinator: ShardCoordinator,
+    frontier: URLFrontier,
+) -> None:
+    """Wait for the workers, handing the shards of any that crash back to the others."""
+    last_report = time.time()
+    while processes:
+        time.sleep(config.DISTRIBUTED_HEARTBEAT)
+        for wid, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del processes[wid]
+            if process.exitcode != 0:
+                released = coordinator.release(wid)
+                requeued = frontier.requeue_in_flight(shards=released)
+                logger.error(
+                    "Worker %s exited with code %s: %d shards released, %d URLs requeued",
+                    wid,
+                    process.exitcode,
+                    len(released),
+                    requeued,
+                )
+        if time.time() - last_report >= config.CHECKPOINT_INTERVAL:
+            last_report = time.time()
+            workers = coordinator.workers()
+            logger.info(
+                "Progress: %d URLs claimed by %d workers",
+                sum(worker["claimed"] for worker in workers),
+                coordinator.active_workers(),
+            )
+    # Workers added with --join may still be running.
+    while coordinator.active_workers():
+        time.sleep(config.DISTRIBUTED_HEARTBEAT)
+
+
+def crawl_distributed(
+    workers: int = config.DISTRIBUTED_WORKERS,
+    max_urls_per_topic: int = 50,
+    resume: bool = False,
+    recursive: bool = config.RECURSIVE_ENABLED,
+):
+    logger.info(
+        "Starting distributed crawl: %d workers, %d shards",
+        workers,
+        config.DISTRIBUTED_SHARDS,
+    )
+    start_time = time.time()
+    recovered = collect_results()
+    if recovered:
+        logger.info("Merged %d results left by workers of an earlier run", recovered)
+
+    with URLFrontier() as frontier, ShardCoordinator() as coordinator:
+        prepared = prepare_frontier(frontier, max_urls_per_topic, resume, recursive)
+        if prepared is None:
+            return
+        checkpoint, topics = prepared
+        worker_ids = [worker_id(index) for index in range(max(1, workers))]
+        coordinator.reset(topics, recursive)
+        coordinator.assign(worker_ids, frontier.pending_by_shard())
+        wait_for_workers(launch_workers(worker_ids, topics, recursive), coordinator, frontier)
+
+        collect_results()
+        complete_topics(frontier, topics, checkpoint)
+        unfinished = frontier.has_unfinished()
+        worker_stats = coordinator.workers()
+
+    elapsed = time.time() - start_time
+    logger.info("%s", "=" * 60)
+    logger.info("Distributed crawl complete!")
+    for worker in worker_stats:
+        logger.info(
+            "  %s: %d URLs crawled, %d claimed, %d shards taken over",
+            worker["worker_id"],
+            worker["done"],
+            worker["claimed"],
+            worker["steals"],
+        )
+    results_location = (
+        config.RESULTS_DB if config.RESULTS_SINK == "sqlite" else config.PROCESSED_DIR
+    )
+    logger.info("Total URLs crawled: %d", sum(worker["done"] for worker in worker_stats))
+    logger.info("Total time: %.1f minutes", elapsed / 60)
+    logger.info("Results saved to: %s", results_location)
+    if unfinished:
+        logger.warning("URLs are still queued; run again with --resume to finish them")
+    logger.info("%s", "=" * 60)
+
+
+def join_crawl(workers: int = config.DISTRIBUTED_WORKERS):
+    """Add workers to a distributed crawl started elsewhere; they begin by stealing.
+
+    The workers crawl the topics the running crawl prepared, with its
+    recursive setting, whatever this process's config says.
+    """
+    worker_ids = [worker_id(index) for index in range(max(1, workers))]
+    with URLFrontier() as frontier, ShardCoordinator() as coordinator:
+        settings = coordinator.run_settings()
+        if settings is None:
+            logger.error("No distributed crawl to join in %s", coordinator.db_path)
+            return
+        topics, recursive = settings
+        logger.info(
+            "Joining distributed crawl of %d topics with %d workers", len(topics), len(worker_ids)
+        )
+        processes = launch_workers(worker_ids, topics, recursive)
+        wait_for_workers(processes, coordinator, frontier)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crawl discovered URLs with several worker processes"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.DISTRIBUTED_WORKERS,
+        help="Worker processes (default: the 'distributed' config section)",
+    )
+    parser.add_argument("--max-urls", type=int, default=50, help="Max URLs per topic")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the last checkpoint instead of starting over",
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        default=config.RECURSIVE_ENABLED,
+        help="Follow links best-first within the limits of the 'recursive' config section",
+    )
+    parser.add_argument(
+        "--join",
+        action="store_true",
+        help="Add workers to a running distributed crawl instead of starting one "
+        "(they use that crawl's topics and --recursive setting)",
+    )
+    args = parser.parse_args()
+    if args.join:
+        join_crawl(workers=args.workers)
+    else:
+        crawl_distributed(
+            workers=args.workers,
+            max_urls_per_topic=args.max_urls,
+            resume=args.resume,
+            recursive=args.recursive,
+        )
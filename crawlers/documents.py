@@ -0,0 +1,59 @@
+"""
+Text extraction for binary documents (PDFs).
+
+Extraction runs in the CPU worker pool: ``extract_document`` takes a file
+path (cheap to send to a worker) or the raw bytes when the blob store keeps
+no plain file, and returns the text and title. PDF support needs the
+optional ``pypdf`` package; without it documents are still stored but yield
+no text.
+"""
+import io
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Union
+
+try:
+    import pypdf
+except ImportError:  # optional: pip install pypdf
+    pypdf = None
+
+logger = logging.getLogger(__name__)
+
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_warned = False
+
+
+def _extract_pdf(source: Union[str, bytes]) -> Dict:
+    global _warned
+    if pypdf is None:
+        if not _warned:
+            logger.warning("pypdf is not installed; PDF text is not extracted")
+            _warned = True
+        return {"text": "", "title": None}
+    reader = pypdf.PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+    pages = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception as exc:  # one malformed page should not lose the document
+            logger.debug("Skipping unreadable PDF page: %s", exc)
+    title = None
+    try:
+        if reader.metadata is not None and reader.metadata.title:
+            title = str(reader.metadata.title).strip() or None
+    except Exception:
+        pass
+    text = _BLANK_LINES.sub("\n\n", "\n\n".join(pages)).strip()
+    return {"text": text, "title": title}
+
+
+_EXTRACTORS = {"application/pdf": _extract_pdf}
+
+
+def extract_document(source: Union[str, Path, bytes], content_type: str) -> Dict:
+    """Extract ``{"text", "title"}`` from a document; runs in a worker process."""
+    extractor = _EXTRACTORS.get(content_type)
+    if extractor is None:
+        return {"text": "", "title": None}
+    return extractor(str(source) if isinstance(source, Path) else source)
@@ -0,0 +1,422 @@
+"""
+Persistent SQLite-backed URL frontier.
+
+Every URL carries its own state (pending/in-flight/done/failed), priority,
+topic, attempt count and next-eligible time, so the crawl queue lives on disk
+instead of in memory and survives restarts. URLs are also partitioned into
+shards by a hash of their registrable domain, so several crawler processes
+can split the queue without two of them fetching from one site (see
+``crawlers/distributed.py``).
+"""
+import logging
+import sqlite3
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Collection, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.urls import canonicalize_url, domain_shard, url_key
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+STATES = (PENDING, IN_FLIGHT, DONE, FAILED, SKIPPED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    url_key TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    topic_name TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    shard INTEGER NOT NULL DEFAULT 0,
+    priority REAL NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_eligible REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    depth INTEGER NOT NULL DEFAULT 0,
+    parent_url TEXT,
+    added_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (url, topic_id)
+);
+CREATE INDEX IF NOT EXISTS idx_frontier_pop
+    ON frontier (state, priority DESC, id);
+CREATE INDEX IF NOT EXISTS idx_frontier_topic_pop
+    ON frontier (topic_id, state, priority DESC, id);
+CREATE INDEX IF NOT EXISTS idx_frontier_topic_domain
+    ON frontier (topic_id, domain);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_frontier_topic_key
+    ON frontier (topic_id, url_key);
+CREATE INDEX IF NOT EXISTS idx_frontier_shard_pop
+    ON frontier (shard, state, priority DESC, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_COLUMNS = "id, url, topic_id, topic_name, domain, priority, attempts, depth, parent_url"
+
+
+class URLFrontier:
+    """Durable priority queue of URLs to crawl.
+
+    Pops are served from a (state, priority) index, so claiming the next batch
+    is O(log n) regardless of queue size. Inserts are grouped into batched
+    transactions. ``shards`` is the number of domain partitions; the shard
+    of every row is recomputed when it changes between runs.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = config.QUEUE_FILE,
+        insert_batch_size: int = config.FRONTIER_INSERT_BATCH_SIZE,
+        max_attempts: int = config.MAX_RETRIES,
+        shards: int = config.DISTRIBUTED_SHARDS,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.insert_batch_size = insert_batch_size
+        self.max_attempts = max_attempts
+        self.shards = max(1, shards)
+        self.conn = sqlite3.connect(str(self.db_path), isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._assign_shards()
+
+    def _assign_shards(self) -> None:
+        """Recompute every row's shard if the shard count changed since the last run."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'shards'").fetchone()
+        if row is not None and int(row[0]) == self.shards:
+            return
+        self.conn.create_function(
+            "domain_shard", 1, lambda domain: domain_shard(domain, self.shards)
+        )
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute("UPDATE frontier SET shard = domain_shard(domain)")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('shards', ?)", (str(self.shards),)
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    @staticmethod
+    def _row_to_item(row) -> Dict:
+        return {
+            "id": row[0],
+            "url": row[1],
+            "topic_id": row[2],
+            "topic_name": row[3],
+            "domain": row[4],
+            "priority": row[5],
+            "attempts": row[6],
+            "depth": row[7],
+            "parent_url": row[8],
+        }
+
+    def add_many(self, items: Iterable[Dict]) -> int:
+        """Insert URLs in batched transactions; returns the number of new rows.
+
+        Each item needs ``url``, ``topic_id`` and ``topic_name``; ``priority``,
+        ``depth`` and ``parent_url`` (set for links found while crawling) are
+        optional. URLs are canonicalized, and URLs already queued for the same
+        topic under any spelling (see ``crawlers.urls.url_key``) are ignored.
+        """
+        inserted = 0
+        iterator = iter(items)
+        while True:
+            chunk = list(islice(iterator, self.insert_batch_size))
+            if not chunk:
+                break
+            now = time.time()
+            rows = []
+            for item in chunk:
+                url = canonicalize_url(item["url"])
+                domain = urlparse(url).netloc.lower()
+                rows.append(
+                    (
+                        url,
+                        url_key(url),
+                        int(item["topic_id"]),
+                        item["topic_name"],
+                        domain,
+                        domain_shard(domain, self.shards),
+                        float(item.get("priority", 0.0)),
+                        int(item.get("depth", 0)),
+                        item.get("parent_url"),
+                        now,
+                        now,
+                    )
+                )
+            before = self.conn.total_changes
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO frontier "
+                    "(url, url_key, topic_id, topic_name, domain, shard, priority, depth, "
+                    "parent_url, added_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            inserted += self.conn.total_changes - before
+        return inserted
+
+    def seed_topic(
+        self,
+        topic: Dict,
+        urls: Iterable,
+        max_urls: Optional[int] = None,
+        priority: float = 0.0,
+    ) -> int:
+        """Queue discovered URLs for a topic.
+
+        Accepts both discovery output shapes: plain URL strings
+        (enhanced discovery) and dicts with a ``url`` key (basic discovery).
+        ``priority`` applies to entries that do not carry their own.
+        Discovery order is kept as the tie-breaker within equal priority.
+        """
+
+        def items():
+            for entry in islice(urls, max_urls):
+                if isinstance(entry, str):
+                    url, entry_priority = entry, priority
+                else:
+                    url, entry_priority = entry.get("url"), entry.get("priority", priority)
+                if url:
+                    yield {
+                        "url": url,
+                        "topic_id": topic["id"],
+                        "topic_name": topic["name"],
+                        "priority": entry_priority,
+                    }
+
+        return self.add_many(items())
+
+    @staticmethod
+    def _shard_filter(shards: Collection[int], params: list) -> str:
+        params.extend(int(shard) for shard in shards)
+        return f"shard IN ({', '.join('?' * len(shards))}) AND "
+
+    def pop_batch(
+        self,
+        limit: int,
+        topic_id: Optional[int] = None,
+        shards: Optional[Collection[int]] = None,
+    ) -> List[Dict]:
+        """Claim up to ``limit`` eligible URLs, highest priority first.
+
+        With ``shards``, only URLs in those domain partitions are claimed.
+        """
+        if shards is not None and not shards:
+            return []
+        now = time.time()
+        query = f"SELECT {_COLUMNS} FROM frontier WHERE "
+        params: list = []
+        if topic_id is not None:
+            query += "topic_id = ? AND "
+            params.append(int(topic_id))
+        if shards is not None:
+            query += self._shard_filter(shards, params)
+        query += "state = ? AND next_eligible <= ? ORDER BY priority DESC, id LIMIT ?"
+        params.extend([PENDING, now, limit])
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(query, params).fetchall()
+            self.conn.executemany(
+                "UPDATE frontier SET state = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ?",
+                [(IN_FLIGHT, now, row[0]) for row in rows],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        items = [self._row_to_item(row) for row in rows]
+        for item in items:
+            item["attempts"] += 1
+        return items
+
+    def mark_done(self, ids: Iterable[int]) -> None:
+        now = time.time()
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(
+                "UPDATE frontier SET state = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                [(DONE, now, item_id) for item_id in ids],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def mark_failed(self, ids: Iterable[int], error: str = "", retry: bool = True) -> int:
+        """Return URLs to the queue with backoff, or fail them once out of attempts.
+
+        With ``retry=False`` (e.g. a rejected content type) they fail at once.
+        Returns how many URLs were failed for good.
+        """
+        now = time.time()
+        failed = 0
+        self.conn.execute("BEGIN")
+        try:
+            for item_id in ids:
+                row = self.conn.execute(
+                    "SELECT attempts FROM frontier WHERE id = ?", (item_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0]
+                if not retry or attempts >= self.max_attempts:
+                    self.conn.execute(
+                        "UPDATE frontier SET state = ?, last_error = ?, updated_at = ? "
+                        "WHERE id = ?",
+                        (FAILED, error, now, item_id),
+                    )
+                    failed += 1
+                else:
+                    self.conn.execute(
+                        "UPDATE frontier SET state = ?, last_error = ?, next_eligible = ?, "
+                        "updated_at = ? WHERE id = ?",
+                        (PENDING, error, now + config.BACKOFF_FACTOR**attempts, now, item_id),
+                    )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return failed
+
+    def defer(self, ids: Iterable[int], delay: float) -> None:
+        """Hand claimed URLs back untouched, eligible again after ``delay`` seconds.
+
+        Unlike ``mark_failed`` this does not consume an attempt; it is used when
+        a host is throttled and the URL simply has to wait.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(
+                "UPDATE frontier SET state = ?, attempts = MAX(attempts - 1, 0), "
+                "next_eligible = ?, updated_at = ? WHERE id = ?",
+                [(PENDING, now + delay, now, item_id) for item_id in ids],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def requeue_in_flight(
+        self, topic_id: Optional[int] = None, shards: Optional[Collection[int]] = None
+    ) -> int:
+        """Put claimed-but-unfinished URLs back to pending (e.g. after a crash)."""
+        if shards is not None and not shards:
+            return 0
+        query = "UPDATE frontier SET state = ?, updated_at = ? WHERE "
+        params: list = [PENDING, time.time()]
+        if topic_id is not None:
+            query += "topic_id = ? AND "
+            params.append(int(topic_id))
+        if shards is not None:
+            query += self._shard_filter(shards, params)
+        query += "state = ?"
+        params.append(IN_FLIGHT)
+        cursor = self.conn.execute(query, params)
+        return cursor.rowcount
+
+    def skip_pending(self, topic_id: int) -> int:
+        """Park a topic's remaining pending URLs once its page budget is spent."""
+        cursor = self.conn.execute(
+            "UPDATE frontier SET state = ?, updated_at = ? WHERE topic_id = ? AND state = ?",
+            (SKIPPED, time.time(), int(topic_id), PENDING),
+        )
+        return cursor.rowcount
+
+    def domain_counts(
+        self, topic_id: int, domains: Optional[Iterable[str]] = None
+    ) -> Dict[str, int]:
+        """Number of URLs queued per domain for a topic, in any state."""
+        query = "SELECT domain, COUNT(*) FROM frontier WHERE topic_id = ?"
+        params: list = [int(topic_id)]
+        if domains is not None:
+            domains = list(domains)
+            query += f" AND domain IN ({', '.join('?' * len(domains))})"
+            params.extend(domains)
+        return dict(self.conn.execute(query + " GROUP BY domain", params))
+
+    def next_eligible_at(
+        self, topic_id: Optional[int] = None, shards: Optional[Collection[int]] = None
+    ) -> Optional[float]:
+        """Earliest time a pending URL becomes eligible, or None if none are pending."""
+        if shards is not None and not shards:
+            return None
+        query = "SELECT MIN(next_eligible) FROM frontier WHERE "
+        params: list = []
+        if topic_id is not None:
+            query += "topic_id = ? AND "
+            params.append(int(topic_id))
+        if shards is not None:
+            query += self._shard_filter(shards, params)
+        query += "state = ?"
+        params.append(PENDING)
+        return self.conn.execute(query, params).fetchone()[0]
+
+    def pending_by_shard(self) -> Dict[int, int]:
+        """Number of pending URLs in each non-empty shard."""
+        return dict(
+            self.conn.execute(
+                "SELECT shard, COUNT(*) FROM frontier WHERE state = ? GROUP BY shard", (PENDING,)
+            )
+        )
+
+    def has_unfinished(self) -> bool:
+        """True while any URL is pending or in flight."""
+        row = self.conn.execute(
+            "SELECT 1 FROM frontier WHERE state IN (?, ?) LIMIT 1", (PENDING, IN_FLIGHT)
+        ).fetchone()
+        return row is not None
+
+    def counts(self, topic_id: Optional[int] = None) -> Dict[str, int]:
+        query = "SELECT state, COUNT(*) FROM frontier"
+        params: list = []
+        if topic_id is not None:
+            query += " WHERE topic_id = ?"
+            params.append(int(topic_id))
+        query += " GROUP BY state"
+        result = {state: 0 for state in STATES}
+        for state, count in self.conn.execute(query, params):
+            result[state] = count
+        return result
+
+    def reset(self) -> None:
+        """Drop every queued URL (used for fresh, non-resumed runs)."""
+        self.conn.execute("DELETE FROM frontier")
@@ -0,0 +1,196 @@
+"""
+Adaptive per-host concurrency limits (AIMD).
+
+Each host starts at ``HOST_CONCURRENCY_INITIAL`` parallel requests. Every
+``limit`` healthy completions (one "round") the limit grows by one as long as
+p95 latency and the error rate stay under target; a timeout, 5xx or 429 cuts
+it multiplicatively. Fast CDNs climb toward the cap while fragile sites back
+off before a timeout storm builds up.
+"""
+import asyncio
+import logging
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+THROTTLED = "throttled"
+SERVER_ERROR = "server_error"
+_CONGESTION = (TIMEOUT, THROTTLED, SERVER_ERROR)
+
+
+def outcome_for_status(status: Optional[int]) -> str:
+    if status in (429, 503):
+        return THROTTLED
+    if status is not None and status >= 500:
+        return SERVER_ERROR
+    return OK
+
+
+class _HostState:
+    __slots__ = ("limit", "active", "samples", "waiters", "successes", "last_decrease")
+
+    def __init__(self, limit: float, window: int):
+        self.limit = limit
+        self.active = 0
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.successes = 0
+        self.last_decrease = float("-inf")
+
+
+class _HostSlot:
+    """Holds one concurrency slot for a host and reports how the request went."""
+
+    def __init__(self, limiter: "AdaptiveHostLimiter", host: str):
+        self.limiter = limiter
+        self.host = host
+        self.status: Optional[int] = None
+        self.started = 0.0
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.host)
+        self.started = self.limiter.clock()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            outcome = outcome_for_status(self.status)
+        elif issubclass(exc_type, asyncio.TimeoutError):
+            outcome = TIMEOUT
+        else:
+            outcome = ERROR
+        self.limiter.release(self.host, self.limiter.clock() - self.started, outcome)
+        return False
+
+
+class AdaptiveHostLimiter:
+    """Per-host concurrency limiter with additive increase / multiplicative decrease."""
+
+    def __init__(
+        self,
+        initial: int = config.HOST_CONCURRENCY_INITIAL,
+        minimum: int = config.HOST_CONCURRENCY_MIN,
+        maximum: int = config.HOST_CONCURRENCY_MAX,
+        latency_target: float = config.HOST_LATENCY_TARGET,
+        error_threshold: float = config.HOST_ERROR_THRESHOLD,
+        window: int = config.HOST_CONCURRENCY_WINDOW,
+        decrease_factor: float = config.HOST_DECREASE_FACTOR,
+        cooldown: float = config.HOST_DECREASE_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.initial = initial
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.latency_target = latency_target
+        self.error_threshold = error_threshold
+        self.window = window
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.clock = clock
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            limit = min(max(self.initial, self.minimum), self.maximum)
+            state = self._hosts[host] = _HostState(float(limit), self.window)
+        return state
+
+    def slot(self, host: str) -> _HostSlot:
+        """``async with limiter.slot(host) as slot: ...; slot.status = response.status``"""
+        return _HostSlot(self, host)
+
+    async def acquire(self, host: str) -> None:
+        state = self._state(host)
+        while state.active >= int(state.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            state.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in state.waiters:
+                    state.waiters.remove(waiter)
+                else:
+                    # We were woken but will not use the slot; pass it on.
+                    self._wake(state)
+                raise
+        state.active += 1
+
+    def release(self, host: str, latency: float, outcome: str) -> None:
+        state = self._state(host)
+        state.active = max(0, state.active - 1)
+        self._record(host, state, latency, outcome)
+        self._wake(state)
+
+    @staticmethod
+    def _wake(state: _HostState) -> None:
+        free = int(state.limit) - state.active
+        while free > 0 and state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def _record(self, host: str, state: _HostState, latency: float, outcome: str) -> None:
+        state.samples.append((latency, outcome != OK))
+        now = self.clock()
+
+        if outcome in _CONGESTION:
+            state.successes = 0
+            if now - state.last_decrease >= self.cooldown:
+                old = state.limit
+                state.limit = max(float(self.minimum), state.limit * self.decrease_factor)
+                state.last_decrease = now
+                if int(state.limit) != int(old):
+                    logger.info(
+                        "[AIMD] %s: %s, concurrency %d -> %d",
+                        host,
+                        outcome,
+                        int(old),
+                        int(state.limit),
+                    )
+            return
+
+        if outcome != OK:
+            return
+
+        state.successes += 1
+        if state.successes < int(state.limit):
+            return
+        state.successes = 0
+        p95, error_rate = self._health(state)
+        if p95 <= self.latency_target and error_rate <= self.error_threshold:
+            state.limit = min(float(self.maximum), state.limit + 1)
+
+    @staticmethod
+    def _health(state: _HostState) -> Tuple[float, float]:
+        if not state.samples:
+            return 0.0, 0.0
+        latencies = sorted(latency for latency, _ in state.samples)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        error_rate = sum(1 for _, failed in state.samples if failed) / len(state.samples)
+        return p95, error_rate
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Current limit, in-flight count, p95 latency and error rate per host."""
+        result = {}
+        for host, state in self._hosts.items():
+            p95, error_rate = self._health(state)
+            result[host] = {
+                "limit": int(state.limit),
+                "active": state.active,
+                "waiting": len(state.waiters),
+                "p95_latency_ms": round(p95 * 1000, 1),
+                "error_rate": round(error_rate, 3),
+            }
+        return result
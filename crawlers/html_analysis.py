@@ -0,0 +1,99 @@
+"""
+Single-pass HTML document analysis.
+
+Parses a page once with lxml and returns everything downstream stages need:
+resolved links with anchor text, visible text, title, meta tags and the
+canonical URL. Replaces the separate BeautifulSoup parses that link
+extraction and relevance scoring used to do on the same document.
+"""
+from typing import Dict, List, Tuple
+from urllib.parse import urljoin
+
+import lxml.html
+from lxml import etree
+
+_PARSER = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True)
+_INVISIBLE_TAGS = ("script", "style", "noscript", "template")
+# Elements whose boundaries separate words even when the markup has no whitespace.
+_BLOCK_TAGS = tuple(
+    "address article aside blockquote br dd div dl dt figcaption figure footer form "
+    "h1 h2 h3 h4 h5 h6 header hr li main nav ol p pre section table td th tr ul".split()
+)
+
+
+def _empty_analysis(base_url: str) -> Dict:
+    return {
+        "links": [],
+        "text": "",
+        "title": "",
+        "meta": {},
+        "canonical_url": None,
+        "base_url": base_url,
+    }
+
+
+def analyze_html(html: str, url: str) -> Dict:
+    """Parse ``html`` once and extract links, visible text, title, meta and canonical.
+
+    ``links`` is a list of ``(absolute_url, anchor_text)`` pairs resolved
+    against ``<base href>`` when present, otherwise against ``url``. Only
+    http(s) links are kept. ``meta`` maps lowercased ``name``/``property``
+    attributes to their ``content``.
+    """
+    if not html or not html.strip():
+        return _empty_analysis(url)
+    try:
+        root = lxml.html.document_fromstring(html.encode("utf-8", "replace"), parser=_PARSER)
+    except (etree.ParserError, ValueError):
+        return _empty_analysis(url)
+
+    base_url = url
+    base_seen = False
+    title = ""
+    meta: Dict[str, str] = {}
+    canonical_href = None
+    anchors: List[Tuple[str, str]] = []
+
+    for element in root.iter("a", "base", "link", "meta", "title"):
+        tag = element.tag
+        if tag == "a":
+            href = element.get("href")
+            if href:
+                anchors.append((href.strip(), element.text_content()))
+        elif tag == "base":
+            href = element.get("href")
+            if href and not base_seen:
+                base_url = urljoin(url, href.strip())
+                base_seen = True
+        elif tag == "link":
+            rel = (element.get("rel") or "").lower().split()
+            if canonical_href is None and "canonical" in rel:
+                canonical_href = element.get("href")
+        elif tag == "meta":
+            key = element.get("name") or element.get("property")
+            content = element.get("content")
+            if key and content is not None:
+                meta.setdefault(key.lower(), content.strip())
+        elif tag == "title" and not title:
+            title = " ".join((element.text_content() or "").split())
+
+    links = []
+    for href, anchor_text in anchors:
+        absolute_url = urljoin(base_url, href)
+        if absolute_url.startswith("http"):
+            links.append((absolute_url, " ".join(anchor_text.split())))
+
+    etree.strip_elements(root, *_INVISIBLE_TAGS, with_tail=False)
+    for element in root.iter(*_BLOCK_TAGS):
+        element.text = " " + (element.text or "")
+        element.tail = " " + (element.tail or "")
+    text = " ".join(root.text_content().split())
+
+    return {
+        "links": links,
+        "text": text,
+        "title": title,
+        "meta": meta,
+        "canonical_url": urljoin(base_url, canonical_href.strip()) if canonical_href else None,
+        "base_url": base_url,
+    }
@@ -0,0 +1,182 @@
+"""
+Bounded, streaming HTTP body reads.
+
+Responses are checked against the allowed content types and the
+Content-Length cap before any body byte is read, then streamed in chunks
+with a running byte count and SHA-256, so one oversized or binary response
+cannot spike memory or tie up a worker for long. Text is decoded with the
+charset from the header, a BOM or ``<meta>``, falling back to UTF-8 and then
+Windows-1252 without running statistical charset detection. Binary documents
+(PDFs) are streamed to a file instead of memory.
+"""
+import codecs
+import hashlib
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.I)
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_SNIFF_BYTES = 4096
+# Types servers commonly send for documents they do not bother to label.
+_GENERIC_TYPES = ("", "application/octet-stream", "binary/octet-stream")
+_DOCUMENT_EXTENSIONS = {".pdf": "application/pdf"}
+
+
+class BodyRejected(Exception):
+    """The response was not read because of its type or size."""
+
+
+def media_type(content_type: Optional[str]) -> str:
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def type_allowed(content_type: Optional[str], allowed: Iterable[str]) -> bool:
+    """Whether a Content-Type header matches ``allowed`` (``type/subtype`` or ``type/*``)."""
+    mime = media_type(content_type)
+    if not mime:
+        # Missing header: let the body sniffing decide.
+        return True
+    for pattern in allowed:
+        pattern = pattern.lower()
+        if mime == pattern or (pattern.endswith("/*") and mime.startswith(pattern[:-1])):
+            return True
+    return False
+
+
+def document_type(
+    content_type: Optional[str], url: str, binary_types: Iterable[str] = config.FETCH_BINARY_TYPES
+) -> Optional[str]:
+    """Media type to fetch ``url`` as a binary document, or None for text.
+
+    Generic or missing Content-Types fall back to the URL's file extension.
+    """
+    mime = media_type(content_type)
+    if mime in _GENERIC_TYPES:
+        extension = os.path.splitext(urlparse(url).path.lower())[1]
+        mime = _DOCUMENT_EXTENSIONS.get(extension, "")
+    return mime if mime and type_allowed(mime, binary_types) else None
+
+
+def _check_headers(
+    response: aiohttp.ClientResponse, max_bytes: int, allowed_types: Optional[Iterable[str]]
+) -> None:
+    content_type = response.headers.get("Content-Type")
+    if allowed_types is not None and not type_allowed(content_type, allowed_types):
+        raise BodyRejected(f"content type {media_type(content_type)}")
+    declared = response.content_length
+    if max_bytes and declared is not None and declared > max_bytes:
+        raise BodyRejected(f"Content-Length {declared} exceeds {max_bytes}")
+
+
+async def read_body(
+    response: aiohttp.ClientResponse,
+    max_bytes: int = config.FETCH_MAX_BYTES,
+    allowed_types: Iterable[str] = config.FETCH_ALLOWED_TYPES,
+    chunk_size: int = config.FETCH_CHUNK_SIZE,
+) -> Tuple[bytes, str]:
+    """Stream a response body; returns ``(data, sha256_hex)``.
+
+    Raises ``BodyRejected`` before reading on a disallowed Content-Type or an
+    oversized Content-Length, and mid-stream once ``max_bytes`` is exceeded
+    or the first chunk of an untyped response looks binary.
+    """
+    _check_headers(response, max_bytes, allowed_types)
+    content_type = response.headers.get("Content-Type")
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    async for chunk in response.content.iter_chunked(chunk_size):
+        if not size and not content_type and b"\x00" in chunk[:_SNIFF_BYTES]:
+            raise BodyRejected("binary body without Content-Type")
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            raise BodyRejected(f"body exceeds {max_bytes} bytes")
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+async def stream_to_file(
+    response: aiohttp.ClientResponse,
+    directory: Path,
+    max_bytes: int = config.FETCH_MAX_BINARY_BYTES,
+    chunk_size: int = config.FETCH_CHUNK_SIZE,
+) -> Tuple[Path, str, int]:
+    """Stream a response body into a temporary file in ``directory``.
+
+    Returns ``(path, sha256_hex, size)``; the caller owns the file. Raises
+    ``BodyRejected`` (leaving no file behind) on an oversized body.
+    """
+    _check_headers(response, max_bytes, None)
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    handle = tempfile.NamedTemporaryFile(dir=directory, suffix=".part", delete=False)
+    path = Path(handle.name)
+    try:
+        with handle:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise BodyRejected(f"body exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                handle.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path, digest.hexdigest(), size
+
+
+def _known(encoding: Optional[str]) -> Optional[str]:
+    if not encoding:
+        return None
+    try:
+        return codecs.lookup(encoding.strip().strip("\"'")).name
+    except LookupError:
+        return None
+
+
+def detect_encoding(data: bytes, content_type: Optional[str] = None) -> Optional[str]:
+    """Charset declared by the Content-Type header, a BOM or an HTML ``<meta>`` tag."""
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+    if content_type and "charset=" in content_type.lower():
+        declared = _known(content_type.lower().split("charset=", 1)[1].split(";", 1)[0])
+        if declared:
+            return declared
+    match = _META_CHARSET.search(data[:_SNIFF_BYTES])
+    if match:
+        return _known(match.group(1).decode("ascii", "ignore"))
+    return None
+
+
+def decode_body(data: bytes, content_type: Optional[str] = None) -> Tuple[str, str]:
+    """Decode a body to text; returns ``(text, encoding)``.
+
+    The encoding is ``"utf-8"`` only when the bytes were valid UTF-8 without
+    a BOM, i.e. when ``text.encode("utf-8") == data``.
+    """
+    encoding = detect_encoding(data, content_type)
+    if encoding and encoding != "utf-8":
+        return data.decode(encoding, errors="replace"), encoding
+    try:
+        return data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        if encoding == "utf-8":
+            return data.decode("utf-8", errors="replace"), "utf-8-replaced"
+        return data.decode("cp1252", errors="replace"), "cp1252"
@@ -0,0 +1,143 @@
+"""
+Multi-pattern keyword matching and relevance scoring.
+
+Topic keywords and the generic relevance indicators are compiled once into a
+single Aho-Corasick automaton (``pyahocorasick``), so a page is scanned once
+no matter how many keywords or topics it is scored against. Without the
+optional dependency (or for small pattern sets) each distinct pattern is
+counted once with ``str.count``; keywords shared across topics are still
+only counted once per document.
+"""
+import functools
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import ahocorasick
+except ImportError:  # optional: pip install pyahocorasick
+    ahocorasick = None
+
+RELEVANCE_INDICATORS = (
+    "design",
+    "sizing",
+    "calculation",
+    "specification",
+    "installation",
+    "performance",
+    "case study",
+    "manual",
+)
+KEYWORD_WEIGHT = 0.05
+KEYWORD_CAP = 0.3
+INDICATOR_WEIGHT = 0.05
+# Below this many patterns a few C-level str.count scans beat walking the automaton.
+AUTOMATON_MIN_PATTERNS = 24
+
+
+class KeywordMatcher:
+    """Counts non-overlapping occurrences of many patterns in one pass.
+
+    Counts match ``text.count(pattern)`` for every pattern. Patterns are
+    lowercased; callers pass lowercased text.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._index: Dict[str, int] = {}
+        for pattern in patterns:
+            pattern = pattern.lower()
+            if pattern and pattern not in self._index:
+                self._index[pattern] = len(self.patterns)
+                self.patterns.append(pattern)
+
+        self._automaton = None
+        if ahocorasick is not None and len(self.patterns) >= AUTOMATON_MIN_PATTERNS:
+            automaton = ahocorasick.Automaton()
+            for index, pattern in enumerate(self.patterns):
+                automaton.add_word(pattern, (index, len(pattern)))
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def index(self, pattern: str) -> int:
+        return self._index[pattern.lower()]
+
+    def count(self, text: str) -> np.ndarray:
+        """Occurrences of every pattern in ``text``, in pattern order."""
+        counts = np.zeros(len(self.patterns), dtype=np.int64)
+        if not text or not self.patterns:
+            return counts
+        if self._automaton is None:
+            for index, pattern in enumerate(self.patterns):
+                counts[index] = text.count(pattern)
+            return counts
+
+        # The automaton reports overlapping hits; skip those that start inside
+        # the previous hit of the same pattern to keep str.count semantics.
+        next_free = [0] * len(self.patterns)
+        for end, (index, length) in self._automaton.iter(text):
+            start = end - length + 1
+            if start >= next_free[index]:
+                counts[index] += 1
+                next_free[index] = end + 1
+        return counts
+
+
+class RelevanceScorer:
+    """Scores documents against one or more topics' keyword lists.
+
+    Each keyword adds ``0.05`` per occurrence (capped at ``0.3``), each
+    indicator term present adds ``0.05``, and the total is capped at 1.0.
+    All topics share one matcher, so scoring a page against every topic
+    costs a single scan.
+    """
+
+    def __init__(
+        self,
+        topic_keywords: Sequence[Sequence[str]],
+        indicators: Sequence[str] = RELEVANCE_INDICATORS,
+    ):
+        self.matcher = KeywordMatcher(
+            [keyword for keywords in topic_keywords for keyword in keywords] + list(indicators)
+        )
+        size = len(self.matcher.patterns)
+        # A keyword listed twice for a topic counts twice, as it always has.
+        self._weights = np.zeros((len(topic_keywords), size), dtype=np.float64)
+        for row, keywords in enumerate(topic_keywords):
+            for keyword in keywords:
+                if keyword:
+                    self._weights[row, self.matcher.index(keyword)] += 1
+        self._indicators = np.zeros(size, dtype=np.float64)
+        for term in indicators:
+            self._indicators[self.matcher.index(term)] = 1
+
+    @classmethod
+    def for_topics(cls, topics: Sequence[Dict]) -> "RelevanceScorer":
+        """Scorer over ``config.TECHNOLOGIES``-style topic dicts, in their order."""
+        return cls([topic.get("keywords", []) for topic in topics])
+
+    def score_matrix(self, texts: Iterable[str]) -> np.ndarray:
+        """Relevance of every text against every topic, shape ``(texts, topics)``.
+
+        Texts must already be lowercased.
+        """
+        counts = np.array([self.matcher.count(text) for text in texts], dtype=np.float64)
+        if counts.size == 0:
+            return np.zeros((0, self._weights.shape[0]))
+        keyword_scores = np.minimum(counts * KEYWORD_WEIGHT, KEYWORD_CAP) @ self._weights.T
+        indicator_scores = ((counts > 0) @ self._indicators) * INDICATOR_WEIGHT
+        return np.minimum(keyword_scores + indicator_scores[:, None], 1.0)
+
+    def score(self, text: str) -> np.ndarray:
+        """Relevance of one lowercased text against every topic."""
+        return self.score_matrix([text])[0]
+
+
+@functools.lru_cache(maxsize=256)
+def _scorer_for(keywords: Tuple[str, ...]) -> RelevanceScorer:
+    return RelevanceScorer([keywords])
+
+
+def score_relevance(text: str, keywords: List[str]) -> float:
+    """Keyword relevance of lowercased page ``text``, in [0, 1]."""
+    return float(_scorer_for(tuple(keywords)).score(text)[0])
@@ -0,0 +1,181 @@
+"""
+Best-first link expansion for recursive crawls.
+
+Turns the links of a fetched page into scored frontier items. A link's score
+combines the relevance of the page it was found on, topic keywords and
+relevance indicators in its anchor text and URL, and priority-domain
+membership, decayed per hop. The frontier pops highest score first, so the
+fetch budget goes to the most promising pages rather than to whatever is
+closest to the seeds.
+"""
+import functools
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.frontier import URLFrontier
+from crawlers.keyword_matcher import RELEVANCE_INDICATORS, KeywordMatcher
+from crawlers.urls import canonicalize_url, registrable_domain, url_key
+
+LINK_POLICIES = ("same_site", "priority_off_site", "any")
+
+_SKIP_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".bmp", ".tif", ".tiff",
+    ".mp3", ".mp4", ".avi", ".mov", ".wmv", ".webm", ".wav",
+    ".zip", ".gz", ".tgz", ".rar", ".7z", ".tar", ".exe", ".dmg", ".msi", ".iso",
+    ".css", ".js", ".woff", ".woff2", ".ttf", ".eot",
+)
+
+
+def _matches(host: str, domains) -> bool:
+    hostname = host.split(":", 1)[0]
+    return any(hostname == domain or hostname.endswith("." + domain) for domain in domains)
+
+
+@functools.lru_cache(maxsize=256)
+def _anchor_matcher(keywords: Tuple[str, ...]) -> Tuple[KeywordMatcher, List[int], List[int]]:
+    matcher = KeywordMatcher(list(keywords) + list(RELEVANCE_INDICATORS))
+    keyword_ids = sorted({matcher.index(keyword) for keyword in keywords if keyword})
+    indicator_ids = sorted({matcher.index(term) for term in RELEVANCE_INDICATORS})
+    return matcher, keyword_ids, indicator_ids
+
+
+def anchor_score(anchor_text: str, url: str, keywords: List[str]) -> float:
+    """Keyword evidence in a link's anchor text and URL path, in [0, 1]."""
+    path = urlparse(url).path.replace("-", " ").replace("_", " ").replace("/", " ")
+    matcher, keyword_ids, indicator_ids = _anchor_matcher(tuple(keywords))
+    counts = matcher.count(f"{anchor_text} {path}".lower())
+    keyword_hits = sum(1 for index in keyword_ids if counts[index])
+    indicator_hits = sum(1 for index in indicator_ids if counts[index])
+    return min(1.0, 0.5 * keyword_hits + 0.25 * indicator_hits)
+
+
+class LinkExpander:
+    """Scores and filters a page's links into frontier items for the next hop."""
+
+    def __init__(
+        self,
+        frontier: URLFrontier,
+        max_depth: int = config.RECURSIVE_MAX_DEPTH,
+        max_pages_per_domain: int = config.RECURSIVE_MAX_PAGES_PER_DOMAIN,
+        max_links_per_page: int = config.RECURSIVE_MAX_LINKS_PER_PAGE,
+        link_policy: str = config.RECURSIVE_LINK_POLICY,
+        min_parent_relevance: float = config.RECURSIVE_MIN_RELEVANCE,
+        depth_decay: float = config.RECURSIVE_DEPTH_DECAY,
+        weights: Optional[Dict[str, float]] = None,
+        priority_domains: Optional[List[str]] = None,
+        exclude_domains: Optional[List[str]] = None,
+    ):
+        if link_policy not in LINK_POLICIES:
+            raise ValueError(
+                f"Unknown link policy: {link_policy!r} (use {', '.join(LINK_POLICIES)})"
+            )
+        self.frontier = frontier
+        self.max_depth = max_depth
+        self.max_pages_per_domain = max_pages_per_domain
+        self.max_links_per_page = max_links_per_page
+        self.link_policy = link_policy
+        self.min_parent_relevance = min_parent_relevance
+        self.depth_decay = depth_decay
+        self.weights = weights or config.RECURSIVE_LINK_WEIGHTS
+        if priority_domains is None:
+            priority_domains = config.PRIORITY_DOMAINS
+        if exclude_domains is None:
+            exclude_domains = config.EXCLUDE_DOMAINS
+        self.priority_domains = [domain.lower() for domain in priority_domains]
+        self.exclude_domains = [domain.lower() for domain in exclude_domains]
+        self._domain_counts: Dict[int, Dict[str, int]] = {}
+        self.queued = 0
+
+    def _allowed_site(self, parent_host: str, host: str) -> bool:
+        if self.link_policy == "any":
+            return True
+        if registrable_domain(host) == registrable_domain(parent_host):
+            return True
+        return self.link_policy == "priority_off_site" and _matches(host, self.priority_domains)
+
+    def score(self, parent_relevance: float, anchor: float, priority: bool, depth: int) -> float:
+        weights = self.weights
+        total = sum(weights.values()) or 1.0
+        base = (
+            weights["parent_relevance"] * parent_relevance
+            + weights["anchor"] * anchor
+            + weights["priority_domain"] * (1.0 if priority else 0.0)
+        ) / total
+        return base * self.depth_decay ** max(depth - 1, 0)
+
+    def candidates(self, item: Dict, result: Dict, keywords: List[str]) -> List[Dict]:
+        """Scored next-hop items for one fetched page, best first.
+
+        ``item`` is the frontier row that was fetched; ``result`` must carry
+        ``links`` and ``relevance`` (see ``AsyncCrawler.annotate``).
+        """
+        depth = int(item.get("depth", 0)) + 1
+        relevance = float(result.get("relevance") or 0.0)
+        if depth > self.max_depth or relevance < self.min_parent_relevance:
+            return []
+
+        parent_url = result.get("final_url", item["url"])
+        parent_key = url_key(parent_url)
+        parent_host = urlparse(parent_url).netloc.lower()
+        domain_counts = self._domain_counts.get(item["topic_id"])
+        if domain_counts is None:
+            domain_counts = self.frontier.domain_counts(item["topic_id"])
+            self._domain_counts[item["topic_id"]] = domain_counts
+
+        scored: Dict[str, Dict] = {}
+        for link, anchor_text in result.get("links", []):
+            url = canonicalize_url(link)
+            parsed = urlparse(url)
+            host = parsed.netloc.lower()
+            if parsed.scheme not in ("http", "https") or not host:
+                continue
+            key = url_key(url)
+            if key == parent_key or parsed.path.lower().endswith(_SKIP_EXTENSIONS):
+                continue
+            if _matches(host, self.exclude_domains) or not self._allowed_site(parent_host, host):
+                continue
+            priority = self.score(
+                relevance,
+                anchor_score(anchor_text, url, keywords),
+                _matches(host, self.priority_domains),
+                depth,
+            )
+            if key not in scored or scored[key]["priority"] < priority:
+                scored[key] = {
+                    "url": url,
+                    "topic_id": item["topic_id"],
+                    "topic_name": item["topic_name"],
+                    "priority": priority,
+                    "depth": depth,
+                    "parent_url": parent_url,
+                }
+
+        selected = []
+        planned: Dict[str, int] = {}
+        for candidate in sorted(scored.values(), key=lambda c: -c["priority"]):
+            if len(selected) >= self.max_links_per_page:
+                break
+            host = urlparse(candidate["url"]).netloc.lower()
+            if domain_counts.get(host, 0) + planned.get(host, 0) >= self.max_pages_per_domain:
+                continue
+            planned[host] = planned.get(host, 0) + 1
+            selected.append(candidate)
+        return selected
+
+    def expand(self, item: Dict, result: Dict, keywords: List[str]) -> int:
+        """Queue the page's best links in the frontier; returns how many were new."""
+        candidates = self.candidates(item, result, keywords)
+        if not candidates:
+            return 0
+        added = self.frontier.add_many(candidates)
+        self.queued += added
+        # Links already in the frontier were ignored; refresh the exact per-domain counts.
+        hosts = {urlparse(candidate["url"]).netloc.lower() for candidate in candidates}
+        self._domain_counts[item["topic_id"]].update(
+            self.frontier.domain_counts(item["topic_id"], hosts)
+        )
+        return added
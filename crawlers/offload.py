@@ -0,0 +1,138 @@
+"""
+Off-loop execution for CPU-bound and blocking work.
+
+Parsing and scoring a large page can take tens of milliseconds, and cache or
+result writes block on disk; run on the event loop either one stalls every
+open socket. ``Offloader`` sends CPU work to a process pool and blocking I/O
+to a thread pool, and ``LoopLagMonitor`` measures how late the loop wakes up
+so the effect is visible in crawl stats.
+"""
+import asyncio
+import contextlib
+import functools
+import logging
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.dedup import simhash
+from crawlers.html_analysis import analyze_html
+from crawlers.keyword_matcher import score_relevance
+
+logger = logging.getLogger(__name__)
+
+
+def process_page(content: str, url: str, keywords: List[str]) -> Dict:
+    """Parse and score one page; runs in a worker process, so it must stay picklable."""
+    analysis = analyze_html(content, url)
+    return {
+        "title": analysis["title"],
+        "canonical_url": analysis["canonical_url"],
+        "links": analysis["links"],
+        "relevance": score_relevance(analysis["text"].lower(), keywords),
+        "simhash": simhash(analysis["text"]),
+        "text": analysis["text"],
+    }
+
+
+def process_document(text: str, url: str, keywords: List[str], title: Optional[str] = None) -> Dict:
+    """Score text extracted from a binary document; the counterpart of ``process_page``."""
+    return {
+        "title": title,
+        "canonical_url": None,
+        "links": [],
+        "relevance": score_relevance(text.lower(), keywords),
+        "simhash": simhash(text),
+        "text": text,
+    }
+
+
+class Offloader:
+    """Process pool for CPU-bound work plus a thread pool for blocking I/O.
+
+    With ``cpu_workers=0`` CPU work runs inline, which is cheaper for tiny
+    pages and useful when debugging.
+    """
+
+    def __init__(self, cpu_workers: int = config.CPU_WORKERS, io_workers: int = config.IO_WORKERS):
+        self.cpu_workers = cpu_workers
+        self._cpu_pool: Optional[ProcessPoolExecutor] = (
+            ProcessPoolExecutor(max_workers=cpu_workers) if cpu_workers > 0 else None
+        )
+        self._io_pool = ThreadPoolExecutor(
+            max_workers=max(1, io_workers), thread_name_prefix="crawler-io"
+        )
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs) -> Any:
+        if self._cpu_pool is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._cpu_pool, functools.partial(fn, *args, **kwargs)
+            )
+        except BrokenProcessPool:
+            # A worker died (OOM, segfault in a parser); keep crawling without the pool.
+            logger.error("CPU worker pool broke; parsing inline from now on")
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu_pool = None
+            return fn(*args, **kwargs)
+
+    async def run_io(self, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_pool, functools.partial(fn, *args, **kwargs))
+
+    def close(self) -> None:
+        # Let pending writes land; parsing that nobody awaits any more can go.
+        self._io_pool.shutdown(wait=True)
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=True, cancel_futures=True)
+            self._cpu_pool = None
+
+
+class LoopLagMonitor:
+    """Samples event-loop lag: how much later than scheduled a sleep wakes up."""
+
+    def __init__(self, interval: float = config.LOOP_LAG_INTERVAL, window: int = 1000):
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        """Mean and p99 over the recent window and the all-time max, in milliseconds."""
+        if not self.samples:
+            return {"samples": 0, "mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        lags = sorted(self.samples)
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        return {
+            "samples": len(lags),
+            "mean_ms": round(sum(lags) / len(lags) * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
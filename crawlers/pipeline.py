@@ -0,0 +1,97 @@
+"""
+Combined discovery + crawl.
+
+Runs enhanced URL discovery and the crawler in one event loop over one
+frontier. Each topic is queued as soon as its search results are in, and
+the crawler starts on it while later topics are still being discovered, so
+a fresh topic set takes roughly max(discovery, crawl) rather than their sum.
+The discovery stream and JSON output are written as in a standalone run.
+
+Usage:
+    python crawlers/pipeline.py --max-urls 50
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.async_crawler import crawl_topics, queue_discovered, reset_crawl_state
+from crawlers.checkpoint import CrawlCheckpoint
+from crawlers.frontier import URLFrontier
+from discovery.enhanced_url_discovery import EnhancedURLDiscovery
+
+logger = logging.getLogger(__name__)
+
+
+async def discover_and_crawl(
+    max_urls_per_topic: int = 50,
+    recursive: bool = config.RECURSIVE_ENABLED,
+):
+    logger.info("Starting discovery + crawl for %d topics", len(config.TECHNOLOGIES))
+    start_time = time.time()
+    topics = list(config.TECHNOLOGIES)
+    topics_by_id = {int(topic["id"]): topic for topic in topics}
+    first_topic_at = []
+
+    with URLFrontier() as frontier:
+        reset_crawl_state(frontier)
+        checkpoint = CrawlCheckpoint()
+        checkpoint.save()
+        feed_done = asyncio.Event()
+
+        def on_topic(result: Dict) -> None:
+            topic = topics_by_id.get(int(result["tech_id"]))
+            if topic is None:
+                return
+            if not first_topic_at:
+                first_topic_at.append(time.time() - start_time)
+            queue_discovered(frontier, topic, result["urls"], max_urls_per_topic, recursive)
+
+        async def discover():
+            try:
+                async with EnhancedURLDiscovery(on_topic=on_topic) as discovery:
+                    await discovery.discover_all()
+            finally:
+                feed_done.set()
+            return time.time() - start_time
+
+        discovery_task = asyncio.ensure_future(discover())
+        try:
+            total_crawled, results_location = await crawl_topics(
+                frontier, topics, checkpoint, recursive=recursive, feed_done=feed_done
+            )
+        except BaseException:
+            discovery_task.cancel()
+            # Let discovery unwind without masking the crawl's own error.
+            await asyncio.gather(discovery_task, return_exceptions=True)
+            raise
+        discovery_seconds = await discovery_task
+
+    elapsed = time.time() - start_time
+    logger.info("%s", "=" * 60)
+    logger.info("Discovery + crawl complete!")
+    if first_topic_at:
+        logger.info("First topic queued after %.1fs", first_topic_at[0])
+    logger.info("Discovery finished after %.1fs", discovery_seconds)
+    logger.info("Total URLs crawled: %d", total_crawled)
+    logger.info("Total time: %.1f minutes", elapsed / 60)
+    logger.info("Results saved to: %s", results_location)
+    logger.info("%s", "=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discover and crawl URLs for all topics at once")
+    parser.add_argument("--max-urls", type=int, default=50, help="Max URLs per topic")
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        default=config.RECURSIVE_ENABLED,
+        help="Follow links best-first within the limits of the 'recursive' config section",
+    )
+    args = parser.parse_args()
+    asyncio.run(discover_and_crawl(max_urls_per_topic=args.max_urls, recursive=args.recursive))
@@ -0,0 +1,136 @@
+"""
+Per-host request rate limiting.
+
+Uses GCRA, the reservation form of a token bucket: each request reserves the
+next free slot for its host synchronously (no await between read and write),
+so concurrent coroutines hitting the same host are spaced out instead of
+bursting together after reading the same timestamp. A lock makes the same
+reservation safe from worker threads.
+"""
+import asyncio
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _matches(host: str, domain: str) -> bool:
+    return host == domain or host.endswith("." + domain)
+
+
+class DomainRateLimiter:
+    """Token-bucket rate limiter keyed by host, with server back-off support.
+
+    ``default_interval`` is the steady-state spacing between requests to one
+    host (``RATE_LIMIT``); ``burst`` requests may go out back to back. Hosts in
+    ``domain_intervals`` use their own spacing and priority domains run
+    ``priority_multiplier`` times faster. ``backoff`` blocks a host after a
+    429/503 until its Retry-After has passed.
+    """
+
+    def __init__(
+        self,
+        default_interval: float = config.RATE_LIMIT,
+        burst: int = config.RATE_LIMIT_BURST,
+        domain_intervals: Optional[Dict[str, float]] = None,
+        priority_domains: Optional[List[str]] = None,
+        priority_multiplier: float = config.PRIORITY_RATE_MULTIPLIER,
+        default_backoff: float = config.RATE_LIMIT_BACKOFF,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.default_interval = default_interval
+        self.burst = max(1, burst)
+        if domain_intervals is None:
+            domain_intervals = config.DOMAIN_RATE_LIMITS
+        self.domain_intervals = {
+            domain.lower(): float(interval) for domain, interval in domain_intervals.items()
+        }
+        if priority_domains is None:
+            priority_domains = config.PRIORITY_DOMAINS
+        self.priority_domains = [domain.lower() for domain in priority_domains]
+        self.priority_multiplier = max(priority_multiplier, 1e-6)
+        self.default_backoff = default_backoff
+        self.clock = clock
+        self._intervals: Dict[str, float] = {}
+        self._tat: Dict[str, float] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def interval_for(self, host: str) -> float:
+        interval = self._intervals.get(host)
+        if interval is None:
+            hostname = host.split(":", 1)[0]
+            interval = self.default_interval
+            for domain, domain_interval in self.domain_intervals.items():
+                if _matches(hostname, domain):
+                    interval = domain_interval
+                    break
+            else:
+                if any(_matches(hostname, domain) for domain in self.priority_domains):
+                    interval = self.default_interval / self.priority_multiplier
+            self._intervals[host] = interval
+        return interval
+
+    def _next_slot(self, host: str, now: float):
+        interval = self.interval_for(host)
+        tat = max(self._tat.get(host, now), now, self._blocked_until.get(host, 0.0))
+        slot = max(now, tat - interval * (self.burst - 1), self._blocked_until.get(host, 0.0))
+        return slot, max(tat, slot) + interval
+
+    def reserve(self, host: str) -> float:
+        """Reserve the next slot for ``host``; returns the seconds to wait for it."""
+        with self._lock:
+            now = self.clock()
+            slot, self._tat[host] = self._next_slot(host, now)
+        return slot - now
+
+    def try_reserve(self, host: str) -> float:
+        """Reserve a slot only if one is free now; else the seconds until one is.
+
+        Unlike ``reserve`` this never books a future slot, so a caller that
+        gives up while waiting does not leave an unused reservation behind.
+        """
+        with self._lock:
+            now = self.clock()
+            slot, tat = self._next_slot(host, now)
+            if slot <= now:
+                self._tat[host] = tat
+        return slot - now
+
+    async def acquire(self, host: str) -> None:
+        delay = self.reserve(host)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def backoff(self, host: str, retry_after: Optional[float] = None) -> float:
+        """Block ``host`` after a throttling response; returns the back-off in seconds."""
+        delay = self.default_backoff if retry_after is None else retry_after
+        with self._lock:
+            until = self.clock() + delay
+            if until > self._blocked_until.get(host, 0.0):
+                self._blocked_until[host] = until
+        return delay
@@ -0,0 +1,294 @@
+"""
+Batched storage for crawl results.
+
+One JSON file per page does not scale: millions of tiny files exhaust inodes
+and crawl on network storage. A ``ResultSink`` buffers result records (page
+metadata, scores and the processed text) and writes them in batches, either
+as transactions into a SQLite database indexed by topic, content hash and
+timestamp, or appended to per-topic JSONL files under ``PROCESSED_DIR``.
+Buffers are flushed when a record arrives and ``batch_size`` records are
+waiting or ``flush_interval`` seconds have passed, when ``flush`` is called,
+and on close. A hard crash loses whatever is still buffered; the crawler
+flushes the sink before it marks URLs done in the frontier (and at least
+every ``flush_interval`` while results keep coming), so lost results belong
+to URLs that ``--resume`` fetches again.
+"""
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDS = (
+    "url",
+    "final_url",
+    "topic_id",
+    "topic_name",
+    "content_hash",
+    "timestamp",
+    "title",
+    "canonical_url",
+    "content_type",
+    "relevance",
+    "depth",
+    "parent_url",
+    "duplicate_of",
+    "link_count",
+    "content_length",
+    "from_cache",
+    "text",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    final_url TEXT,
+    topic_id INTEGER NOT NULL,
+    topic_name TEXT,
+    content_hash TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    title TEXT,
+    canonical_url TEXT,
+    content_type TEXT,
+    relevance REAL,
+    depth INTEGER NOT NULL DEFAULT 0,
+    parent_url TEXT,
+    duplicate_of TEXT,
+    link_count INTEGER NOT NULL DEFAULT 0,
+    content_length INTEGER NOT NULL DEFAULT 0,
+    from_cache INTEGER NOT NULL DEFAULT 0,
+    text TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_results_topic_url ON results (topic_id, url);
+CREATE INDEX IF NOT EXISTS idx_results_hash ON results (content_hash);
+CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results (timestamp);
+"""
+
+
+def result_record(result: Dict, topic_id: int) -> Dict:
+    """Flatten an annotated crawl result into a sink record."""
+    return {
+        "url": result["url"],
+        "final_url": result.get("final_url", result["url"]),
+        "topic_id": int(topic_id),
+        "topic_name": result["topic_name"],
+        "content_hash": result["content_hash"],
+        "timestamp": result["timestamp"],
+        "title": result.get("title"),
+        "canonical_url": result.get("canonical_url"),
+        "content_type": result.get("content_type"),
+        "relevance": result.get("relevance"),
+        "depth": result.get("depth", 0),
+        "parent_url": result.get("parent_url"),
+        "duplicate_of": result.get("duplicate_of"),
+        "link_count": len(result.get("links", [])),
+        "content_length": len(result.get("content") or ""),
+        "from_cache": bool(result.get("from_cache", False)),
+        "text": result.get("text"),
+    }
+
+
+class ResultSink:
+    """Buffers result records and writes them in batches.
+
+    ``add`` may be called from several I/O threads at once.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = config.RESULTS_BATCH_SIZE,
+        flush_interval: float = config.RESULTS_FLUSH_INTERVAL,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._buffer: List[Dict] = []
+        self._last_flush = time.monotonic()
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add(self, result: Dict, topic_id: int) -> None:
+        self.add_record(result_record(result, topic_id))
+
+    def add_record(self, record: Dict) -> None:
+        """Queue a record already in sink form, e.g. one read back from another sink."""
+        with self.lock:
+            self._buffer.append(record)
+            if (
+                len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        records, self._buffer = self._buffer, []
+        self._write(records)
+        self.written += len(records)
+        logger.debug("Flushed %d results", len(records))
+
+    def _write(self, records: List[Dict]) -> None:
+        raise NotImplementedError
+
+    @property
+    def location(self) -> Path:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.flush()
+
+
+class SQLiteResultSink(ResultSink):
+    """Results in one SQLite table; a re-crawled URL replaces its earlier row."""
+
+    def __init__(self, db_path: Path = config.RESULTS_DB, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(
+            str(self.db_path), isolation_level=None, timeout=30, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    @property
+    def location(self) -> Path:
+        return self.db_path
+
+    def _write(self, records: List[Dict]) -> None:
+        columns = ", ".join(RESULT_FIELDS)
+        placeholders = ", ".join("?" for _ in RESULT_FIELDS)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO results ({columns}) VALUES ({placeholders})",
+                [tuple(record[field] for field in RESULT_FIELDS) for record in records],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def close(self) -> None:
+        super().close()
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+
+class JSONLResultSink(ResultSink):
+    """Append-only ``topic_NNN.jsonl`` files, one record per line."""
+
+    def __init__(self, directory: Path = config.PROCESSED_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def location(self) -> Path:
+        return self.directory
+
+    def _write(self, records: List[Dict]) -> None:
+        by_topic: Dict[int, List[str]] = {}
+        for record in records:
+            by_topic.setdefault(record["topic_id"], []).append(
+                json.dumps(record, ensure_ascii=False)
+            )
+        for topic_id, lines in by_topic.items():
+            path = self.directory / f"topic_{topic_id:03d}.jsonl"
+            with path.open("a", encoding="utf-8") as handle:
+                handle.write("\n".join(lines) + "\n")
+
+
+def make_sink(kind: str = config.RESULTS_SINK, **kwargs) -> ResultSink:
+    """Build the configured result sink."""
+    if kind == "sqlite":
+        return SQLiteResultSink(**kwargs)
+    if kind == "jsonl":
+        return JSONLResultSink(**kwargs)
+    raise ValueError(f"Unknown result sink: {kind!r} (use sqlite or jsonl)")
+
+
+def merge_results(source: Path, sink: ResultSink) -> int:
+    """Copy every record of a results database or JSONL directory into ``sink``."""
+    merged = 0
+    for record in read_results(source):
+        sink.add_record({field: record.get(field) for field in RESULT_FIELDS})
+        merged += 1
+    sink.flush()
+    return merged
+
+
+def query_results(
+    db_path: Path = config.RESULTS_DB,
+    topic_id: Optional[int] = None,
+    content_hash: Optional[str] = None,
+    since: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Iterator[Dict]:
+    """Read records from a SQLite results database, oldest first.
+
+    ``since`` is an ISO timestamp; every filter is served by an index.
+    """
+    clauses, params = [], []
+    if topic_id is not None:
+        clauses.append("topic_id = ?")
+        params.append(int(topic_id))
+    if content_hash is not None:
+        clauses.append("content_hash = ?")
+        params.append(content_hash)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    sql = f"SELECT {', '.join(RESULT_FIELDS)} FROM results"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY timestamp"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    try:
+        for row in conn.execute(sql, params):
+            record = dict(zip(RESULT_FIELDS, row))
+            record["from_cache"] = bool(record["from_cache"])
+            yield record
+    finally:
+        conn.close()
+
+
+def read_results(path: Path) -> Iterator[Dict]:
+    """Records from a results database, a JSONL file or a directory of JSONL files."""
+    path = Path(path)
+    if path.is_dir():
+        for file in sorted(path.glob("*.jsonl")):
+            yield from read_results(file)
+    elif path.suffix == ".jsonl":
+        with path.open("r", encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from query_results(path)
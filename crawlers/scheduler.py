@@ -0,0 +1,123 @@
+"""
+Cross-topic crawl scheduler.
+
+Interleaves URLs from every topic in the frontier so one long-lived crawler
+can keep its connection pool busy for the whole run, instead of draining
+topics one after another.
+"""
+import logging
+import sys
+from pathlib import Path
+from typing import Collection, Dict, List, Optional, Set
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.frontier import DONE, FAILED, IN_FLIGHT, PENDING, URLFrontier
+
+logger = logging.getLogger(__name__)
+
+
+class TopicScheduler:
+    """Weighted fair-share (stride) scheduling of frontier pops across topics.
+
+    Each topic advances a virtual "pass" by ``claimed / weight``; the topic
+    with the lowest pass is served next, so over time topics receive fetch
+    slots in proportion to their ``weight`` from the topic config. Topics that
+    were idle rejoin at the current virtual time rather than catching up in a
+    burst.
+
+    ``budgets`` optionally caps the pages fetched per topic (recursive crawls):
+    once a topic's done, failed and in-flight URLs reach its budget, its
+    remaining pending URLs are skipped.
+
+    ``shards`` restricts claims to those frontier shards (a distributed
+    worker's share of the domains); it may be replaced between calls.
+    """
+
+    def __init__(
+        self,
+        frontier: URLFrontier,
+        topics: List[Dict],
+        quantum: int = config.SCHEDULER_QUANTUM,
+        budgets: Optional[Dict[int, int]] = None,
+        shards: Optional[Collection[int]] = None,
+    ):
+        self.frontier = frontier
+        self.shards = shards
+        self.quantum = max(1, quantum)
+        self.weights: Dict[int, float] = {
+            int(topic["id"]): max(float(topic.get("weight", 1.0)), 0.01) for topic in topics
+        }
+        self.passes: Dict[int, float] = {topic_id: 0.0 for topic_id in self.weights}
+        self.claimed: Dict[int, int] = {topic_id: 0 for topic_id in self.weights}
+        self.virtual_time = 0.0
+        self.budgets = {int(topic_id): budget for topic_id, budget in (budgets or {}).items()}
+        self.exhausted: Set[int] = set()
+
+    def _remaining(self, topic_id: int, counts: Dict[int, Dict[str, int]]) -> Optional[int]:
+        """Pages left in a topic's budget; ``counts`` caches state counts per topic."""
+        budget = self.budgets.get(topic_id)
+        if budget is None:
+            return None
+        if topic_id not in counts:
+            counts[topic_id] = self.frontier.counts(topic_id)
+        topic_counts = counts[topic_id]
+        remaining = (
+            budget - topic_counts[DONE] - topic_counts[FAILED] - topic_counts[IN_FLIGHT]
+        )
+        if remaining > 0:
+            # A failed in-flight URL that came back as a retry makes room again.
+            self.exhausted.discard(topic_id)
+            return remaining
+        if topic_id not in self.exhausted:
+            self.exhausted.add(topic_id)
+            skipped = self.frontier.skip_pending(topic_id)
+            logger.info("Topic %s reached its page budget, %d URLs skipped", topic_id, skipped)
+        elif topic_counts[PENDING]:
+            # Links found by pages still in flight when the budget ran out.
+            self.frontier.skip_pending(topic_id)
+        topic_counts[PENDING] = 0
+        return 0
+
+    def pop_batch(self, limit: int) -> List[Dict]:
+        """Claim up to ``limit`` URLs, interleaved across topics by weight."""
+        items: List[Dict] = []
+        counts: Dict[int, Dict[str, int]] = {}
+        active = set(self.weights)
+        while len(items) < limit and active:
+            topic_id = min(active, key=lambda tid: (self.passes[tid], tid))
+            self.passes[topic_id] = max(self.passes[topic_id], self.virtual_time)
+            self.virtual_time = self.passes[topic_id]
+
+            size = min(self.quantum, limit - len(items))
+            remaining = self._remaining(topic_id, counts)
+            if remaining is not None:
+                size = min(size, remaining)
+            batch = (
+                self.frontier.pop_batch(size, topic_id=topic_id, shards=self.shards)
+                if size
+                else []
+            )
+            if not batch:
+                active.discard(topic_id)
+                continue
+
+            items.extend(batch)
+            if topic_id in counts:
+                counts[topic_id][IN_FLIGHT] += len(batch)
+            self.claimed[topic_id] += len(batch)
+            self.passes[topic_id] += len(batch) / self.weights[topic_id]
+        return items
+
+    def next_eligible_at(self) -> Optional[float]:
+        """Earliest time any scheduled topic has a pending URL becoming eligible.
+
+        Topics over budget are left out; ``pop_batch`` keeps that set current.
+        """
+        times = [
+            self.frontier.next_eligible_at(topic_id, shards=self.shards)
+            for topic_id in self.weights
+            if topic_id not in self.exhausted
+        ]
+        times = [t for t in times if t is not None]
+        return min(times) if times else None
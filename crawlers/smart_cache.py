@@ -0,0 +1,469 @@
+"""
+Content-addressable page cache with a persistent, size-bounded index.
+
+Page bodies are stored once per SHA-256 in a pluggable blob store (see
+``crawlers/storage.py``) under ``CACHE_DIR``; a SQLite index
+maps URLs to content hashes so hits survive restarts and are shared between
+processes. Entries carry fetch time, size and an optional TTL, and the cache
+evicts (LRU or LFU) once it exceeds its disk budget. Blobs are reference
+counted, so content shared by several URLs is only deleted with its last URL.
+Response validators (ETag / Last-Modified) are kept so stale entries can be
+revalidated with a conditional request instead of being re-downloaded.
+Binary documents are stored from a file without being read into memory, and
+the text extracted from them is cached per content hash under ``extracted/``.
+The cache is thread-safe, so the crawler can drive it from an I/O thread pool.
+"""
+import functools
+import hashlib
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.storage import BlobStore, make_store
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL,
+    last_access REAL NOT NULL,
+    access_count INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    binary INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_entries_hash ON entries (content_hash);
+CREATE INDEX IF NOT EXISTS idx_entries_lru ON entries (last_access);
+CREATE INDEX IF NOT EXISTS idx_entries_lfu ON entries (access_count, last_access);
+CREATE INDEX IF NOT EXISTS idx_entries_expiry ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS blobs (
+    content_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('total_bytes', 0);
+"""
+
+_EVICTION_ORDER = {
+    "lru": "last_access",
+    "lfu": "access_count, last_access",
+}
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class SmartCache:
+    """Content-addressable cache to avoid duplicate downloads."""
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        index_path: Optional[Path] = None,
+        ttl: float = config.CACHE_TTL,
+        max_bytes: int = config.CACHE_MAX_BYTES,
+        eviction: str = config.CACHE_EVICTION,
+        store: Optional[BlobStore] = None,
+        extracted_dir: Optional[Path] = None,
+    ):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if eviction not in _EVICTION_ORDER:
+            raise ValueError(f"Unknown cache eviction policy: {eviction!r} (use lru or lfu)")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.store = store or make_store(cache_dir)
+        self.extracted = make_store(extracted_dir or cache_dir / "extracted")
+        # Binary downloads are streamed here, then moved into the store.
+        self.incoming_dir = cache_dir / "incoming"
+        self.incoming_dir.mkdir(exist_ok=True)
+        for partial in self.incoming_dir.glob("*.part"):
+            partial.unlink(missing_ok=True)
+        self.index_path = index_path or cache_dir / "index.db"
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            str(self.index_path), isolation_level=None, timeout=30, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._migrate()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidated = 0
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(entries)")}
+        for column in ("etag", "last_modified", "content_type"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE entries ADD COLUMN {column} TEXT")
+        if "binary" not in columns:
+            self.conn.execute("ALTER TABLE entries ADD COLUMN binary INTEGER NOT NULL DEFAULT 0")
+
+    @_locked
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+            self.store.close()
+            self.extracted.close()
+
+    def _read_blob(self, content_hash: str) -> Optional[str]:
+        data = self.store.get(content_hash)
+        return data.decode("utf-8", errors="ignore") if data is not None else None
+
+    def _hash_content(self, content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, url: str) -> Optional[str]:
+        entry = self.get_with_hash(url)
+        return entry[0] if entry else None
+
+    def get_with_hash(self, url: str) -> Optional[Tuple[str, str]]:
+        """Return ``(content, content_hash)`` for a fresh text entry, else None."""
+        entry = self.get_entry(url)
+        if entry is None or entry["binary"]:
+            return None
+        return entry["content"], entry["content_hash"]
+
+    def _body(self, url: str, content_hash: str, binary: bool) -> Optional[str]:
+        """Text of an entry, ``""`` for a binary entry, None if its blob is gone."""
+        if binary:
+            present = self.store.exists(content_hash)
+            content = "" if present else None
+        else:
+            content = self._read_blob(content_hash)
+        if content is None:
+            logger.debug("Cache entry lost its blob, dropping: %s", url)
+            self._remove_entries([url])
+        return content
+
+    @staticmethod
+    def _entry(content: str, content_hash: str, content_type: Optional[str], binary) -> Dict:
+        return {
+            "content": None if binary else content,
+            "content_hash": content_hash,
+            "content_type": content_type,
+            "binary": bool(binary),
+        }
+
+    @_locked
+    def get_entry(self, url: str) -> Optional[Dict]:
+        """Return a fresh entry as ``content``, ``content_hash``, ``content_type``, ``binary``.
+
+        Binary entries carry no ``content``; see ``read_document``.
+        """
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT content_hash, expires_at, content_type, binary FROM entries WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is not None:
+            content_hash, expires_at, content_type, binary = row
+            if expires_at is not None and expires_at <= now:
+                logger.debug("Cache STALE: %s", url)
+            else:
+                content = self._body(url, content_hash, binary)
+                if content is not None:
+                    self.conn.execute(
+                        "UPDATE entries SET last_access = ?, access_count = access_count + 1 "
+                        "WHERE url = ?",
+                        (now, url),
+                    )
+                    self.hits += 1
+                    logger.debug("Cache HIT: %s", url)
+                    return self._entry(content, content_hash, content_type, binary)
+        self.misses += 1
+        return None
+
+    @_locked
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Return index metadata for ``url`` (fresh or stale) without reading the body."""
+        row = self.conn.execute(
+            "SELECT content_hash, fetched_at, expires_at, etag, last_modified, content_type, "
+            "binary FROM entries WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        content_hash, fetched_at, expires_at, etag, last_modified, content_type, binary = row
+        return {
+            "content_hash": content_hash,
+            "fetched_at": fetched_at,
+            "expires_at": expires_at,
+            "fresh": expires_at is None or expires_at > time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": content_type,
+            "binary": bool(binary),
+        }
+
+    @_locked
+    def refresh(
+        self,
+        url: str,
+        ttl: Optional[float] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Mark a revalidated (HTTP 304) entry fresh again and return it as ``get_entry`` does.
+
+        Validators sent with the 304 replace the stored ones. Returns None if
+        the entry or its blob is gone, in which case the caller should refetch.
+        """
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        content_hash = entry["content_hash"]
+        content = self._body(url, content_hash, entry["binary"])
+        if content is None:
+            return None
+
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        self.conn.execute(
+            "UPDATE entries SET fetched_at = ?, expires_at = ?, last_access = ?, "
+            "access_count = access_count + 1, etag = COALESCE(?, etag), "
+            "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+            (now, now + ttl if ttl > 0 else None, now, etag, last_modified, url),
+        )
+        self.revalidated += 1
+        logger.debug("Cache REVALIDATED: %s", url)
+        return self._entry(content, content_hash, entry["content_type"], entry["binary"])
+
+    @_locked
+    def put(
+        self,
+        url: str,
+        content: str,
+        ttl: Optional[float] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        content_type: Optional[str] = None,
+    ) -> str:
+        """Store content for ``url``; ``ttl`` overrides the default freshness.
+
+        Pass ``content_hash`` if the caller already hashed the content.
+        """
+        content_hash = content_hash or self._hash_content(content)
+        data = content.encode("utf-8")
+        stored_size = self.store.put(content_hash, data)
+        self._record(
+            url, content_hash, len(data), stored_size, ttl, etag, last_modified, content_type
+        )
+        return content_hash
+
+    @_locked
+    def put_file(
+        self,
+        url: str,
+        path: Path,
+        content_hash: str,
+        content_type: Optional[str] = None,
+        ttl: Optional[float] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> str:
+        """Store a binary document from the file at ``path``, which is consumed.
+
+        ``content_hash`` is the SHA-256 of the file, computed while it was
+        streamed to disk.
+        """
+        size = Path(path).stat().st_size
+        stored_size = self.store.put_file(content_hash, path)
+        self._record(
+            url, content_hash, size, stored_size, ttl, etag, last_modified, content_type, True
+        )
+        return content_hash
+
+    def _record(
+        self,
+        url: str,
+        content_hash: str,
+        size: int,
+        stored_size: int,
+        ttl: Optional[float],
+        etag: Optional[str],
+        last_modified: Optional[str],
+        content_type: Optional[str],
+        binary: bool = False,
+    ) -> None:
+        logger.debug("Cached: %s -> %s", url, content_hash[:8])
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl > 0 else None
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT content_hash FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+            old_hash = row[0] if row else None
+            if old_hash != content_hash:
+                if self.conn.execute(
+                    "INSERT OR IGNORE INTO blobs (content_hash, size, refcount) VALUES (?, ?, 0)",
+                    (content_hash, stored_size),
+                ).rowcount:
+                    self._add_total(stored_size)
+                self.conn.execute(
+                    "UPDATE blobs SET refcount = refcount + 1 WHERE content_hash = ?",
+                    (content_hash,),
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(url, content_hash, fetched_at, expires_at, last_access, access_count, size, "
+                "etag, last_modified, content_type, binary) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    content_hash,
+                    now,
+                    expires_at,
+                    now,
+                    size,
+                    etag,
+                    last_modified,
+                    content_type,
+                    int(binary),
+                ),
+            )
+            if old_hash and old_hash != content_hash:
+                self._release_blob(old_hash)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        if self.max_bytes and self.total_bytes() > self.max_bytes:
+            self.evict()
+
+    def document_path(self, content_hash: str) -> Optional[Path]:
+        """Plain file holding a stored document, if the blob store keeps one."""
+        return self.store.local_path(content_hash)
+
+    def read_document(self, content_hash: str) -> Optional[bytes]:
+        return self.store.get(content_hash)
+
+    def get_extracted(self, content_hash: str) -> Optional[Dict]:
+        """Text previously extracted from the document with this hash."""
+        data = self.extracted.get(content_hash)
+        return json.loads(data.decode("utf-8")) if data is not None else None
+
+    def put_extracted(self, content_hash: str, extracted: Dict) -> None:
+        self.extracted.put(content_hash, json.dumps(extracted).encode("utf-8"))
+
+    def _add_total(self, delta: int) -> None:
+        self.conn.execute(
+            "UPDATE meta SET value = value + ? WHERE key = 'total_bytes'", (delta,)
+        )
+
+    def _release_blob(self, content_hash: str) -> None:
+        """Drop one reference; delete the blob once nothing points at it."""
+        self.conn.execute(
+            "UPDATE blobs SET refcount = refcount - 1 WHERE content_hash = ?", (content_hash,)
+        )
+        row = self.conn.execute(
+            "SELECT refcount, size FROM blobs WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        if row and row[0] <= 0:
+            self.conn.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+            self._add_total(-row[1])
+            self.store.delete(content_hash)
+            self.extracted.delete(content_hash)
+
+    @_locked
+    def _remove_entries(self, urls) -> None:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for url in urls:
+                row = self.conn.execute(
+                    "SELECT content_hash FROM entries WHERE url = ?", (url,)
+                ).fetchone()
+                if row is None:
+                    continue
+                self.conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self._release_blob(row[0])
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    @_locked
+    def total_bytes(self) -> int:
+        return self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'total_bytes'"
+        ).fetchone()[0]
+
+    @_locked
+    def evict(self, target_ratio: float = 0.9, batch: int = 256) -> int:
+        """Evict until under ``target_ratio`` of the budget; expired entries go first."""
+        target = int(self.max_bytes * target_ratio)
+        evicted = 0
+        order = _EVICTION_ORDER[self.eviction]
+        while True:
+            excess = self.total_bytes() - target
+            if excess <= 0:
+                break
+            rows = self.conn.execute(
+                "SELECT url, size FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ? "
+                "ORDER BY expires_at LIMIT ?",
+                (time.time(), batch),
+            ).fetchall()
+            if not rows:
+                rows = self.conn.execute(
+                    f"SELECT url, size FROM entries ORDER BY {order} LIMIT ?", (batch,)
+                ).fetchall()
+            if not rows:
+                break
+            # Stop at the target; blobs shared with other URLs may free less, hence the loop.
+            urls = []
+            for url, size in rows:
+                urls.append(url)
+                excess -= size
+                if excess <= 0:
+                    break
+            self._remove_entries(urls)
+            evicted += len(urls)
+        self.evictions += evicted
+        if evicted:
+            logger.info("Cache evicted %d entries (%d bytes in use)", evicted, self.total_bytes())
+        return evicted
+
+    @_locked
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total > 0 else 0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_requests": total,
+            "hit_rate_percent": hit_rate,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "bytes_used": self.total_bytes(),
+        }
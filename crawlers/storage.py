@@ -0,0 +1,413 @@
+"""
+Blob storage backends for the content-addressed cache.
+
+Blobs are addressed by the SHA-256 hex digest of their uncompressed content.
+``FileStore`` is the original one-file-per-hash layout; ``SegmentStore`` packs
+compressed records into large append-only segment files with a SQLite offset
+index, which keeps inode counts and backup times sane at millions of pages.
+"""
+import logging
+import mmap
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+logger = logging.getLogger(__name__)
+
+_COPY_CHUNK = 1024 * 1024
+
+
+class BlobStore:
+    """Interface for content-addressed blob storage."""
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def put(self, content_hash: str, data: bytes) -> int:
+        """Store ``data`` under ``content_hash``; returns bytes used on disk."""
+        raise NotImplementedError
+
+    def put_file(self, content_hash: str, path: Path) -> int:
+        """Store the file at ``path`` under ``content_hash`` and remove it.
+
+        Backends override this to avoid loading the file into memory.
+        """
+        path = Path(path)
+        try:
+            return self.put(content_hash, path.read_bytes())
+        finally:
+            path.unlink(missing_ok=True)
+
+    def delete(self, content_hash: str) -> None:
+        raise NotImplementedError
+
+    def exists(self, content_hash: str) -> bool:
+        raise NotImplementedError
+
+    def local_path(self, content_hash: str) -> Optional[Path]:
+        """Plain file holding the blob, if the backend keeps one."""
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+class FileStore(BlobStore):
+    """One uncompressed file per hash under a two-level fan-out."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / content_hash[2:4] / content_hash
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        try:
+            return self._path(content_hash).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, content_hash: str, data: bytes) -> int:
+        path = self._path(content_hash)
+        if path.exists():
+            return path.stat().st_size
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def put_file(self, content_hash: str, path: Path) -> int:
+        path = Path(path)
+        target = self._path(content_hash)
+        if target.exists():
+            path.unlink(missing_ok=True)
+            return target.stat().st_size
+        target.parent.mkdir(parents=True, exist_ok=True)
+        size = path.stat().st_size
+        # A rename when the file is on the same filesystem, a copy otherwise.
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.move(str(path), str(tmp_path))
+        os.replace(tmp_path, target)
+        return size
+
+    def delete(self, content_hash: str) -> None:
+        self._path(content_hash).unlink(missing_ok=True)
+
+    def exists(self, content_hash: str) -> bool:
+        return self._path(content_hash).exists()
+
+    def local_path(self, content_hash: str) -> Optional[Path]:
+        path = self._path(content_hash)
+        return path if path.exists() else None
+
+
+_SEGMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    content_hash TEXT PRIMARY KEY,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_segment ON records (segment);
+CREATE TABLE IF NOT EXISTS segments (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL DEFAULT 0,
+    dead_bytes INTEGER NOT NULL DEFAULT 0,
+    sealed INTEGER NOT NULL DEFAULT 0,
+    compacting INTEGER
+);
+"""
+
+# Each record is self-describing so segments can be scanned without the index:
+# magic, raw SHA-256 digest, compressed payload length, then the payload.
+_RECORD_HEADER = struct.Struct(">4s32sI")
+_RECORD_MAGIC = b"UCS1"
+
+
+class SegmentStore(BlobStore):
+    """Append-only, zlib-compressed segment files with an offset index.
+
+    Every process appends to its own active segment, so several crawler
+    processes can share one store. Reads go through cached read-only mmaps.
+    Deleted records leave dead bytes behind; once a sealed segment is mostly
+    dead a background thread copies its live records forward and removes it.
+    A ``fallback`` store is consulted on misses and hits are migrated into
+    segments, which lets an existing ``FileStore`` drain into this one.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        fallback: Optional[BlobStore] = None,
+        segment_max_bytes: int = config.CACHE_SEGMENT_MAX_BYTES,
+        compact_ratio: float = config.CACHE_COMPACT_RATIO,
+        compression_level: int = 6,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.fallback = fallback
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_ratio = compact_ratio
+        self.compression_level = compression_level
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            str(self.root / "segments.db"),
+            isolation_level=None,
+            timeout=30,
+            check_same_thread=False,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SEGMENT_SCHEMA)
+        self._writer = None
+        self._writer_name: Optional[str] = None
+        self._writer_size = 0
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._compactor: Optional[threading.Thread] = None
+        self.migrated = 0
+
+    def _open_writer(self) -> None:
+        name = f"{time.time_ns():016x}-{os.getpid()}.seg"
+        self._writer = open(self.root / name, "ab")
+        self._writer_name = name
+        self._writer_size = 0
+        self.conn.execute("INSERT INTO segments (name) VALUES (?)", (name,))
+
+    def _seal_writer(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        self.conn.execute("UPDATE segments SET sealed = 1 WHERE name = ?", (self._writer_name,))
+        self._writer = None
+        self._writer_name = None
+
+    def _append(self, content_hash: str, payload: bytes) -> Tuple[str, int, int]:
+        offset = self._start_record(content_hash, len(payload))
+        self._writer.write(payload)
+        return self._finish_record(offset, len(payload))
+
+    def _start_record(self, content_hash: str, length: int) -> int:
+        """Write a record header to the active segment; returns the payload offset."""
+        if self._writer is None or self._writer_size >= self.segment_max_bytes:
+            self._seal_writer()
+            self._open_writer()
+        header = _RECORD_HEADER.pack(_RECORD_MAGIC, bytes.fromhex(content_hash), length)
+        self._writer.write(header)
+        return self._writer_size + len(header)
+
+    def _finish_record(self, offset: int, length: int) -> Tuple[str, int, int]:
+        self._writer.flush()
+        self._writer_size = offset + length
+        self.conn.execute(
+            "UPDATE segments SET size = ? WHERE name = ?", (self._writer_size, self._writer_name)
+        )
+        return self._writer_name, offset, length
+
+    def _read(self, segment: str, offset: int, length: int) -> bytes:
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < offset + length:
+            if mapped is not None:
+                mapped.close()
+            with open(self.root / segment, "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped[offset : offset + length]
+
+    def _locate(self, content_hash: str) -> Optional[Tuple[str, int, int]]:
+        return self.conn.execute(
+            "SELECT segment, offset, length FROM records WHERE content_hash = ?",
+            (content_hash,),
+        ).fetchone()
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        with self.lock:
+            # A concurrent compaction may move the record between lookup and read.
+            for _ in range(2):
+                location = self._locate(content_hash)
+                if location is None:
+                    break
+                try:
+                    return zlib.decompress(self._read(*location))
+                except FileNotFoundError:
+                    self._maps.pop(location[0], None)
+                    continue
+                except (OSError, ValueError, zlib.error) as exc:
+                    logger.error("Corrupt segment record %s: %s", content_hash[:8], exc)
+                    return None
+
+        if self.fallback is not None:
+            data = self.fallback.get(content_hash)
+            if data is not None:
+                self.put(content_hash, data)
+                self.fallback.delete(content_hash)
+                self.migrated += 1
+                return data
+        return None
+
+    def put(self, content_hash: str, data: bytes) -> int:
+        with self.lock:
+            location = self._locate(content_hash)
+            if location is not None:
+                return location[2]
+            payload = zlib.compress(data, self.compression_level)
+            return self._index(content_hash, *self._append(content_hash, payload))
+
+    def put_file(self, content_hash: str, path: Path) -> int:
+        path = Path(path)
+        try:
+            with self.lock:
+                location = self._locate(content_hash)
+                if location is not None:
+                    return location[2]
+            # Compress to a spool file outside the lock so large documents
+            # neither sit in memory nor stall other writers.
+            with tempfile.TemporaryFile(dir=self.root) as spool:
+                compressor = zlib.compressobj(self.compression_level)
+                with open(path, "rb") as source:
+                    for chunk in iter(lambda: source.read(_COPY_CHUNK), b""):
+                        spool.write(compressor.compress(chunk))
+                spool.write(compressor.flush())
+                length = spool.tell()
+                spool.seek(0)
+                with self.lock:
+                    location = self._locate(content_hash)
+                    if location is not None:
+                        return location[2]
+                    offset = self._start_record(content_hash, length)
+                    shutil.copyfileobj(spool, self._writer, _COPY_CHUNK)
+                    return self._index(content_hash, *self._finish_record(offset, length))
+        finally:
+            path.unlink(missing_ok=True)
+
+    def _index(self, content_hash: str, segment: str, offset: int, length: int) -> int:
+        inserted = self.conn.execute(
+            "INSERT OR IGNORE INTO records (content_hash, segment, offset, length) "
+            "VALUES (?, ?, ?, ?)",
+            (content_hash, segment, offset, length),
+        ).rowcount
+        if not inserted:
+            # Another process stored the same content first; ours is dead weight.
+            self._mark_dead(segment, length)
+        return length
+
+    def _mark_dead(self, segment: str, length: int) -> None:
+        self.conn.execute(
+            "UPDATE segments SET dead_bytes = dead_bytes + ? WHERE name = ?",
+            (length + _RECORD_HEADER.size, segment),
+        )
+
+    def delete(self, content_hash: str) -> None:
+        with self.lock:
+            location = self._locate(content_hash)
+            if location is not None:
+                self.conn.execute("DELETE FROM records WHERE content_hash = ?", (content_hash,))
+                self._mark_dead(location[0], location[2])
+        if self.fallback is not None:
+            self.fallback.delete(content_hash)
+        self._maybe_compact()
+
+    def exists(self, content_hash: str) -> bool:
+        with self.lock:
+            if self._locate(content_hash) is not None:
+                return True
+        return self.fallback is not None and self.fallback.exists(content_hash)
+
+    def _compaction_candidate(self) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT name FROM segments WHERE sealed = 1 AND compacting IS NULL "
+            "AND dead_bytes >= size * ? ORDER BY dead_bytes DESC LIMIT 1",
+            (self.compact_ratio,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _maybe_compact(self) -> None:
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        with self.lock:
+            if self._compaction_candidate() is None:
+                return
+        self._compactor = threading.Thread(
+            target=self.compact, name="segment-compactor", daemon=True
+        )
+        self._compactor.start()
+
+    def compact(self) -> int:
+        """Copy live records out of mostly-dead sealed segments, then drop them."""
+        compacted = 0
+        while True:
+            with self.lock:
+                segment = self._compaction_candidate()
+                if segment is None:
+                    break
+                claimed = self.conn.execute(
+                    "UPDATE segments SET compacting = ? WHERE name = ? AND compacting IS NULL",
+                    (os.getpid(), segment),
+                ).rowcount
+            if claimed:
+                self._compact_segment(segment)
+                compacted += 1
+        return compacted
+
+    def _compact_segment(self, segment: str) -> None:
+        with self.lock:
+            records = self.conn.execute(
+                "SELECT content_hash, offset, length FROM records WHERE segment = ?",
+                (segment,),
+            ).fetchall()
+
+        for content_hash, offset, length in records:
+            with self.lock:
+                if self._locate(content_hash) != (segment, offset, length):
+                    continue
+                payload = self._read(segment, offset, length)
+                new_segment, new_offset, _ = self._append(content_hash, payload)
+                self.conn.execute(
+                    "UPDATE records SET segment = ?, offset = ? WHERE content_hash = ?",
+                    (new_segment, new_offset, content_hash),
+                )
+
+        with self.lock:
+            mapped = self._maps.pop(segment, None)
+            if mapped is not None:
+                mapped.close()
+            try:
+                (self.root / segment).unlink(missing_ok=True)
+            except OSError as exc:
+                logger.warning("Could not remove compacted segment %s: %s", segment, exc)
+                return
+            self.conn.execute("DELETE FROM segments WHERE name = ?", (segment,))
+        logger.info("Compacted segment %s (%d live records moved)", segment, len(records))
+
+    def close(self) -> None:
+        if self._compactor is not None:
+            self._compactor.join()
+        with self.lock:
+            self._seal_writer()
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            self.conn.close()
+        if self.fallback is not None:
+            self.fallback.close()
+
+
+def make_store(root: Path, backend: str = config.CACHE_BACKEND) -> BlobStore:
+    """Build the configured blob store rooted at ``root``."""
+    if backend == "files":
+        return FileStore(root)
+    if backend == "segments":
+        return SegmentStore(Path(root) / "segments", fallback=FileStore(root))
+    raise ValueError(f"Unknown cache backend: {backend!r} (use files or segments)")
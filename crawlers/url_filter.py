@@ -0,0 +1,222 @@
+"""
+Compiled allow/deny/priority filter for candidate URLs.
+
+Domain rules (exclude and priority domains) live in a host-suffix index: a
+host is looked up from its full name down through each parent suffix, so a
+rule for ``x.com`` matches ``x.com`` and ``api.x.com`` but not
+``example.com``, and a lookup costs one dict probe per host label no matter
+how many rules there are. The most specific matching rule wins. Host
+verdicts are memoized, since candidate URLs repeat hosts heavily.
+
+URL substring patterns (excluded sections such as ``/login`` and the
+preferred terms) are compiled into one Aho-Corasick automaton
+(``pyahocorasick``; compiled regexes for small sets or without it), and
+excluded file types are matched against the path's extension, so each URL
+is scanned once.
+"""
+import functools
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.keyword_matcher import AUTOMATON_MIN_PATTERNS
+
+try:
+    import ahocorasick
+except ImportError:  # optional: pip install pyahocorasick
+    ahocorasick = None
+
+# Verdicts returned by ``URLFilter.classify``.
+DENY = 0
+ALLOW = 1
+PRIORITY = 2
+
+EXCLUDE_PATTERNS = ("/login", "/signin", "/register", "/cart", "/checkout", "googleads")
+EXCLUDE_EXTENSIONS = (".css", ".js", ".jpg", ".png", ".gif", ".svg", ".ico")
+AD_DOMAINS = ("doubleclick.net", "facebook.net")
+PREFER_PATTERNS = (
+    ".pdf",
+    "technical",
+    "engineering",
+    "design",
+    "specification",
+    "manual",
+    "guide",
+    "datasheet",
+    "journal",
+    "research",
+    "article",
+    "paper",
+    "study",
+)
+# URLs at least this long are kept only on a priority domain or preferred term.
+MAX_PLAIN_URL_LENGTH = 200
+
+_PREFER = 1
+# Host (without userinfo and port) and path of a lowercased URL.
+_URL_PARTS = re.compile(
+    r"(?:[a-z][a-z0-9+.\-]*:)?(?://(?:[^@/?#]*@)?(\[[^\]]*\]|[^:/?#]*)(?::[0-9]*)?)?([^?#]*)"
+)
+
+
+class DomainSuffixIndex:
+    """Maps domains to values; a host matches its own rule or any parent domain's."""
+
+    def __init__(self, rules: Iterable[Tuple[str, int]] = ()):
+        self._rules: Dict[str, int] = {}
+        for domain, value in rules:
+            self.add(domain, value)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def add(self, domain: str, value: int) -> None:
+        domain = domain.strip().lower().rstrip(".")
+        if domain.startswith("*."):
+            domain = domain[2:]
+        if domain:
+            self._rules[domain] = value
+
+    def lookup(self, host: str) -> Optional[int]:
+        """Value of the most specific rule covering ``host``, or None."""
+        rules = self._rules
+        value = rules.get(host)
+        if value is not None:
+            return value
+        index = host.find(".")
+        while index != -1:
+            value = rules.get(host[index + 1 :])
+            if value is not None:
+                return value
+            index = host.find(".", index + 1)
+        return None
+
+
+class URLFilter:
+    """Classifies URLs as ``DENY``, ``ALLOW`` or ``PRIORITY`` in one pass each.
+
+    A URL is denied if its host is under an excluded domain, it contains an
+    excluded pattern, or its path ends in an excluded extension. Otherwise
+    it is ``PRIORITY`` on a priority domain, and ``ALLOW`` if it contains a
+    preferred term or is shorter than ``max_plain_length``. Domain rules
+    containing a ``/`` are matched as URL substrings instead.
+    """
+
+    def __init__(
+        self,
+        exclude_domains: Optional[Sequence[str]] = None,
+        priority_domains: Optional[Sequence[str]] = None,
+        exclude_patterns: Sequence[str] = EXCLUDE_PATTERNS,
+        exclude_extensions: Sequence[str] = EXCLUDE_EXTENSIONS,
+        prefer_patterns: Sequence[str] = PREFER_PATTERNS,
+        max_plain_length: int = MAX_PLAIN_URL_LENGTH,
+        host_cache_size: int = 65536,
+    ):
+        if exclude_domains is None:
+            exclude_domains = config.EXCLUDE_DOMAINS
+        if priority_domains is None:
+            priority_domains = config.PRIORITY_DOMAINS
+        self.max_plain_length = max_plain_length
+        self.domains = DomainSuffixIndex()
+        # Path-like rules keep their old substring meaning.
+        deny = [pattern.lower() for pattern in exclude_patterns if pattern]
+        for domain in priority_domains:
+            if "/" not in domain:
+                self.domains.add(domain, PRIORITY)
+        for domain in list(AD_DOMAINS) + list(exclude_domains):
+            if "/" in domain:
+                deny.append(domain.lower())
+            else:
+                self.domains.add(domain, DENY)
+        self.priority_paths = [domain.lower() for domain in priority_domains if "/" in domain]
+        self.extensions = tuple(extension.lower() for extension in exclude_extensions)
+
+        # Pattern -> DENY, PRIORITY or _PREFER; later kinds win on duplicates.
+        self.patterns: Dict[str, int] = {pattern.lower(): _PREFER for pattern in prefer_patterns}
+        self.patterns.update((pattern, DENY) for pattern in deny)
+        self.patterns.update((pattern, PRIORITY) for pattern in self.priority_paths)
+        self.patterns.pop("", None)
+
+        self._automaton = None
+        self._deny_re = self._prefer_re = self._priority_re = None
+        if ahocorasick is not None and len(self.patterns) >= AUTOMATON_MIN_PATTERNS:
+            automaton = ahocorasick.Automaton()
+            for pattern, kind in self.patterns.items():
+                automaton.add_word(pattern, kind)
+            automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            self._deny_re = self._compile(DENY)
+            self._prefer_re = self._compile(_PREFER)
+            self._priority_re = self._compile(PRIORITY)
+
+        self._host_verdict = functools.lru_cache(maxsize=host_cache_size)(self.domains.lookup)
+
+    def _compile(self, kind: int):
+        patterns = sorted(
+            (pattern for pattern, value in self.patterns.items() if value == kind),
+            key=len,
+            reverse=True,
+        )
+        if not patterns:
+            return None
+        return re.compile("|".join(re.escape(pattern) for pattern in patterns))
+
+    def _scan(self, text: str) -> Tuple[bool, bool, bool]:
+        """(denied, preferred, priority path) from one automaton pass over ``text``."""
+        preferred = priority = False
+        for _, kind in self._automaton.iter(text):
+            if kind == DENY:
+                return True, False, False
+            if kind == PRIORITY:
+                priority = True
+            else:
+                preferred = True
+        return False, preferred, priority
+
+    def classify_one(self, url: str) -> int:
+        url = url.lower()
+        host, path = _URL_PARTS.match(url).groups()
+        verdict = self._host_verdict(host.rstrip(".")) if host else None
+        if verdict == DENY or path.endswith(self.extensions):
+            return DENY
+        if self._automaton is not None:
+            denied, preferred, priority_path = self._scan(url)
+            if denied:
+                return DENY
+            if verdict == PRIORITY or priority_path:
+                return PRIORITY
+            return ALLOW if preferred or len(url) < self.max_plain_length else DENY
+        # Without the automaton each regex runs only when its answer matters.
+        if self._deny_re is not None and self._deny_re.search(url):
+            return DENY
+        if verdict == PRIORITY or (
+            self._priority_re is not None and self._priority_re.search(url)
+        ):
+            return PRIORITY
+        if len(url) < self.max_plain_length or (
+            self._prefer_re is not None and self._prefer_re.search(url)
+        ):
+            return ALLOW
+        return DENY
+
+    def classify(self, urls: Iterable[str]) -> np.ndarray:
+        """Verdict per URL (``DENY``/``ALLOW``/``PRIORITY``) as an ``int8`` array."""
+        classify_one = self.classify_one
+        return np.fromiter((classify_one(url) for url in urls), dtype=np.int8)
+
+    def allowed(self, urls: Iterable[str]) -> List[str]:
+        """The URLs that are not denied, in order."""
+        urls = list(urls)
+        return [url for url, verdict in zip(urls, self.classify(urls)) if verdict != DENY]
+
+    def is_relevant(self, url: str) -> bool:
+        return self.classify_one(url) != DENY
+
+    def is_priority(self, url: str) -> bool:
+        return self.classify_one(url) == PRIORITY
@@ -0,0 +1,141 @@
+"""
+URL canonicalization shared by discovery, the frontier and the crawler.
+
+``canonicalize_url`` normalizes the spelling of an address (case, default
+ports, dot segments, percent-escapes, fragments) and drops tracking
+parameters; its result is what gets fetched, so it keeps the query order,
+repeated slashes and trailing slashes some servers act on. ``url_key`` goes
+further: it sorts the query, writes bare flags as ``flag=``, collapses
+repeated slashes, drops trailing slashes and ignores the scheme and a
+leading ``www.``, so http/https and www/bare mirrors collapse to one entry.
+It is a dedup key, never fetched.
+"""
+import re
+import sys
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional
+from urllib.parse import parse_qsl, quote, unquote_plus, urlencode, urlsplit, urlunsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+_TRACKING_PREFIXES = ("utm_",)
+_TRACKING_PARAMS = {
+    "gclid",
+    "dclid",
+    "fbclid",
+    "msclkid",
+    "yclid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_gl",
+    "igshid",
+    "spm",
+}
+_SAFE_PATH = "/:@!$&'()*+,;=-._~%"
+_UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+_PERCENT_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+
+# Second-level labels under which registrations happen one level deeper.
+_SECOND_LEVEL = {"ac", "co", "com", "edu", "gov", "net", "org", "or", "ne", "go", "gob", "nic"}
+
+
+def _is_tracking(name: str, extra: Iterable[str]) -> bool:
+    name = name.lower()
+    return name.startswith(_TRACKING_PREFIXES) or name in _TRACKING_PARAMS or name in extra
+
+
+def _normalize_escape(match) -> str:
+    char = chr(int(match.group(0)[1:], 16))
+    return char if char in _UNRESERVED else match.group(0).upper()
+
+
+def _remove_dot_segments(path: str) -> str:
+    """RFC 3986 dot-segment removal; unlike ``posixpath.normpath`` it keeps ``//``."""
+    segments = path.split("/")
+    output = [segments[0]]
+    for index, segment in enumerate(segments[1:], 1):
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+            continue
+        if index == len(segments) - 1:
+            output.append("")
+    return "/".join(output)
+
+
+def _normalize_path(path: str) -> str:
+    if not path:
+        return "/"
+    # Encode what must be encoded, decode escaped unreserved characters and
+    # uppercase the remaining escapes; reserved escapes such as %2F stay.
+    path = _PERCENT_ESCAPE.sub(_normalize_escape, quote(path, safe=_SAFE_PATH))
+    return _remove_dot_segments(path) or "/"
+
+
+def canonicalize_url(url: str, strip_params: Optional[Iterable[str]] = None) -> str:
+    """Canonical form of an http(s) URL; other URLs are returned stripped but unchanged."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    extra = {name.lower() for name in (strip_params or config.CANONICAL_STRIP_PARAMS)}
+    host = parts.hostname.rstrip(".")
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or str(port) == _DEFAULT_PORTS[scheme] else f"{host}:{port}"
+    if parts.username:
+        netloc = f"{parts.username}{':' + parts.password if parts.password else ''}@{netloc}"
+
+    # Parameters keep their spelling and order (``?flag`` is not ``?flag=``
+    # to every server, and some APIs read repeated parameters in order).
+    query = "&".join(
+        param
+        for param in parts.query.split("&")
+        if param and not _is_tracking(unquote_plus(param.partition("=")[0]), extra)
+    )
+    return urlunsplit((scheme, netloc, _normalize_path(parts.path), query, ""))
+
+
+def url_key(url: str) -> str:
+    """Scheme-, www-, slash- and query-order-insensitive dedup key of a URL."""
+    canonical = canonicalize_url(url)
+    parts = urlsplit(canonical)
+    if parts.scheme not in _DEFAULT_PORTS or not parts.netloc:
+        return canonical
+    netloc = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)), doseq=True)
+    return f"{netloc}{path}?{query}" if query else f"{netloc}{path}"
+
+
+def registrable_domain(host: str) -> str:
+    """Approximate the registrable domain ("site") of a host without a suffix list."""
+    host = host.split(":", 1)[0].lower().rstrip(".")
+    labels = host.split(".")
+    if len(labels) <= 2 or labels[-1].isdigit():
+        return host
+    if len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def domain_shard(host: str, shards: int) -> int:
+    """Partition of a host's registrable domain, stable across processes and machines."""
+    return zlib.crc32(registrable_domain(host).encode("utf-8")) % shards
@@ -1,26 +1,29 @@
 """
 Enhanced URL Discovery - multi-source search (DuckDuckGo, optional Bing/Scholar).
 Generic, topic-driven discovery.
+
+Each topic's queries fan out to every enabled provider at once; the
+providers (see ``search_providers.py``) cap their own concurrency.
 """
 
 import asyncio
 import aiohttp
+import inspect
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Set, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from datetime import datetime
 import logging
-import re
 import sys
-from urllib.parse import quote_plus
-
-try:
-    from duckduckgo_search import DDGS
-except ImportError:  # duckduckgo-search rename fallback
-    from ddgs import DDGS
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 import config
+from crawlers.discovery_stream import DiscoveryStream
+from crawlers.url_filter import PRIORITY, URLFilter
+from crawlers.urls import canonicalize_url, url_key
+from discovery.search_cache import SearchCache
+from discovery.search_providers import SearchProvider, make_providers
 
 logging.basicConfig(
     level=logging.INFO,
@@ -30,22 +33,44 @@ logger = logging.getLogger(__name__)
 
 
 class EnhancedURLDiscovery:
-    def __init__(self):
+    """Topic-driven URL discovery.
+
+    Each topic's result is appended to ``DISCOVERY_STREAM_FILE`` and passed
+    to ``on_topic(result)`` as soon as the topic finishes, so a crawler can
+    start on it while other topics are still being searched.
+    """
+
+    def __init__(self, on_topic: Optional[Callable[[Dict], Any]] = None):
         self.discovered_urls: Dict[str, Dict] = {}
         self.output_file = config.BASE_DIR / "discovered_urls_enhanced.json"
+        self.stream_file = config.DISCOVERY_STREAM_FILE
+        self.on_topic = on_topic
         self.session: Optional[aiohttp.ClientSession] = None
-        self.enable_bing = config.DISCOVERY_ENABLE_BING
-        self.enable_scholar = config.DISCOVERY_ENABLE_SCHOLAR
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.providers: Dict[str, SearchProvider] = {}
+        self.search_cache: Optional[SearchCache] = None
         self.priority_domains = config.PRIORITY_DOMAINS
         self.exclude_domains = config.EXCLUDE_DOMAINS
+        self.url_filter = URLFilter(self.exclude_domains, self.priority_domains)
 
     async def __aenter__(self):
         self.session = aiohttp.ClientSession()
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.DISCOVERY_EXECUTOR_WORKERS, thread_name_prefix="search"
+        )
+        if config.DISCOVERY_CACHE_TTL > 0:
+            self.search_cache = SearchCache()
+        if not self.providers:
+            self.providers = make_providers(self.session, self.executor, cache=self.search_cache)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
             await self.session.close()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        if self.search_cache:
+            self.search_cache.close()
 
     def create_search_queries(self, tech: Dict) -> List[str]:
         name = tech["name"]
@@ -72,137 +97,63 @@ class EnhancedURLDiscovery:
 
         return queries[: config.DISCOVERY_QUERIES_PER_TOPIC]
 
-    async def search_duckduckgo(self, query: str, max_results: int) -> Set[str]:
-        urls: Set[str] = set()
-        try:
-            with DDGS() as ddgs:
-                results = ddgs.text(query, max_results=max_results)
-                for result in results:
-                    url = result.get("href") or result.get("link")
-                    if url and self.is_relevant_url(url):
-                        urls.add(url)
-            await asyncio.sleep(config.DISCOVERY_QUERY_DELAY)
-        except Exception as exc:
-            logger.warning("DuckDuckGo search failed for '%s': %s", query, exc)
-        return urls
-
-    async def search_bing(self, query: str, max_results: int) -> Set[str]:
-        urls: Set[str] = set()
-        try:
-            if not self.session:
-                return urls
-            search_url = f"https://www.bing.com/search?q={quote_plus(query)}&count={max_results}"
-            headers = {"User-Agent": config.USER_AGENT}
-            async with self.session.get(search_url, headers=headers, timeout=15) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    url_pattern = r'<a href="(https?://[^"]+)"'
-                    for url in re.findall(url_pattern, html):
-                        if self.is_relevant_url(url):
-                            urls.add(url)
-            await asyncio.sleep(config.DISCOVERY_QUERY_DELAY)
-        except Exception as exc:
-            logger.warning("Bing search failed for '%s': %s", query, exc)
-        return urls
-
-    async def search_scholar_proxy(self, query: str) -> Set[str]:
-        urls: Set[str] = set()
-        try:
-            if not self.session:
-                return urls
-            search_url = f"https://scholar.google.com/scholar?q={quote_plus(query)}&hl=en&num=10"
-            headers = {"User-Agent": config.USER_AGENT}
-            async with self.session.get(search_url, headers=headers, timeout=15) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    url_pattern = r'<a href="(https?://[^"]+\.(?:pdf|htm|html)[^"]*)"'
-                    for url in re.findall(url_pattern, html):
-                        if self.is_relevant_url(url):
-                            urls.add(url)
-            await asyncio.sleep(max(3, config.DISCOVERY_QUERY_DELAY))
-        except Exception as exc:
-            logger.warning("Scholar search failed for '%s': %s", query, exc)
-        return urls
+    async def search(self, provider: str, query: str, max_results: int) -> List[str]:
+        """Relevant result URLs for ``query`` from one provider."""
+        results = await self.providers[provider].search(query, max_results)
+        return self.url_filter.allowed(result["url"] for result in results)
 
     def is_relevant_url(self, url: str) -> bool:
-        url_lower = url.lower()
-
-        if any(domain in url_lower for domain in self.exclude_domains):
-            return False
-
-        exclude_patterns = [
-            "/login",
-            "/signin",
-            "/register",
-            "/cart",
-            "/checkout",
-            ".css",
-            ".js",
-            ".jpg",
-            ".png",
-            ".gif",
-            ".svg",
-            ".ico",
-            "ad.doubleclick",
-            "googleads",
-            "facebook.net",
-        ]
-        if any(pattern in url_lower for pattern in exclude_patterns):
-            return False
-
-        prefer_patterns = [
-            ".pdf",
-            "technical",
-            "engineering",
-            "design",
-            "specification",
-            "manual",
-            "guide",
-            "datasheet",
-            "journal",
-            "research",
-            "article",
-            "paper",
-            "study",
-        ]
-
-        is_priority = any(domain in url_lower for domain in self.priority_domains)
-        has_preferred = any(pattern in url_lower for pattern in prefer_patterns)
-
-        return is_priority or has_preferred or len(url) < 200
+        return self.url_filter.is_relevant(url)
 
     async def discover_urls_for_tech(self, tech: Dict) -> Dict:
         tech_id = tech["id"]
         tech_name = tech["name"]
         logger.info("[Topic %03d] Starting discovery: %s", tech_id, tech_name)
 
-        all_urls: Set[str] = set()
+        # Keyed by url_key so http/https, www and tracking-parameter variants collapse.
+        all_urls: Dict[str, str] = {}
         queries = self.create_search_queries(tech)
 
-        for query in queries:
-            ddg_urls = await self.search_duckduckgo(
-                query, max_results=config.DISCOVERY_MAX_RESULTS
+        def collect(urls: Iterable[str]) -> None:
+            for url in urls:
+                all_urls.setdefault(url_key(url), canonicalize_url(url))
+
+        async def fan_out(providers: List[str], enough: int) -> None:
+            """Run every query on ``providers`` at once; stop early at ``enough`` URLs."""
+            tasks = [
+                asyncio.ensure_future(
+                    self.search(
+                        provider,
+                        query,
+                        config.DISCOVERY_MAX_RESULTS if provider == "duckduckgo" else 10,
+                    )
+                )
+                for query in queries
+                for provider in providers
+                if provider in self.providers
+            ]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    collect(await finished)
+                    if len(all_urls) >= enough:
+                        break
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        await fan_out([name for name in self.providers if name != "scholar"], enough=30)
+        if "scholar" in self.providers and len(all_urls) < 15:
+            await fan_out(["scholar"], enough=30)
+
+        urls = list(all_urls.values())
+        verdicts = self.url_filter.classify(urls)
+        sorted_urls = [
+            url
+            for _, url in sorted(
+                zip(verdicts, urls), key=lambda item: (-1 if item[0] == PRIORITY else 0, item[1])
             )
-            all_urls.update(ddg_urls)
-
-            if self.enable_bing:
-                bing_urls = await self.search_bing(query, max_results=10)
-                all_urls.update(bing_urls)
-
-            if self.enable_scholar and len(all_urls) < 15:
-                scholar_urls = await self.search_scholar_proxy(query)
-                all_urls.update(scholar_urls)
-
-            if len(all_urls) >= 30:
-                break
-
-        sorted_urls = sorted(
-            all_urls,
-            key=lambda url: (
-                -1 if any(d in url.lower() for d in self.priority_domains) else 0,
-                url,
-            ),
-        )
+        ]
 
         result = {
             "tech_id": tech_id,
@@ -222,24 +173,34 @@ class EnhancedURLDiscovery:
             len(config.TECHNOLOGIES),
         )
         logger.info(
-            "Concurrency: %d parallel searches",
+            "Concurrency: %d topics in parallel; providers: %s",
             config.DISCOVERY_CONCURRENCY,
+            ", ".join(
+                f"{name} ({provider.concurrency})" for name, provider in self.providers.items()
+            )
+            or "none",
         )
 
         semaphore = asyncio.Semaphore(config.DISCOVERY_CONCURRENCY)
 
-        async def discover_with_semaphore(tech):
-            async with semaphore:
-                return await self.discover_urls_for_tech(tech)
+        with DiscoveryStream(self.stream_file) as stream:
 
-        tasks = [discover_with_semaphore(tech) for tech in config.TECHNOLOGIES]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+            async def discover_with_semaphore(tech):
+                async with semaphore:
+                    result = await self.discover_urls_for_tech(tech)
+                self.discovered_urls[str(result["tech_id"])] = result
+                stream.write(result)
+                if self.on_topic:
+                    outcome = self.on_topic(result)
+                    if inspect.isawaitable(outcome):
+                        await outcome
+
+            tasks = [discover_with_semaphore(tech) for tech in config.TECHNOLOGIES]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
 
         for result in results:
             if isinstance(result, Exception):
                 logger.error("Task failed: %s", result)
-            elif result:
-                self.discovered_urls[str(result["tech_id"])] = result
 
         self.save_results()
 
@@ -252,7 +213,24 @@ class EnhancedURLDiscovery:
         logger.info("Topics: %d / %d", len(self.discovered_urls), len(config.TECHNOLOGIES))
         logger.info("Total URLs: %d", total_urls)
         logger.info("Average per topic: %.1f", avg_urls)
-        logger.info("Output: %s", self.output_file)
+        for name, provider in self.providers.items():
+            stats = provider.stats()
+            logger.info(
+                "%s: %d queries, %d errors, %d throttled",
+                name,
+                stats["queries"],
+                stats["errors"],
+                stats["throttled"],
+            )
+        if self.search_cache:
+            stats = self.search_cache.stats()
+            logger.info(
+                "Search cache: %d hits, %d misses, %d shared in flight",
+                stats["hits"],
+                stats["misses"],
+                stats["shared"],
+            )
+        logger.info("Output: %s (stream: %s)", self.output_file, self.stream_file)
 
     def save_results(self) -> None:
         with self.output_file.open("w", encoding="utf-8") as handle:
@@ -0,0 +1,152 @@
+"""
+Persistent cache of search results.
+
+Entries are keyed on (provider, normalized query, max_results) and expire
+after ``DISCOVERY_CACHE_TTL`` seconds, so re-running discovery over an
+unchanged topic list costs no provider quota. Identical queries issued
+concurrently (the query templates repeat across topics) share one
+in-flight request. Only successful searches are stored; failures are
+retried on the next run.
+"""
+import asyncio
+import json
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+_SPACE = re.compile(r"\s+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    provider TEXT NOT NULL,
+    query TEXT NOT NULL,
+    max_results INTEGER NOT NULL,
+    results TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (provider, query, max_results)
+);
+CREATE INDEX IF NOT EXISTS idx_searches_fetched ON searches (fetched_at);
+"""
+
+CacheKey = Tuple[str, str, int]
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of ``query``."""
+    return _SPACE.sub(" ", query).strip().lower()
+
+
+class SearchCache:
+    """SQLite-backed TTL cache of provider results with in-flight sharing."""
+
+    def __init__(
+        self, db_path: Path = config.SEARCH_CACHE_DB, ttl: float = config.DISCOVERY_CACHE_TTL
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.conn = sqlite3.connect(str(self.db_path), isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.execute("DELETE FROM searches WHERE fetched_at < ?", (time.time() - self.ttl,))
+        self._inflight: Dict[CacheKey, List] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def key(provider: str, query: str, max_results: int) -> CacheKey:
+        return provider, normalize_query(query), int(max_results)
+
+    def get(self, provider: str, query: str, max_results: int) -> Optional[List[Dict]]:
+        """Cached results, or None if missing or expired."""
+        row = self.conn.execute(
+            "SELECT results FROM searches WHERE provider = ? AND query = ? AND max_results = ? "
+            "AND fetched_at >= ?",
+            (*self.key(provider, query, max_results), time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, provider: str, query: str, max_results: int, results: List[Dict]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO searches (provider, query, max_results, results, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                *self.key(provider, query, max_results),
+                json.dumps(results, ensure_ascii=False),
+                time.time(),
+            ),
+        )
+
+    async def fetch(
+        self,
+        provider: str,
+        query: str,
+        max_results: int,
+        search: Callable[[str, int], Awaitable[List[Dict]]],
+    ) -> List[Dict]:
+        """Cached results, else ``search(query, max_results)`` shared by concurrent callers.
+
+        Errors from ``search`` propagate to every waiter and are not cached.
+        The request is cancelled only when all of its waiters are.
+        """
+        cached = self.get(provider, query, max_results)
+        if cached is not None:
+            return cached
+        key = self.key(provider, query, max_results)
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._search_and_store(key, query, search))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.shared += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _finished(self, key: CacheKey, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter was cancelled
+
+    async def _search_and_store(
+        self, key: CacheKey, query: str, search: Callable[[str, int], Awaitable[List[Dict]]]
+    ) -> List[Dict]:
+        provider, _, max_results = key
+        results = await search(query, max_results)
+        self.put(provider, query, max_results, results)
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        entries = self.conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "shared": self.shared, "entries": entries}
@@ -0,0 +1,332 @@
+"""
+Search providers for URL discovery.
+
+Every provider exposes ``async search(query, max_results)`` returning result
+dicts (``url``, ``title``, ``snippet``, ``query``, ``source``) and caps its
+own in-flight queries, so a slow or strict provider does not hold back the
+others. Synchronous clients (``DDGS``) run in a bounded thread pool instead
+of on the event loop. ``FixtureProvider`` serves canned results for offline
+runs and tests.
+
+Query pacing is global per provider: all providers share one
+``DomainRateLimiter`` keyed by provider name, so the spacing holds across
+every topic in flight. Waiting for a slot happens before a query takes one
+of the provider's concurrency slots, and a throttled provider (429/503, or
+the DDGS rate-limit error) is paused for its Retry-After and the query
+retried. With a ``SearchCache`` a provider answers repeated queries from
+disk and shares in-flight ones.
+"""
+import asyncio
+import json
+import logging
+import re
+import sys
+from concurrent.futures import Executor
+from html import unescape
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+from urllib.parse import quote_plus
+
+import aiohttp
+
+try:
+    from duckduckgo_search import DDGS
+except ImportError:  # duckduckgo-search rename fallback
+    try:
+        from ddgs import DDGS
+    except ImportError:
+        DDGS = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.rate_limiter import DomainRateLimiter, parse_retry_after
+from discovery.search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
+_BING_LINK = re.compile(r'<a href="(https?://[^"]+)"')
+_SCHOLAR_LINK = re.compile(r'<a href="(https?://[^"]+\.(?:pdf|htm|html)[^"]*)"')
+
+
+class ProviderThrottled(Exception):
+    """The provider refused a query for rate reasons."""
+
+    def __init__(self, provider: str, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} is throttling queries")
+        self.retry_after = retry_after
+
+
+def make_scheduler() -> DomainRateLimiter:
+    """Rate limiter keyed by provider name, paced by the ``discovery`` config."""
+    return DomainRateLimiter(
+        default_interval=config.DISCOVERY_QUERY_DELAY,
+        burst=config.DISCOVERY_RATE_BURST,
+        domain_intervals=config.DISCOVERY_PROVIDER_INTERVALS,
+        priority_domains=[],
+        default_backoff=config.DISCOVERY_THROTTLE_BACKOFF,
+    )
+
+
+def _result(url: str, query: str, source: str, title=None, snippet=None) -> Dict:
+    return {"url": url, "title": title, "snippet": snippet, "query": query, "source": source}
+
+
+class SearchProvider:
+    """A search backend with its own concurrency limit."""
+
+    name = "provider"
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        scheduler: Optional[DomainRateLimiter] = None,
+        cache: Optional[SearchCache] = None,
+    ):
+        if concurrency is None:
+            concurrency = config.DISCOVERY_PROVIDER_CONCURRENCY.get(self.name, 1)
+        self.concurrency = max(1, concurrency)
+        self.scheduler = scheduler
+        self.cache = cache
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.queries = 0
+        self.errors = 0
+        self.throttled = 0
+
+    async def _wait_turn(self) -> None:
+        """Wait until the scheduler grants this provider a query slot."""
+        if self.scheduler is None:
+            return
+        while True:
+            delay = self.scheduler.try_reserve(self.name)
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def search(self, query: str, max_results: int) -> List[Dict]:
+        """Results for ``query``; failures are logged and yield no results."""
+        try:
+            if self.cache is not None:
+                results = await self.cache.fetch(self.name, query, max_results, self._query)
+            else:
+                results = await self._query(query, max_results)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self.errors += 1
+            logger.warning("%s search failed for '%s': %s", self.name, query, exc)
+            return []
+        logger.debug("%s: %d results for '%s'", self.name, len(results), query)
+        return results
+
+    async def _query(self, query: str, max_results: int) -> List[Dict]:
+        """One paced query, retried after throttling; raises on failure."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        for attempt in range(config.DISCOVERY_MAX_RETRIES + 1):
+            await self._wait_turn()
+            async with self._semaphore:
+                self.queries += 1
+                try:
+                    return await self._search(query, max_results)
+                except ProviderThrottled as exc:
+                    self.throttled += 1
+                    if self.scheduler is not None:
+                        delay = self.scheduler.backoff(self.name, exc.retry_after)
+                    elif exc.retry_after is not None:
+                        delay = exc.retry_after
+                    else:
+                        delay = config.DISCOVERY_THROTTLE_BACKOFF
+                    logger.warning(
+                        "%s throttled on '%s'; pausing %.1fs (attempt %d)",
+                        self.name,
+                        query,
+                        delay,
+                        attempt + 1,
+                    )
+                    if attempt == config.DISCOVERY_MAX_RETRIES:
+                        raise
+            # With a scheduler the back-off is enforced by the next _wait_turn.
+            if self.scheduler is None:
+                await asyncio.sleep(delay)
+
+    async def _search(self, query: str, max_results: int) -> List[Dict]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {"queries": self.queries, "errors": self.errors, "throttled": self.throttled}
+
+
+class ExecutorSearchProvider(SearchProvider):
+    """Runs a blocking ``_search_sync`` in a shared, bounded executor."""
+
+    def __init__(
+        self,
+        executor: Executor,
+        concurrency: Optional[int] = None,
+        scheduler: Optional[DomainRateLimiter] = None,
+        cache: Optional[SearchCache] = None,
+    ):
+        super().__init__(concurrency, scheduler, cache)
+        self.executor = executor
+
+    async def _search(self, query: str, max_results: int) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._search_sync, query, max_results)
+
+    def _search_sync(self, query: str, max_results: int) -> List[Dict]:
+        raise NotImplementedError
+
+
+class DuckDuckGoProvider(ExecutorSearchProvider):
+    name = "duckduckgo"
+
+    def __init__(
+        self,
+        executor: Executor,
+        concurrency: Optional[int] = None,
+        scheduler: Optional[DomainRateLimiter] = None,
+        cache: Optional[SearchCache] = None,
+    ):
+        if DDGS is None:
+            raise ImportError("DuckDuckGo search needs duckduckgo-search (pip install ddgs)")
+        super().__init__(executor, concurrency, scheduler, cache)
+
+    def _search_sync(self, query: str, max_results: int) -> List[Dict]:
+        try:
+            return self._text(query, max_results)
+        except Exception as exc:
+            # duckduckgo-search and ddgs both name it RatelimitException.
+            if type(exc).__name__ == "RatelimitException":
+                raise ProviderThrottled(self.name) from exc
+            raise
+
+    def _text(self, query: str, max_results: int) -> List[Dict]:
+        with DDGS() as ddgs:
+            return [
+                _result(
+                    result.get("href") or result.get("link"),
+                    query,
+                    self.name,
+                    result.get("title"),
+                    result.get("body"),
+                )
+                for result in ddgs.text(query, max_results=max_results)
+                if result.get("href") or result.get("link")
+            ]
+
+
+class _HTMLSearchProvider(SearchProvider):
+    """Scrapes result links from a search page with the shared aiohttp session."""
+
+    link_pattern = _BING_LINK
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        concurrency: Optional[int] = None,
+        scheduler: Optional[DomainRateLimiter] = None,
+        cache: Optional[SearchCache] = None,
+    ):
+        super().__init__(concurrency, scheduler, cache)
+        self.session = session
+
+    def search_url(self, query: str, max_results: int) -> str:
+        raise NotImplementedError
+
+    async def _search(self, query: str, max_results: int) -> List[Dict]:
+        headers = {"User-Agent": config.USER_AGENT}
+        async with self.session.get(
+            self.search_url(query, max_results),
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=15),
+        ) as response:
+            if response.status in (429, 503):
+                raise ProviderThrottled(
+                    self.name, parse_retry_after(response.headers.get("Retry-After"))
+                )
+            if response.status != 200:
+                raise aiohttp.ClientResponseError(
+                    response.request_info, (), status=response.status, message="search failed"
+                )
+            html = await response.text()
+        # Result pages mix results with navigation links; callers filter them.
+        urls = dict.fromkeys(unescape(url) for url in self.link_pattern.findall(html))
+        return [_result(url, query, self.name) for url in urls]
+
+
+class BingProvider(_HTMLSearchProvider):
+    name = "bing"
+
+    def search_url(self, query: str, max_results: int) -> str:
+        return f"https://www.bing.com/search?q={quote_plus(query)}&count={max_results}"
+
+
+class ScholarProvider(_HTMLSearchProvider):
+    name = "scholar"
+    link_pattern = _SCHOLAR_LINK
+
+    def search_url(self, query: str, max_results: int) -> str:
+        return f"https://scholar.google.com/scholar?q={quote_plus(query)}&hl=en&num=10"
+
+
+class FixtureProvider(SearchProvider):
+    """Canned results: ``{"query": ["url", ...]}`` from a dict, JSON file or callable.
+
+    Queries missing from the fixture return no results. ``latency`` simulates
+    a slow provider.
+    """
+
+    name = "fixture"
+
+    def __init__(
+        self,
+        fixture: Union[Dict[str, List[str]], Path, str, Callable[[str], List[str]]],
+        concurrency: Optional[int] = None,
+        latency: float = 0.0,
+        scheduler: Optional[DomainRateLimiter] = None,
+        cache: Optional[SearchCache] = None,
+    ):
+        super().__init__(concurrency, scheduler, cache)
+        if isinstance(fixture, (str, Path)):
+            path = Path(fixture)
+            if not path.is_absolute():
+                path = config.PROJECT_ROOT / path
+            fixture = json.loads(path.read_text(encoding="utf-8"))
+        self.fixture = fixture
+        self.latency = latency
+
+    async def _search(self, query: str, max_results: int) -> List[Dict]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if callable(self.fixture):
+            urls = self.fixture(query)
+        else:
+            urls = self.fixture.get(query, [])
+        return [_result(url, query, self.name) for url in urls[:max_results]]
+
+
+def make_providers(
+    session: aiohttp.ClientSession,
+    executor: Executor,
+    scheduler: Optional[DomainRateLimiter] = None,
+    cache: Optional[SearchCache] = None,
+) -> Dict[str, SearchProvider]:
+    """Providers enabled in the ``discovery`` config, keyed by name.
+
+    All providers share one scheduler; live providers also share ``cache``
+    (fixture results are read fresh every run).
+    """
+    scheduler = scheduler or make_scheduler()
+    if config.DISCOVERY_FIXTURE_FILE:
+        return {"fixture": FixtureProvider(config.DISCOVERY_FIXTURE_FILE, scheduler=scheduler)}
+    providers: Dict[str, SearchProvider] = {}
+    if config.DISCOVERY_ENABLE_DUCKDUCKGO:
+        if DDGS is None:
+            logger.warning("duckduckgo-search is not installed; DuckDuckGo search disabled")
+        else:
+            providers["duckduckgo"] = DuckDuckGoProvider(executor, scheduler=scheduler, cache=cache)
+    if config.DISCOVERY_ENABLE_BING:
+        providers["bing"] = BingProvider(session, scheduler=scheduler, cache=cache)
+    if config.DISCOVERY_ENABLE_SCHOLAR:
+        providers["scholar"] = ScholarProvider(session, scheduler=scheduler, cache=cache)
+    return providers
@@ -1,8 +1,16 @@
 """
 Basic URL discovery using DuckDuckGo.
+
+Queries for all topics run through one thread pool. A single dispatcher
+loop paces them with the shared provider scheduler, so worker threads never
+sleep and throughput is bounded by the DuckDuckGo quota alone. Results are
+cached on disk (``SearchCache``), so a re-run only searches new queries.
+Each finished topic is appended to the discovery stream for the crawler.
 """
 import json
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Dict, List, Optional
 import logging
@@ -13,10 +21,15 @@ try:
 except ImportError:
     from ddgs import DDGS
 
-from concurrent.futures import ThreadPoolExecutor
-
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 import config
+from crawlers.rate_limiter import DomainRateLimiter
+from crawlers.discovery_stream import DiscoveryStream
+from crawlers.urls import canonicalize_url, url_key
+from discovery.search_cache import CacheKey, SearchCache
+from discovery.search_providers import ProviderThrottled, make_scheduler
+
+PROVIDER = "duckduckgo"
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +57,7 @@ def build_search_queries(topic_name: str, keywords: List[str]) -> List[str]:
 
 
 def search_duckduckgo(query: str, max_results: int) -> List[Dict]:
+    """Results for ``query``; raises on failure (``ProviderThrottled`` when rate limited)."""
     try:
         ddgs = DDGS()
         results = []
@@ -61,15 +75,38 @@ def search_duckduckgo(query: str, max_results: int) -> List[Dict]:
             )
 
         logger.info("  Found %d results", len(results))
-        time.sleep(config.DISCOVERY_QUERY_DELAY)
         return results
 
     except Exception as exc:
-        logger.error("DuckDuckGo search error for '%s': %s", query, exc)
-        return []
+        if type(exc).__name__ == "RatelimitException":
+            raise ProviderThrottled(PROVIDER) from exc
+        raise
+
+
+def collect_results(topic: Dict, results: List[Dict], seen_urls: set, all_urls: List[Dict]) -> None:
+    for result in results:
+        url = result.get("url")
+        if not url:
+            continue
+        key = url_key(url)
+        if key not in seen_urls:
+            seen_urls.add(key)
+            all_urls.append(
+                {
+                    "url": canonicalize_url(url),
+                    "title": result.get("title"),
+                    "snippet": result.get("snippet"),
+                    "query": result.get("query"),
+                    "topic_id": topic["id"],
+                    "topic_name": topic["name"],
+                    "priority": 50,
+                }
+            )
 
 
-def discover_urls_for_topic(topic: Dict, max_queries: int = 8) -> List[Dict]:
+def discover_urls_for_topic(
+    topic: Dict, max_queries: int = 8, scheduler: Optional[DomainRateLimiter] = None
+) -> List[Dict]:
     logger.info("Discovering URLs for: %s", topic["name"])
 
     all_urls: List[Dict] = []
@@ -78,23 +115,24 @@ def discover_urls_for_topic(topic: Dict, max_queries: int = 8) -> List[Dict]:
     queries = build_search_queries(topic["name"], topic.get("keywords", []))
     queries = queries[:max_queries]
 
+    scheduler = scheduler or make_scheduler()
     for query in queries:
-        results = search_duckduckgo(query, max_results=config.DISCOVERY_MAX_RESULTS)
-        for result in results:
-            url = result.get("url")
-            if url and url not in seen_urls:
-                seen_urls.add(url)
-                all_urls.append(
-                    {
-                        "url": url,
-                        "title": result.get("title"),
-                        "snippet": result.get("snippet"),
-                        "query": result.get("query"),
-                        "topic_id": topic["id"],
-                        "topic_name": topic["name"],
-                        "priority": 50,
-                    }
-                )
+        for attempt in range(config.DISCOVERY_MAX_RETRIES + 1):
+            # Also waits out any back-off from an earlier throttled attempt.
+            time.sleep(max(0.0, scheduler.reserve(PROVIDER)))
+            try:
+                results = search_duckduckgo(query, max_results=config.DISCOVERY_MAX_RESULTS)
+            except ProviderThrottled as exc:
+                delay = scheduler.backoff(PROVIDER, exc.retry_after)
+                if attempt < config.DISCOVERY_MAX_RETRIES:
+                    logger.warning("Throttled on '%s'; pausing %.1fs", query, delay)
+                    continue
+                logger.error("Giving up on '%s' after throttling", query)
+            except Exception as exc:
+                logger.error("DuckDuckGo search error for '%s': %s", query, exc)
+            else:
+                collect_results(topic, results, seen_urls, all_urls)
+            break
 
     logger.info("  Discovered %d unique URLs", len(all_urls))
     return all_urls
@@ -112,36 +150,115 @@ def discover_all_urls(output_file: Optional[Path] = None):
 
     all_discoveries = {}
     total_urls = 0
-
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        future_to_topic = {
-            executor.submit(discover_urls_for_topic, topic, 5): topic
-            for topic in config.TECHNOLOGIES
+    max_workers = 20
+    scheduler = make_scheduler()
+    stream = DiscoveryStream()
+
+    pending = deque()
+    remaining: Dict[int, int] = {}
+    found: Dict[int, List[Dict]] = {}
+    seen: Dict[int, set] = {}
+    topics = {topic["id"]: topic for topic in config.TECHNOLOGIES}
+    for topic in config.TECHNOLOGIES:
+        queries = build_search_queries(topic["name"], topic.get("keywords", []))[:5]
+        pending.extend((topic["id"], query, 0) for query in queries)
+        remaining[topic["id"]] = len(queries)
+        found[topic["id"]] = []
+        seen[topic["id"]] = set()
+
+    def finish(topic_id: int) -> None:
+        nonlocal total_urls
+        topic = topics[topic_id]
+        urls = found.pop(topic_id)
+        all_discoveries[topic_id] = {
+            "topic_name": topic["name"],
+            "urls": urls,
+            "count": len(urls),
         }
+        total_urls += len(urls)
+        stream.write(
+            {"tech_id": topic_id, "tech_name": topic["name"], "urls": urls, "count": len(urls)}
+        )
+        logger.info("  %s: discovered %d unique URLs", topic["name"], len(urls))
+        if len(all_discoveries) % 10 == 0:
+            logger.info(
+                "Progress: %d/%d topics, %d total URLs",
+                len(all_discoveries),
+                len(config.TECHNOLOGIES),
+                total_urls,
+            )
 
-        for index, future in enumerate(future_to_topic):
-            topic = future_to_topic[future]
-            try:
-                urls = future.result()
-                all_discoveries[topic["id"]] = {
-                    "topic_name": topic["name"],
-                    "urls": urls,
-                    "count": len(urls),
-                }
-                total_urls += len(urls)
-
-                if (index + 1) % 10 == 0:
-                    output_file.write_text(json.dumps(all_discoveries, indent=2))
-                    logger.info(
-                        "Progress: %d/%d topics, %d total URLs",
-                        index + 1,
-                        len(config.TECHNOLOGIES),
-                        total_urls,
-                    )
-
-            except Exception as exc:
-                logger.error("Error discovering URLs for %s: %s", topic["name"], exc)
+    def complete(job, results: List[Dict]) -> None:
+        topic_id = job[0]
+        collect_results(topics[topic_id], results, seen[topic_id], found[topic_id])
+        remaining[topic_id] -= 1
+        if not remaining[topic_id]:
+            finish(topic_id)
+
+    # A topic without queries is finished now; no search will complete it.
+    for topic_id, count in list(remaining.items()):
+        if not count:
+            finish(topic_id)
+
+    # Only this loop waits for quota; worker threads run searches back to back.
+    # Cached queries complete without a search, and a query already in flight
+    # for another topic is shared rather than re-issued.
+    max_results = config.DISCOVERY_MAX_RESULTS
+    cache = SearchCache() if config.DISCOVERY_CACHE_TTL > 0 else None
+    waiting: Dict[CacheKey, List] = {}
+    shared = 0
+    with stream, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            timeout = None
+            while pending and len(running) < max_workers:
+                job = pending[0]
+                key = SearchCache.key(PROVIDER, job[1], max_results)
+                if key in waiting:
+                    waiting[key].append(pending.popleft())
+                    shared += 1
+                    continue
+                cached = cache.get(PROVIDER, job[1], max_results) if cache else None
+                if cached is not None:
+                    complete(pending.popleft(), cached)
+                    continue
+                delay = scheduler.try_reserve(PROVIDER)
+                if delay > 0:
+                    timeout = delay
+                    break
+                waiting[key] = [pending.popleft()]
+                running[executor.submit(search_duckduckgo, job[1], max_results)] = key
+            if not running:
+                if timeout:
+                    time.sleep(timeout)
                 continue
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                jobs = waiting.pop(running.pop(future))
+                _, query, attempt = jobs[0]
+                try:
+                    results = future.result()
+                except ProviderThrottled as exc:
+                    delay = scheduler.backoff(PROVIDER, exc.retry_after)
+                    if attempt < config.DISCOVERY_MAX_RETRIES:
+                        logger.warning("Throttled on '%s'; pausing %.1fs", query, delay)
+                        pending.extendleft((job[0], query, attempt + 1) for job in jobs)
+                        continue
+                    logger.error("Giving up on '%s' after throttling", query)
+                    results = []
+                except Exception as exc:
+                    logger.error("DuckDuckGo search error for '%s': %s", query, exc)
+                    results = []
+                else:
+                    if cache:
+                        cache.put(PROVIDER, query, max_results, results)
+                for job in jobs:
+                    complete(job, results)
+
+    if cache:
+        stats = cache.stats()
+        cache.close()
+        logger.info("Search cache: %d hits, %d shared in flight", stats["hits"], shared)
 
     output_file.write_text(json.dumps(all_discoveries, indent=2))
 
@@ -0,0 +1,61 @@
+"""
+Text splitting for RAG indexing.
+
+Documents are cut into chunks of about ``chunk_size`` characters that end at
+a paragraph, sentence or word boundary where one is close enough, with
+``chunk_overlap`` characters carried over so a passage split across two
+chunks is still retrievable from either.
+"""
+import re
+import sys
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+_WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+# Preferred split points, best first.
+_BOUNDARIES = ("\n\n", ". ", "? ", "! ", "\n", "; ", ", ", " ")
+
+
+def normalize_text(text: str) -> str:
+    text = _WHITESPACE.sub(" ", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _split_point(text: str, start: int, end: int, min_size: int) -> int:
+    for boundary in _BOUNDARIES:
+        position = text.rfind(boundary, start + min_size, end)
+        if position != -1:
+            return position + len(boundary)
+    return end
+
+
+def chunk_text(
+    text: str, chunk_size: int = config.CHUNK_SIZE, chunk_overlap: int = config.CHUNK_OVERLAP
+) -> List[str]:
+    """Split ``text`` into overlapping chunks of at most ``chunk_size`` characters."""
+    text = normalize_text(text)
+    if not text:
+        return []
+    chunk_size = max(chunk_size, 1)
+    chunk_overlap = min(max(chunk_overlap, 0), chunk_size // 2)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            end = _split_point(text, start, end, chunk_size // 2)
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - chunk_overlap, start + 1)
+        # Start the overlap on a word boundary.
+        space = text.find(" ", start, end)
+        if chunk_overlap and space != -1:
+            start = space + 1
+    return chunks
@@ -0,0 +1,363 @@
+"""
+Hybrid search over the RAG index built by ``rag_indexer.py``.
+
+FAISS shards are memory-mapped read-only, so a cold start maps files
+instead of reading every vector into RAM, and the embedding model is loaded
+only for the first semantic query. BM25 comes from the index's FTS5 table.
+Hybrid mode fuses the two rankings with reciprocal rank fusion (RRF), which
+needs no score normalization. Query embeddings are kept in an LRU cache, and
+results can be limited to topics or categories from ``config.TECHNOLOGIES``.
+
+Usage:
+    python indexing/query_vectordb.py "deep learning techniques"
+    python indexing/query_vectordb.py --mode keyword --topic 3 "neural network"
+    python indexing/query_vectordb.py --serve 8080
+"""
+import argparse
+import asyncio
+import json
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from indexing.vector_store import Embedder
+
+SEARCH_MODES = ("hybrid", "semantic", "keyword")
+RRF_K = 60
+# Flat-index codes are only memory-mapped with the IFC flag (faiss >= 1.10);
+# plain IO_FLAG_MMAP still reads them into RAM.
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def resolve_topics(
+    topics: Sequence = (), categories: Sequence[str] = ()
+) -> Optional[FrozenSet[int]]:
+    """Topic ids matching the given ids/names or categories; None means no filter."""
+    if not topics and not categories:
+        return None
+    wanted = {str(topic).lower() for topic in topics}
+    wanted_categories = {category.lower() for category in categories}
+    selected = frozenset(
+        topic["id"]
+        for topic in config.TECHNOLOGIES
+        if str(topic["id"]) in wanted
+        or topic["name"].lower() in wanted
+        or (topic.get("category") or "").lower() in wanted_categories
+    )
+    if not selected:
+        raise ValueError(f"No configured topic matches {sorted(wanted | wanted_categories)}")
+    return selected
+
+
+def fts_query(text: str) -> str:
+    """An FTS5 MATCH expression OR-ing the query's terms, safe for any input."""
+    terms = dict.fromkeys(token.lower() for token in _TOKEN.findall(text))
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = RRF_K) -> Dict[int, float]:
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+class HybridSearcher:
+    """Read-only searcher over a vector store directory; safe to share between threads."""
+
+    def __init__(
+        self,
+        directory: Path = config.VECTOR_DB_DIR,
+        embedder: Optional[Embedder] = None,
+        cache_size: int = 1024,
+        mmap: bool = True,
+    ):
+        self.directory = Path(directory)
+        db_path = self.directory / "index.db"
+        if not db_path.exists():
+            raise FileNotFoundError(f"No index at {self.directory}; run indexing/rag_indexer.py")
+        self.conn = sqlite3.connect(
+            f"file:{db_path}?mode=ro", uri=True, timeout=30, check_same_thread=False
+        )
+        self.lock = threading.Lock()
+        self.model_name = self._meta("model")
+        flags = _MMAP_FLAGS if mmap else 0
+        self.shards = [
+            faiss.read_index(str(self.directory / row[0]), flags)
+            for row in self.conn.execute("SELECT name FROM shards ORDER BY created_at")
+        ]
+        self._embedder = embedder
+        self.cache_size = cache_size
+        self._embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._selectors: "OrderedDict[FrozenSet[int], faiss.IDSelector]" = OrderedDict()
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+        self.shards = []
+
+    @property
+    def vectors(self) -> int:
+        return sum(shard.ntotal for shard in self.shards)
+
+    def embed(self, query: str) -> np.ndarray:
+        """Query embedding, from the LRU cache when the query was seen recently."""
+        key = " ".join(query.lower().split())
+        with self.lock:
+            vector = self._embeddings.get(key)
+            if vector is not None:
+                self._embeddings.move_to_end(key)
+                self.embedding_hits += 1
+                return vector
+        if self._embedder is None:
+            self._embedder = Embedder(self.model_name or config.EMBEDDING_MODEL)
+        vector = self._embedder.encode([query])
+        with self.lock:
+            self.embedding_misses += 1
+            self._embeddings[key] = vector
+            if len(self._embeddings) > self.cache_size:
+                self._embeddings.popitem(last=False)
+        return vector
+
+    def _selector(self, topic_ids: FrozenSet[int]) -> faiss.IDSelector:
+        with self.lock:
+            selector = self._selectors.get(topic_ids)
+            if selector is not None:
+                self._selectors.move_to_end(topic_ids)
+                return selector
+            marks = ", ".join("?" for _ in topic_ids)
+            ids = np.fromiter(
+                (
+                    row[0]
+                    for row in self.conn.execute(
+                        "SELECT c.id FROM chunks c JOIN document_topics t "
+                        f"ON t.content_hash = c.content_hash WHERE t.topic_id IN ({marks})",
+                        sorted(topic_ids),
+                    )
+                ),
+                dtype=np.int64,
+            )
+            selector = faiss.IDSelectorBatch(ids)
+            self._selectors[topic_ids] = selector
+            if len(self._selectors) > 32:
+                self._selectors.popitem(last=False)
+            return selector
+
+    def semantic(
+        self, query: str, k: int, topic_ids: Optional[FrozenSet[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Top ``k`` ``(chunk_id, cosine)`` pairs across all shards."""
+        if not self.shards:
+            return []
+        vector = self.embed(query)
+        params = None
+        if topic_ids is not None:
+            params = faiss.SearchParameters(sel=self._selector(topic_ids))
+        hits: List[Tuple[int, float]] = []
+        for shard in self.shards:
+            scores, ids = shard.search(vector, min(k, shard.ntotal), params=params)
+            hits.extend(
+                (int(chunk_id), float(score))
+                for chunk_id, score in zip(ids[0], scores[0])
+                if chunk_id != -1
+            )
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:k]
+
+    def keyword(
+        self, query: str, k: int, topic_ids: Optional[FrozenSet[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Top ``k`` ``(chunk_id, bm25)`` pairs; higher is better."""
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = "SELECT chunks_fts.rowid, bm25(chunks_fts) AS score FROM chunks_fts"
+        params: List = [match]
+        if topic_ids is not None:
+            marks = ", ".join("?" for _ in topic_ids)
+            sql += (
+                " JOIN chunks c ON c.id = chunks_fts.rowid WHERE chunks_fts MATCH ? AND EXISTS ("
+                "SELECT 1 FROM document_topics t WHERE t.content_hash = c.content_hash "
+                f"AND t.topic_id IN ({marks}))"
+            )
+            params.extend(sorted(topic_ids))
+        else:
+            sql += " WHERE chunks_fts MATCH ?"
+        sql += " ORDER BY score LIMIT ?"
+        params.append(k)
+        with self.lock:
+            # FTS5's bm25() is negative, more negative meaning more relevant.
+            return [(row[0], -row[1]) for row in self.conn.execute(sql, params)]
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = "hybrid",
+        topics: Sequence = (),
+        categories: Sequence[str] = (),
+        candidates: Optional[int] = None,
+    ) -> List[Dict]:
+        """Search the index; hybrid mode fuses ``candidates`` hits from each ranking."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode!r} (use {', '.join(SEARCH_MODES)})")
+        topic_ids = resolve_topics(topics, categories)
+        semantic: List[Tuple[int, float]] = []
+        keyword: List[Tuple[int, float]] = []
+        if mode == "hybrid":
+            depth = candidates or max(k * 4, 50)
+            semantic = self.semantic(query, depth, topic_ids)
+            keyword = self.keyword(query, depth, topic_ids)
+            fused = reciprocal_rank_fusion(
+                [[chunk_id for chunk_id, _ in semantic], [chunk_id for chunk_id, _ in keyword]]
+            )
+            ranked = sorted(fused.items(), key=lambda item: -item[1])[:k]
+        elif mode == "semantic":
+            ranked = semantic = self.semantic(query, k, topic_ids)
+        else:
+            ranked = keyword = self.keyword(query, k, topic_ids)
+
+        semantic_rank = {chunk_id: rank for rank, (chunk_id, _) in enumerate(semantic, start=1)}
+        keyword_rank = {chunk_id: rank for rank, (chunk_id, _) in enumerate(keyword, start=1)}
+        details = self._chunk_details([chunk_id for chunk_id, _ in ranked])
+        results = []
+        for chunk_id, score in ranked:
+            detail = details.get(chunk_id)
+            if detail is None:
+                continue
+            detail.update(
+                score=round(score, 6),
+                semantic_rank=semantic_rank.get(chunk_id),
+                keyword_rank=keyword_rank.get(chunk_id),
+            )
+            results.append(detail)
+        return results
+
+    def _chunk_details(self, chunk_ids: List[int]) -> Dict[int, Dict]:
+        if not chunk_ids:
+            return {}
+        marks = ", ".join("?" for _ in chunk_ids)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT c.id, c.chunk_index, f.text, d.content_hash, d.url, d.title, "
+                "d.topic_id, d.topic_name FROM chunks c "
+                "JOIN chunks_fts f ON f.rowid = c.id "
+                "JOIN documents d ON d.content_hash = c.content_hash "
+                f"WHERE c.id IN ({marks})",
+                chunk_ids,
+            ).fetchall()
+        return {
+            row[0]: {
+                "chunk_id": row[0],
+                "chunk_index": row[1],
+                "text": row[2],
+                "content_hash": row[3],
+                "url": row[4],
+                "title": row[5],
+                "topic_id": row[6],
+                "topic_name": row[7],
+            }
+            for row in rows
+        }
+
+
+def search_app(searcher: HybridSearcher):
+    """aiohttp app answering ``GET /search?q=...&k=&mode=&topic=&category=`` with JSON."""
+    from aiohttp import web
+
+    # One search thread: SQLite reads are serialized anyway and the loop stays free.
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+
+    async def handle(request: web.Request) -> web.Response:
+        query = request.query.get("q", "")
+        if not query:
+            raise web.HTTPBadRequest(text="missing q")
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                executor,
+                lambda: searcher.search(
+                    query,
+                    k=int(request.query.get("k", 10)),
+                    mode=request.query.get("mode", "hybrid"),
+                    topics=request.query.getall("topic", []),
+                    categories=request.query.getall("category", []),
+                ),
+            )
+        except ValueError as exc:
+            raise web.HTTPBadRequest(text=str(exc))
+        return web.json_response({"query": query, "results": results})
+
+    async def shutdown(app: web.Application) -> None:
+        executor.shutdown(wait=True)
+
+    app = web.Application()
+    app.router.add_get("/search", handle)
+    app.on_cleanup.append(shutdown)
+    return app
+
+
+def serve(searcher: HybridSearcher, host: str, port: int) -> None:
+    """Serve ``search_app`` until interrupted."""
+    from aiohttp import web
+
+    web.run_app(search_app(searcher), host=host, port=port)
+
+
+def print_results(results: List[Dict]) -> None:
+    for rank, result in enumerate(results, start=1):
+        print(f"{rank:2d}. [{result['score']:.4f}] {result['title'] or result['url']}")
+        print(f"    {result['url']}  ({result['topic_name']})")
+        snippet = " ".join(result["text"].split())
+        print(f"    {snippet[:200]}{'...' if len(snippet) > 200 else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the RAG index")
+    parser.add_argument("query", nargs="?", help="Search query")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="hybrid")
+    parser.add_argument("-k", "--top-k", type=int, default=10, help="Number of results")
+    parser.add_argument(
+        "--topic", action="append", default=[], help="Topic id or name to search in (repeatable)"
+    )
+    parser.add_argument(
+        "--category", action="append", default=[], help="Topic category to search in (repeatable)"
+    )
+    parser.add_argument("--index", type=Path, default=config.VECTOR_DB_DIR, help="Index directory")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Run as an HTTP search service")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    searcher = HybridSearcher(args.index)
+    if args.serve:
+        serve(searcher, args.host, args.serve)
+    elif not args.query:
+        parser.error("a query is required unless --serve is given")
+    else:
+        hits = searcher.search(
+            args.query, k=args.top_k, mode=args.mode, topics=args.topic, categories=args.category
+        )
+        if args.json:
+            print(json.dumps(hits, indent=2, ensure_ascii=False))
+        else:
+            print_results(hits)
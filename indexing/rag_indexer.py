@@ -0,0 +1,207 @@
+"""
+Incremental RAG indexer for crawl results.
+
+Streams records from the result sink (``results.db`` or JSONL), skips
+content hashes that are already indexed, chunks the new documents and embeds
+them in large CPU batches into the vector store. Re-running over a grown
+crawl only embeds what is new.
+
+Usage:
+    python indexing/rag_indexer.py --input crawl_data/results.db --batch-size 10000
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+from crawlers.result_sink import read_results
+from indexing.document_chunker import chunk_text
+from indexing.vector_store import Embedder, VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Records checked against the manifest per query.
+LOOKUP_BATCH = 500
+
+
+class RAGIndexer:
+    """Chunks and embeds crawl results that are not yet in the vector store."""
+
+    def __init__(
+        self,
+        store: VectorStore,
+        embedder: Embedder,
+        batch_size: int = config.INDEX_BATCH_SIZE,
+        chunk_size: int = config.CHUNK_SIZE,
+        chunk_overlap: int = config.CHUNK_OVERLAP,
+    ):
+        self.store = store
+        self.embedder = embedder
+        self.batch_size = max(1, batch_size)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._documents: List[Dict] = []
+        self._chunks: List[Tuple[str, int, str]] = []
+        # Topics of repeated records, written once their first copy is indexed.
+        self._topics: List[Tuple[str, int]] = []
+        self.stats = {"read": 0, "indexed": 0, "skipped": 0, "chunks": 0}
+
+    def _new_records(self, records: Iterable[Dict]) -> Iterable[Dict]:
+        """Records with text whose content hash is not indexed yet, first copy only.
+
+        The topics of later copies are kept for ``_add_topics``.
+        """
+        queued = set()
+        group: List[Dict] = []
+
+        def drain(group: List[Dict]) -> Iterable[Dict]:
+            seen = self.store.seen([record["content_hash"] for record in group])
+            self.store.add_topics(
+                (record["content_hash"], record["topic_id"])
+                for record in group
+                if record["content_hash"] in seen and record.get("topic_id") is not None
+            )
+            for record in group:
+                content_hash = record["content_hash"]
+                if content_hash in seen or content_hash in queued:
+                    self.stats["skipped"] += 1
+                    if content_hash in queued and record.get("topic_id") is not None:
+                        self._topics.append((content_hash, record["topic_id"]))
+                    continue
+                queued.add(content_hash)
+                yield record
+
+        for record in records:
+            self.stats["read"] += 1
+            if not record.get("text") or record.get("duplicate_of"):
+                self.stats["skipped"] += 1
+                continue
+            group.append(record)
+            if len(group) >= LOOKUP_BATCH:
+                yield from drain(group)
+                group = []
+        if group:
+            yield from drain(group)
+
+    def index(self, records: Iterable[Dict]) -> Dict[str, int]:
+        started = time.perf_counter()
+        for record in self._new_records(records):
+            chunks = chunk_text(record["text"], self.chunk_size, self.chunk_overlap)
+            if not chunks:
+                self.stats["skipped"] += 1
+                continue
+            self._documents.append(record)
+            self._chunks.extend(
+                (record["content_hash"], position, chunk) for position, chunk in enumerate(chunks)
+            )
+            # Batches end on document boundaries so a document is committed whole.
+            if len(self._chunks) >= self.batch_size:
+                self._embed_batch()
+        self._embed_batch()
+        self._add_topics()
+        # Left over: repeats of documents that had no text to index.
+        self._topics = []
+        self.store.flush()
+        self.stats["seconds"] = round(time.perf_counter() - started, 1)
+        return self.stats
+
+    def _embed_batch(self) -> None:
+        if not self._chunks:
+            return
+        started = time.perf_counter()
+        vectors = self.embedder.encode([text for _, _, text in self._chunks])
+        self.store.add(self._documents, self._chunks, vectors)
+        self._add_topics()
+        elapsed = time.perf_counter() - started
+        self.stats["indexed"] += len(self._documents)
+        self.stats["chunks"] += len(self._chunks)
+        logger.info(
+            "Indexed %d documents / %d chunks (%.0f chunks/s); %d documents so far",
+            len(self._documents),
+            len(self._chunks),
+            len(self._chunks) / elapsed if elapsed else 0.0,
+            self.stats["indexed"],
+        )
+        self._documents = []
+        self._chunks = []
+
+
+    def _add_topics(self) -> None:
+        """Record the topics of repeated records whose first copy is now indexed."""
+        if not self._topics:
+            return
+        indexed = self.store.seen([content_hash for content_hash, _ in self._topics])
+        self.store.add_topics(pair for pair in self._topics if pair[0] in indexed)
+        self._topics = [pair for pair in self._topics if pair[0] not in indexed]
+
+
+def default_input() -> Path:
+    return config.RESULTS_DB if config.RESULTS_SINK == "sqlite" else config.PROCESSED_DIR
+
+
+def run(
+    input_path: Path,
+    output_dir: Path = config.VECTOR_DB_DIR,
+    batch_size: int = config.INDEX_BATCH_SIZE,
+    model_name: str = config.EMBEDDING_MODEL,
+    merge: bool = False,
+    embedder: Optional[Embedder] = None,
+) -> Dict[str, int]:
+    embedder = embedder or Embedder(model_name)
+    with VectorStore(output_dir, model_name=embedder.model_name, dim=embedder.dim) as store:
+        stats = RAGIndexer(store, embedder, batch_size=batch_size).index(read_results(input_path))
+        if merge:
+            store.merge_shards()
+        stats.update(store.stats())
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=getattr(logging, config.LOG_LEVEL),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Index crawl results for RAG search")
+    parser.add_argument(
+        "--input",
+        type=Path,
+        default=None,
+        help="results.db, a JSONL file or a directory of JSONL files (default: crawl output)",
+    )
+    parser.add_argument("--output", type=Path, default=config.VECTOR_DB_DIR, help="Index directory")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=config.INDEX_BATCH_SIZE,
+        help="Chunks embedded and committed per batch",
+    )
+    parser.add_argument(
+        "--model", default=config.EMBEDDING_MODEL, help="Sentence-transformers model name"
+    )
+    parser.add_argument(
+        "--merge", action="store_true", help="Merge all FAISS shards into one afterwards"
+    )
+    args = parser.parse_args()
+    result = run(
+        args.input or default_input(),
+        output_dir=args.output,
+        batch_size=args.batch_size,
+        model_name=args.model,
+        merge=args.merge,
+    )
+    logger.info(
+        "Done: %d read, %d indexed, %d skipped, %d chunks in %.1fs; index holds %d documents, "
+        "%d vectors in %d shards",
+        result["read"],
+        result["indexed"],
+        result["skipped"],
+        result["chunks"],
+        result["seconds"],
+        result["documents"],
+        result["vectors"],
+        result["shards"],
+    )
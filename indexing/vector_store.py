@@ -0,0 +1,343 @@
+"""
+Vector and keyword index for RAG retrieval.
+
+Chunk embeddings live in FAISS shards: every indexing run appends new
+``IndexIDMap2(IndexFlatIP)`` shard files instead of rewriting one monolithic
+index, so the cost of a run scales with the new data. Chunk text, document
+metadata and the manifest of indexed content hashes live in a SQLite
+database next to the shards, with an FTS5 table providing incremental BM25
+keyword search (unlike ``rank_bm25``, which rebuilds over the whole corpus).
+A shard is recorded only after its file is fully written; chunks from an
+interrupted run are rolled back on the next open and re-indexed.
+"""
+import logging
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    topic_id INTEGER,
+    topic_name TEXT,
+    timestamp TEXT,
+    chunk_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_topics (
+    content_hash TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    PRIMARY KEY (content_hash, topic_id)
+);
+CREATE INDEX IF NOT EXISTS idx_document_topics_topic ON document_topics (topic_id);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_hash TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    shard TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks (content_hash);
+CREATE INDEX IF NOT EXISTS idx_chunks_shard ON chunks (shard);
+CREATE TABLE IF NOT EXISTS shards (
+    name TEXT PRIMARY KEY,
+    vectors INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, tokenize = 'porter unicode61');
+"""
+
+_SQL_VARIABLES = 500
+
+
+def _batches(items: Sequence, size: int = _SQL_VARIABLES) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class Embedder:
+    """Sentence-transformers encoder returning L2-normalized float32 vectors."""
+
+    def __init__(
+        self,
+        model_name: str = config.EMBEDDING_MODEL,
+        device: str = config.EMBEDDING_DEVICE,
+        batch_size: int = config.EMBEDDING_BATCH_SIZE,
+    ):
+        # Imported here: loading torch takes seconds and keyword-only use never needs it.
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+class VectorStore:
+    """FAISS shards plus a SQLite chunk, manifest and BM25 (FTS5) index."""
+
+    def __init__(
+        self,
+        directory: Path = config.VECTOR_DB_DIR,
+        model_name: Optional[str] = None,
+        dim: Optional[int] = None,
+        shard_max_vectors: int = 500_000,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.shard_max_vectors = shard_max_vectors
+        self.conn = sqlite3.connect(
+            str(self.directory / "index.db"), isolation_level=None, timeout=30
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.model_name = self._meta("model", model_name)
+        stored_dim = self._meta("dim", str(dim) if dim else None)
+        self.dim = int(stored_dim) if stored_dim else None
+        self._pending: Optional[faiss.IndexIDMap2] = None
+        self._recover()
+
+    def _meta(self, key: str, value: Optional[str]) -> Optional[str]:
+        """Read a meta value, storing ``value`` first if the key is unset."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            if value is not None:
+                self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, value))
+            return value
+        if value is not None and row[0] != value:
+            raise ValueError(
+                f"Index at {self.directory} was built with {key}={row[0]!r}, not {value!r}; "
+                "use a different index directory"
+            )
+        return row[0]
+
+    def _recover(self) -> None:
+        # Chunks not yet in a written shard belong to an interrupted run:
+        # forget their documents so the next run indexes them again.
+        hashes = [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT DISTINCT content_hash FROM chunks WHERE shard IS NULL"
+            )
+        ]
+        if not hashes:
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "DELETE FROM chunks_fts WHERE rowid IN (SELECT id FROM chunks WHERE shard IS NULL)"
+            )
+            self.conn.execute("DELETE FROM chunks WHERE shard IS NULL")
+            for batch in _batches(hashes):
+                marks = ", ".join("?" for _ in batch)
+                self.conn.execute(f"DELETE FROM documents WHERE content_hash IN ({marks})", batch)
+                self.conn.execute(
+                    f"DELETE FROM document_topics WHERE content_hash IN ({marks})", batch
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        logger.warning("Rolled back %d documents from an interrupted indexing run", len(hashes))
+
+    def close(self) -> None:
+        if self.conn:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def seen(self, content_hashes: Sequence[str]) -> Set[str]:
+        """The subset of ``content_hashes`` already indexed."""
+        found: Set[str] = set()
+        for batch in _batches(list(content_hashes)):
+            marks = ", ".join("?" for _ in batch)
+            found.update(
+                row[0]
+                for row in self.conn.execute(
+                    f"SELECT content_hash FROM documents WHERE content_hash IN ({marks})", batch
+                )
+            )
+        return found
+
+    def add_topics(self, pairs: Iterable[Tuple[str, int]]) -> None:
+        """Record that indexed documents also belong to other topics."""
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO document_topics (content_hash, topic_id) VALUES (?, ?)",
+            [(content_hash, int(topic_id)) for content_hash, topic_id in pairs],
+        )
+
+    def add(
+        self,
+        documents: List[Dict],
+        chunks: List[Tuple[str, int, str]],
+        vectors: np.ndarray,
+    ) -> None:
+        """Index whole documents: their metadata, ``(content_hash, index, text)`` chunks
+        and one embedding per chunk.
+        """
+        if len(chunks) != len(vectors):
+            raise ValueError(f"{len(chunks)} chunks but {len(vectors)} vectors")
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self._meta("dim", str(self.dim))
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Vectors have {vectors.shape[1]} dimensions, index has {self.dim}")
+
+        counts: Dict[str, int] = {}
+        for content_hash, _, _ in chunks:
+            counts[content_hash] = counts.get(content_hash, 0) + 1
+        now = time.time()
+        ids = []
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for document in documents:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO documents (content_hash, url, title, topic_id, "
+                    "topic_name, timestamp, chunk_count, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        document["content_hash"],
+                        document.get("final_url") or document["url"],
+                        document.get("title"),
+                        document.get("topic_id"),
+                        document.get("topic_name"),
+                        document.get("timestamp"),
+                        counts.get(document["content_hash"], 0),
+                        now,
+                    ),
+                )
+                if document.get("topic_id") is not None:
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO document_topics (content_hash, topic_id) "
+                        "VALUES (?, ?)",
+                        (document["content_hash"], int(document["topic_id"])),
+                    )
+            for content_hash, chunk_index, text in chunks:
+                chunk_id = self.conn.execute(
+                    "INSERT INTO chunks (content_hash, chunk_index) VALUES (?, ?)",
+                    (content_hash, chunk_index),
+                ).lastrowid
+                self.conn.execute(
+                    "INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)", (chunk_id, text)
+                )
+                ids.append(chunk_id)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        if self._pending is None:
+            self._pending = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        self._pending.add_with_ids(
+            np.ascontiguousarray(vectors, dtype=np.float32), np.asarray(ids, dtype=np.int64)
+        )
+        if self._pending.ntotal >= self.shard_max_vectors:
+            self.flush()
+
+    def flush(self) -> Optional[str]:
+        """Write buffered vectors as a new shard; returns its name."""
+        if self._pending is None or self._pending.ntotal == 0:
+            return None
+        name = f"{time.time_ns():016x}-{os.getpid()}.faiss"
+        self._write_index(self._pending, name)
+        vectors = self._pending.ntotal
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "INSERT INTO shards (name, vectors, created_at) VALUES (?, ?, ?)",
+                (name, vectors, time.time()),
+            )
+            self.conn.execute("UPDATE chunks SET shard = ? WHERE shard IS NULL", (name,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self._pending = None
+        logger.info("Wrote shard %s (%d vectors)", name, vectors)
+        return name
+
+    def _write_index(self, index: faiss.Index, name: str) -> None:
+        path = self.directory / name
+        tmp_path = path.with_name(f"{name}.tmp")
+        faiss.write_index(index, str(tmp_path))
+        os.replace(tmp_path, path)
+
+    def shard_paths(self) -> List[Path]:
+        return [
+            self.directory / row[0]
+            for row in self.conn.execute("SELECT name FROM shards ORDER BY created_at")
+        ]
+
+    def merge_shards(self) -> int:
+        """Rewrite all shards as one (reads every vector); returns the vector count."""
+        self.flush()
+        paths = self.shard_paths()
+        if len(paths) <= 1:
+            return sum(faiss.read_index(str(path)).ntotal for path in paths)
+        merged = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        for path in paths:
+            shard = faiss.read_index(str(path))
+            ids = faiss.vector_to_array(shard.id_map).astype(np.int64)
+            merged.add_with_ids(shard.index.reconstruct_n(0, shard.ntotal), ids)
+        name = f"{time.time_ns():016x}-{os.getpid()}.faiss"
+        self._write_index(merged, name)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("DELETE FROM shards")
+            self.conn.execute(
+                "INSERT INTO shards (name, vectors, created_at) VALUES (?, ?, ?)",
+                (name, merged.ntotal, time.time()),
+            )
+            self.conn.execute("UPDATE chunks SET shard = ?", (name,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        for path in paths:
+            path.unlink(missing_ok=True)
+        logger.info("Merged %d shards into %s (%d vectors)", len(paths), name, merged.ntotal)
+        return merged.ntotal
+
+    def stats(self) -> Dict[str, int]:
+        documents = self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        shards, vectors = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(vectors), 0) FROM shards"
+        ).fetchone()
+        return {
+            "documents": documents,
+            "vectors": vectors + (self._pending.ntotal if self._pending is not None else 0),
+            "shards": shards,
+        }
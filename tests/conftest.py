@@ -0,0 +1,76 @@
+"""
+Shared test setup.
+
+``config`` reads ``CRAWLER_CONFIG`` once, at import, and its constants are
+the default arguments of most classes, so a scratch configuration (output
+under a temp directory, no rate limiting, no process pool) is installed
+here before any project module is imported. Tests that need their own
+database pass explicit paths under ``tmp_path``.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+_SCRATCH = Path(tempfile.mkdtemp(prefix="crawler_tests_"))
+_CONFIG = {
+    "output_dir": str(_SCRATCH / "out"),
+    "concurrency": 10,
+    "rate_limit": 0.0,
+    "timeout": 10,
+    "max_retries": 2,
+    "backoff_factor": 1,
+    "log_level": "WARNING",
+    "offload": {"cpu_workers": 0},
+    "dedup": {"near_duplicates": "off"},
+    "results": {"batch_size": 500, "flush_interval_seconds": 5},
+    "distributed": {"heartbeat_seconds": 0.2, "lease_seconds": 10},
+    "discovery": {
+        "fixture_file": str(_SCRATCH / "search_fixture.json"),
+        "per_query_delay_seconds": 0,
+        "max_queries_per_topic": 2,
+    },
+    "topics": [
+        {"id": 1, "name": "Machine Learning", "keywords": ["neural networks"]},
+        {"id": 2, "name": "Data Engineering", "keywords": ["data pipelines"]},
+    ],
+}
+(_SCRATCH / "crawler_config.yaml").write_text(json.dumps(_CONFIG), encoding="utf-8")
+os.environ["CRAWLER_CONFIG"] = str(_SCRATCH / "crawler_config.yaml")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+
+@pytest.fixture
+def page_html():
+    def render(title: str, body: str = "neural networks and deep learning") -> str:
+        return f"<html><head><title>{title}</title></head><body><p>{body}</p></body></html>"
+
+    return render
+
+
+@pytest_asyncio.fixture
+async def serve():
+    """Start an aiohttp app on a free local port; returns its base URL."""
+    runners = []
+
+    async def start(app: web.Application) -> str:
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        runners.append(runner)
+        return f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    yield start
+    for runner in runners:
+        await runner.cleanup()
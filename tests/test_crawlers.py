@@ -0,0 +1,1099 @@
+"""
+Tests for the crawler: frontier, scheduling, URL handling, result storage,
+checkpoints and the async fetch path against local aiohttp servers.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+from concurrent.futures import Future
+from contextlib import closing
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import config
+from crawlers import distributed, pipeline
+from crawlers.async_crawler import (
+    AsyncCrawler,
+    crawl_all_topics,
+    crawl_topics,
+    queue_discovered,
+    reset_crawl_state,
+)
+from crawlers.checkpoint import CrawlCheckpoint
+from crawlers.discovery_stream import DiscoveryStream, iter_records, load_discovered
+from crawlers.dedup import NearDuplicateIndex, simhash
+from crawlers.distributed import ShardCoordinator, ShardScheduler, crawl_distributed
+from crawlers.frontier import URLFrontier
+from crawlers.host_concurrency import OK, THROTTLED, TIMEOUT, AdaptiveHostLimiter
+from crawlers.html_analysis import analyze_html
+from crawlers.http_body import BodyRejected, decode_body, document_type, read_body
+from crawlers import keyword_matcher
+from crawlers.keyword_matcher import KeywordMatcher, RelevanceScorer, score_relevance
+from crawlers.link_expander import LinkExpander
+from crawlers.offload import LoopLagMonitor, Offloader, process_page
+from crawlers.rate_limiter import DomainRateLimiter
+from crawlers.result_sink import JSONLResultSink, SQLiteResultSink, merge_results, read_results
+from crawlers.scheduler import TopicScheduler
+from crawlers.smart_cache import SmartCache
+from crawlers.storage import FileStore, SegmentStore
+from crawlers import url_filter
+from crawlers.url_filter import ALLOW, DENY, PRIORITY, URLFilter
+from crawlers.urls import canonicalize_url, domain_shard, url_key
+from discovery.enhanced_url_discovery import EnhancedURLDiscovery
+
+TOPIC = {"id": 1, "name": "Machine Learning", "keywords": ["neural networks"]}
+
+
+def queue(frontier, urls, topic=TOPIC, **fields):
+    return frontier.add_many(
+        {"url": url, "topic_id": topic["id"], "topic_name": topic["name"], **fields}
+        for url in urls
+    )
+
+
+def record(url, topic_id=1):
+    return {
+        "url": url,
+        "topic_name": "Machine Learning",
+        "content_hash": url[-8:],
+        "timestamp": "2024-01-01T00:00:00",
+        "content": "text",
+    }, topic_id
+
+
+@pytest.fixture
+def frontier(tmp_path):
+    with URLFrontier(tmp_path / "queue.db", max_attempts=2) as frontier:
+        yield frontier
+
+
+@pytest.fixture
+def fresh_output():
+    """Empty the configured output directory for tests that use the default paths."""
+    for path in config.BASE_DIR.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path != config.LOG_FILE:
+            path.unlink()
+    for directory in (config.RAW_DATA_DIR, config.PROCESSED_DIR, config.CACHE_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+
+
+def page_app(page_html, status_for=None, hits=None):
+    async def page(request):
+        if hits is not None:
+            hits.append(request.path)
+        if status_for is not None:
+            response = status_for(request)
+            if response is not None:
+                return response
+        return web.Response(text=page_html(request.path), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{path:.*}", page)
+    return app
+
+
+# Frontier
+
+
+def test_frontier_claims_by_priority_and_ignores_other_spellings(frontier):
+    queue(frontier, ["http://a.com/low"], priority=0.1)
+    queue(frontier, ["http://a.com/high"], priority=0.9)
+    assert queue(frontier, ["https://www.a.com/high/", "http://a.com/high#top"]) == 0
+
+    batch = frontier.pop_batch(1)
+    assert [item["url"] for item in batch] == ["http://a.com/high"]
+    assert batch[0]["attempts"] == 1
+    assert frontier.counts()["in_flight"] == 1
+    assert frontier.counts()["pending"] == 1
+
+
+def test_frontier_defer_returns_url_without_spending_an_attempt(frontier):
+    queue(frontier, ["http://a.com/x"])
+    (item,) = frontier.pop_batch(10)
+    frontier.defer([item["id"]], 60)
+
+    assert frontier.pop_batch(10) == []
+    assert frontier.next_eligible_at() > time.time() + 50
+    attempts = frontier.conn.execute("SELECT attempts FROM frontier").fetchone()[0]
+    assert attempts == 0
+
+
+def test_frontier_fails_urls_once_out_of_attempts(frontier):
+    queue(frontier, ["http://a.com/x", "http://a.com/rejected"])
+    first, rejected = frontier.pop_batch(10)
+
+    assert frontier.mark_failed([first["id"]], error="boom") == 0
+    assert frontier.mark_failed([rejected["id"]], error="binary", retry=False) == 1
+    frontier.conn.execute("UPDATE frontier SET next_eligible = 0")
+    (retry,) = frontier.pop_batch(10)
+    assert retry["attempts"] == 2
+    assert frontier.mark_failed([retry["id"]], error="boom") == 1
+    assert frontier.counts()["failed"] == 2
+
+
+def test_frontier_rolls_back_a_failed_update(frontier):
+    queue(frontier, ["http://a.com/x", "http://a.com/y"])
+    first, second = frontier.pop_batch(10)
+
+    def ids():
+        yield first["id"]
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        frontier.mark_done(ids())
+    assert not frontier.conn.in_transaction
+    assert frontier.counts()["done"] == 0
+    frontier.mark_done([second["id"]])
+    assert frontier.counts()["done"] == 1
+
+
+def test_frontier_recomputes_shards_when_the_count_changes(tmp_path):
+    hosts = [f"site{i}.example.com" for i in range(20)]
+    with URLFrontier(tmp_path / "queue.db", shards=4) as frontier:
+        queue(frontier, [f"http://{host}/" for host in hosts])
+    with URLFrontier(tmp_path / "queue.db", shards=16) as frontier:
+        rows = frontier.conn.execute("SELECT domain, shard FROM frontier").fetchall()
+        stored = frontier.conn.execute("SELECT value FROM meta WHERE key = 'shards'").fetchone()
+    assert stored == ("16",)
+    assert all(shard == domain_shard(domain, 16) for domain, shard in rows)
+
+
+# URLs and HTML
+
+
+def test_canonical_url_keeps_the_fetched_spelling():
+    url = "HTTP://Example.com:80/a/./b/?z=1&flag&utm_source=x#frag"
+    assert canonicalize_url(url) == "http://example.com/a/b/?z=1&flag"
+    assert url_key(url) == "example.com/a/b?flag=&z=1"
+    assert url_key("https://www.example.com/a/b?flag=&z=1") == url_key(url)
+
+    # Order and repeated slashes can matter to a server: fetched as written, keyed as one.
+    url = "http://example.com/v1//items/../list?b=2&a=1&b=1"
+    assert canonicalize_url(url) == "http://example.com/v1//list?b=2&a=1&b=1"
+    assert url_key(url) == url_key("http://example.com/v1/list/?a=1&b=1&b=2")
+    assert canonicalize_url("http://example.com/a/b/../..") == "http://example.com/"
+
+
+def test_near_duplicates_are_found_per_topic_and_reset_on_fresh_runs(tmp_path, fresh_output):
+    text = " ".join(f"word{i} neural networks training data" for i in range(200))
+    edited = text.replace("word7 ", "changed ")
+    page = {"url": "http://a.com/1", "content_hash": "h1", "simhash": simhash(text)}
+    copy = {"url": "http://b.com/1", "content_hash": "h2", "simhash": simhash(edited)}
+    other = {"url": "http://c.com/1", "content_hash": "h3", "simhash": simhash("unrelated " * 50)}
+    assert simhash("too short") is None
+
+    dedup = NearDuplicateIndex()
+    try:
+        assert dedup.check(1, page) is None
+        assert dedup.check(1, page) is None  # a re-fetch is not a duplicate
+        assert dedup.check(1, copy)["url"] == "http://a.com/1"
+        assert dedup.check(2, copy) is None
+        assert dedup.check(1, other) is None
+
+        with URLFrontier(tmp_path / "queue.db") as frontier:
+            queue(frontier, ["http://a.com/1"])
+            reset_crawl_state(frontier)
+            assert frontier.counts()["pending"] == 0
+        assert dedup.find(1, page["simhash"]) is None
+    finally:
+        dedup.close()
+
+
+def test_analyze_html_separates_block_elements():
+    analysis = analyze_html(
+        "<html><body><div>P1<p>neural networks</p><p>deep <b>lear</b>ning</p>"
+        "<a href='/next'>Next page</a></div></body></html>",
+        "http://example.com/dir/",
+    )
+    assert analysis["text"] == "P1 neural networks deep learning Next page"
+    assert analysis["links"] == [("http://example.com/next", "Next page")]
+
+
+@pytest.mark.parametrize("min_patterns", [1, 10_000])
+def test_keyword_counts_match_str_count(monkeypatch, min_patterns):
+    if min_patterns == 1 and keyword_matcher.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    monkeypatch.setattr(keyword_matcher, "AUTOMATON_MIN_PATTERNS", min_patterns)
+    patterns = ["aa", "a", "neural", "neural network", "network", "Design", "missing"]
+    matcher = KeywordMatcher(patterns + ["aa"])
+    assert (matcher._automaton is not None) == (min_patterns == 1)
+
+    text = "aaaa neural network design, neural networks and network design"
+    assert matcher.count(text).tolist() == [text.count(p.lower()) for p in patterns]
+    assert matcher.count("").tolist() == [0] * len(patterns)
+
+
+def test_relevance_scores_every_topic_in_one_pass():
+    topics = [["neural networks", "training"], ["data pipelines"], []]
+    scorer = RelevanceScorer(topics)
+    texts = [
+        "neural networks design: training neural networks, performance manual",
+        "data pipelines " * 20,
+        "",
+    ]
+    scores = scorer.score_matrix(texts)
+    assert scores.shape == (3, 3)
+    for row, text in enumerate(texts):
+        assert scores[row].tolist() == pytest.approx(
+            [score_relevance(text, keywords) for keywords in topics]
+        )
+    assert scores[0, 0] == pytest.approx(0.1 + 0.05 + 0.15)
+    assert scores[1, 1] == pytest.approx(0.3)
+
+
+@pytest.mark.parametrize("automaton", [True, False])
+def test_url_filter_classifies(monkeypatch, automaton):
+    if not automaton:
+        monkeypatch.setattr(url_filter, "ahocorasick", None)
+    elif url_filter.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    urls = URLFilter(
+        exclude_domains=["spam.com"],
+        priority_domains=["arxiv.org", "example.org/docs"],
+        max_plain_length=60,
+    )
+    cases = {
+        "https://api.spam.com/paper": DENY,
+        "https://notspam.com/": ALLOW,
+        "https://arxiv.org/abs/1234": PRIORITY,
+        "https://example.org/docs/intro": PRIORITY,
+        "https://example.com/login?next=/paper": DENY,
+        "https://example.com/static/site.css": DENY,
+        "https://example.com/" + "x" * 80: DENY,
+        "https://example.com/" + "x" * 80 + "/design-guide": ALLOW,
+    }
+    assert urls.classify(cases).tolist() == list(cases.values())
+    assert urls.allowed(cases) == [url for url, verdict in cases.items() if verdict != DENY]
+
+
+@pytest.mark.asyncio
+async def test_offloader_parses_in_workers_and_survives_a_broken_pool():
+    offload = Offloader(cpu_workers=1, io_workers=1)
+    try:
+        html = "<html><head><title>T</title></head><body><p>neural networks</p></body></html>"
+        page = await offload.run_cpu(process_page, html, "http://a.com/", ["neural networks"])
+        assert page == process_page(html, "http://a.com/", ["neural networks"])
+        assert await offload.run_cpu(os.getpid) != os.getpid()
+
+        for process in list(offload._cpu_pool._processes.values()):
+            process.kill()
+            process.join()
+        assert await offload.run_cpu(os.getpid) == os.getpid()
+        assert offload._cpu_pool is None
+    finally:
+        offload.close()
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_sees_a_blocked_loop():
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    time.sleep(0.2)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    assert monitor.stats()["max_ms"] >= 100
+
+
+# Rate limiting and scheduling
+
+
+def test_try_reserve_never_books_a_future_slot():
+    now = [100.0]
+    limiter = DomainRateLimiter(default_interval=1.0, burst=1, clock=lambda: now[0])
+    assert limiter.try_reserve("a.com") <= 0
+    assert limiter.try_reserve("a.com") == pytest.approx(1.0)
+    assert limiter.try_reserve("a.com") == pytest.approx(1.0)
+    now[0] += 1.0
+    assert limiter.try_reserve("a.com") <= 0
+    assert limiter.backoff("a.com", 30) == 30
+    assert limiter.try_reserve("a.com") == pytest.approx(30)
+
+
+@pytest.mark.asyncio
+async def test_host_limit_grows_on_fast_responses_and_halves_on_congestion():
+    now = [0.0]
+    limiter = AdaptiveHostLimiter(
+        initial=2,
+        minimum=1,
+        maximum=8,
+        latency_target=1.0,
+        error_threshold=0.1,
+        window=20,
+        decrease_factor=0.5,
+        cooldown=10,
+        clock=lambda: now[0],
+    )
+
+    await limiter.acquire("a.com")
+    await limiter.acquire("a.com")
+    third = asyncio.ensure_future(limiter.acquire("a.com"))
+    await asyncio.sleep(0)
+    assert not third.done()
+    limiter.release("a.com", 0.1, OK)
+    await third
+    limiter.release("a.com", 0.1, OK)
+    assert limiter.stats()["a.com"]["limit"] == 3
+
+    for _ in range(3):
+        limiter.release("a.com", 0.1, OK)
+    assert limiter.stats()["a.com"]["limit"] == 4
+    # p95 latency over target: healthy completions no longer raise the limit.
+    for _ in range(8):
+        limiter.release("a.com", 5.0, OK)
+    assert limiter.stats()["a.com"]["limit"] == 4
+
+    limiter.release("a.com", 0.1, THROTTLED)
+    limiter.release("a.com", 0.1, TIMEOUT)
+    assert limiter.stats()["a.com"]["limit"] == 2
+    now[0] += 10
+    limiter.release("a.com", 0.1, TIMEOUT)
+    limiter.release("a.com", 0.1, TIMEOUT)
+    assert limiter.stats()["a.com"]["limit"] == 1
+
+
+def test_scheduler_skips_pending_urls_once_the_budget_is_spent(frontier):
+    queue(frontier, [f"http://a.com/{i}" for i in range(5)])
+    scheduler = TopicScheduler(frontier, [TOPIC], quantum=1, budgets={1: 2})
+
+    claimed = scheduler.pop_batch(10)
+    assert len(claimed) == 2
+    frontier.mark_done([item["id"] for item in claimed])
+    assert scheduler.pop_batch(10) == []
+    assert frontier.counts()["skipped"] == 3
+    assert scheduler.next_eligible_at() is None
+
+    # Links found by pages that were in flight when the budget ran out.
+    queue(frontier, ["http://a.com/late"])
+    assert scheduler.pop_batch(10) == []
+    assert frontier.counts()["pending"] == 0
+
+
+def test_scheduler_interleaves_topics_by_weight(frontier):
+    other = {"id": 2, "name": "Data Engineering", "weight": 2.0}
+    queue(frontier, [f"http://a.com/{i}" for i in range(30)])
+    queue(frontier, [f"http://b.com/{i}" for i in range(30)], topic=other)
+    scheduler = TopicScheduler(frontier, [TOPIC, other], quantum=1)
+
+    topics = [item["topic_id"] for item in scheduler.pop_batch(30)]
+    assert topics.count(2) == 2 * topics.count(1)
+
+
+def test_shards_are_dealt_out_by_pending_work(tmp_path):
+    with ShardCoordinator(tmp_path / "coordinator.db", shards=4) as coordinator:
+        coordinator.reset()
+        coordinator.assign(["w0", "w1"], {0: 10, 1: 5, 2: 5})
+        assert coordinator.owned("w0") == {0, 3}
+        assert coordinator.owned("w1") == {1, 2}
+        assert coordinator.release("w0") == [0, 3]
+        assert coordinator.owned("w0") == set()
+
+
+def test_idle_workers_steal_from_the_busiest_and_take_over_expired_shards(tmp_path):
+    hosts = {}
+    for i in range(100):
+        hosts.setdefault(domain_shard(f"site{i}.com", 4), f"site{i}.com")
+    with URLFrontier(tmp_path / "queue.db", shards=4) as frontier, ShardCoordinator(
+        tmp_path / "coordinator.db", shards=4
+    ) as coordinator:
+        for shard, size in zip(range(4), (4, 3, 2, 1)):
+            queue(frontier, [f"http://{hosts[shard]}/{i}" for i in range(size)])
+        coordinator.reset()
+        coordinator.assign(["w1"], frontier.pending_by_shard())
+        for worker in ("w1", "w2", "w3"):
+            coordinator.register(worker)
+
+        # Half of w1's backlog, largest shards first.
+        assert coordinator.steal("w2", frontier) == [0, 1]
+        assert coordinator.owned("w1") == {2, 3}
+
+        frontier.pop_batch(1, shards=[2])
+        coordinator.conn.execute("UPDATE shards SET lease_until = 0 WHERE owner = 'w1'")
+        assert sorted(coordinator.steal("w3", frontier)) == [2, 3]
+        assert frontier.counts()["in_flight"] == 0
+        assert frontier.pending_by_shard()[2] == 2
+        steals = {worker["worker_id"]: worker["steals"] for worker in coordinator.workers()}
+        assert steals == {"w1": 0, "w2": 2, "w3": 2}
+
+        frontier.pop_batch(10, shards=[0, 1, 2, 3])
+        assert coordinator.steal("w1", frontier) == []
+
+
+def test_shard_scheduler_stops_when_its_heartbeat_dies(tmp_path, frontier):
+    with ShardCoordinator(tmp_path / "coordinator.db", shards=4) as coordinator:
+        coordinator.reset()
+        coordinator.assign(["w1"], {})
+        coordinator.register("w1")
+        scheduler = ShardScheduler(frontier, [TOPIC], coordinator, "w1")
+        assert scheduler.shards == {0, 1, 2, 3}
+        beat = Future()
+        beat.set_exception(OSError("database is locked"))
+        scheduler.heartbeat = beat
+        with pytest.raises(RuntimeError, match="heartbeat"):
+            scheduler.pop_batch(10)
+        with pytest.raises(RuntimeError, match="heartbeat"):
+            scheduler.next_eligible_at()
+
+
+# Result sinks and checkpoints
+
+
+def test_result_sink_writes_in_batches(tmp_path):
+    sink = SQLiteResultSink(tmp_path / "results.db", batch_size=2, flush_interval=3600)
+    sink.add(*record("http://a.com/1"))
+    assert sink.written == 0
+    sink.add(*record("http://a.com/2"))
+    assert sink.written == 2
+    sink.add(*record("http://a.com/3"))
+    assert len(list(read_results(tmp_path / "results.db"))) == 2
+    sink.close()
+    assert [row["url"] for row in read_results(tmp_path / "results.db")] == [
+        "http://a.com/1",
+        "http://a.com/2",
+        "http://a.com/3",
+    ]
+
+
+def test_result_sink_flushes_after_the_interval(tmp_path):
+    with JSONLResultSink(tmp_path / "jsonl", batch_size=100, flush_interval=0) as sink:
+        sink.add(*record("http://a.com/1", topic_id=7))
+        assert sink.written == 1
+    lines = (tmp_path / "jsonl" / "topic_007.jsonl").read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[0])["url"] == "http://a.com/1"
+
+    with SQLiteResultSink(tmp_path / "merged.db") as merged:
+        assert merge_results(tmp_path / "jsonl", merged) == 1
+    assert [row["topic_id"] for row in read_results(tmp_path / "merged.db")] == [7]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = CrawlCheckpoint(tmp_path / "checkpoint.json", interval=3600)
+    checkpoint.save()
+    checkpoint.record_progress(completed=1)
+    checkpoint.record_progress(failed=1)
+    checkpoint.mark_topic_complete(3)
+
+    loaded = CrawlCheckpoint.load(tmp_path / "checkpoint.json")
+    assert loaded.completed_topics == [3]
+    assert (loaded.completed_urls, loaded.failed_urls) == (1, 1)
+    assert "in_flight" not in json.loads((tmp_path / "checkpoint.json").read_text())
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    (tmp_path / "checkpoint.json").write_text("{not json", encoding="utf-8")
+    assert CrawlCheckpoint.load(tmp_path / "checkpoint.json") is None
+
+
+# Page cache
+
+
+def test_cache_survives_reopen_and_expires(tmp_path):
+    with closing(SmartCache(tmp_path / "cache", ttl=3600)) as cache:
+        content_hash = cache.put("http://a.com/", "<p>page</p>", etag='"v1"')
+        cache.put("http://a.com/old", "<p>old</p>", ttl=-1)
+        cache.conn.execute("UPDATE entries SET expires_at = 1 WHERE url = 'http://a.com/old'")
+
+    with closing(SmartCache(tmp_path / "cache", ttl=3600)) as cache:
+        assert cache.get_with_hash("http://a.com/") == ("<p>page</p>", content_hash)
+        assert cache.get("http://a.com/old") is None
+        stale = cache.lookup("http://a.com/old")
+        assert stale["fresh"] is False
+        assert cache.refresh("http://a.com/old", ttl=60)["content"] == "<p>old</p>"
+        assert cache.get("http://a.com/old") == "<p>old</p>"
+        assert cache.stats()["revalidated"] == 1
+
+
+def test_cache_evicts_least_recently_used_and_shares_blobs(tmp_path):
+    page = "x" * 999
+    with closing(SmartCache(tmp_path / "cache", ttl=0, max_bytes=3500, eviction="lru")) as cache:
+        shared = cache.put("http://a.com/1", page + "-1")
+        cache.put("http://b.com/1", page + "-1")
+        cache.put("http://a.com/2", page + "-2")
+        cache.put("http://a.com/3", page + "-3")
+        assert cache.total_bytes() == 3003
+        for access, url in enumerate(["http://b.com/1", "http://a.com/1", "http://a.com/2"]):
+            cache.conn.execute("UPDATE entries SET last_access = ? WHERE url = ?", (access, url))
+
+        cache.put("http://a.com/4", page + "-4")
+        # b.com/1 alone frees nothing (its blob is shared); a.com/1 frees the blob.
+        assert cache.stats()["evictions"] == 2
+        assert cache.total_bytes() == 3003
+        assert not cache.store.exists(shared)
+        assert cache.get("http://a.com/1") is None
+        assert [cache.get(f"http://a.com/{i}") for i in (2, 3, 4)] == [
+            page + "-2",
+            page + "-3",
+            page + "-4",
+        ]
+
+
+def test_segment_store_compacts_dead_segments(tmp_path):
+    blobs = {hashlib.sha256(str(i).encode()).hexdigest(): str(i).encode() * 500 for i in range(4)}
+    hashes = list(blobs)
+    # Records compress to well under 40 bytes plus a 40-byte header: two per segment.
+    store = SegmentStore(tmp_path / "segments", segment_max_bytes=80, compact_ratio=0.5)
+    for content_hash, data in blobs.items():
+        assert store.put(content_hash, data) < len(data)
+    first_segment = store._locate(hashes[0])[0]
+    assert store._locate(hashes[1])[0] == first_segment
+    assert len(list((tmp_path / "segments").glob("*.seg"))) == 2
+    store.delete(hashes[0])
+    store.close()
+
+    store = SegmentStore(tmp_path / "segments")
+    try:
+        assert not (tmp_path / "segments" / first_segment).exists()
+        assert store._locate(hashes[1])[0] != first_segment
+        assert store.get(hashes[0]) is None
+        assert [store.get(content_hash) for content_hash in hashes[1:]] == [
+            blobs[content_hash] for content_hash in hashes[1:]
+        ]
+    finally:
+        store.close()
+
+
+def test_segment_store_drains_its_fallback(tmp_path):
+    data = b"legacy page"
+    content_hash = hashlib.sha256(data).hexdigest()
+    legacy = FileStore(tmp_path)
+    legacy.put(content_hash, data)
+    store = SegmentStore(tmp_path / "segments", fallback=FileStore(tmp_path))
+    try:
+        assert store.exists(content_hash)
+        assert store.get(content_hash) == data
+        assert store.migrated == 1
+        assert not legacy.exists(content_hash)
+        assert store.get(content_hash) == data
+    finally:
+        store.close()
+
+
+def test_unknown_eviction_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="eviction"):
+        SmartCache(tmp_path / "cache", eviction="fifo")
+
+
+# Fetching
+
+
+@pytest.mark.asyncio
+async def test_concurrent_fetches_of_one_url_share_a_request(serve, page_html, tmp_path):
+    hits = []
+    base = await serve(page_app(page_html, hits=hits))
+    async with AsyncCrawler(sink=SQLiteResultSink(tmp_path / "results.db")) as crawler:
+        first, second = await asyncio.gather(
+            crawler.fetch_url(f"{base}/shared", "Machine Learning"),
+            crawler.fetch_url(f"{base.upper()}/shared#section", "Data Engineering"),
+        )
+    assert hits == ["/shared"]
+    assert first["content"] == second["content"]
+    assert (first["topic_name"], second["topic_name"]) == ("Machine Learning", "Data Engineering")
+    assert first is not second
+
+
+@pytest.mark.asyncio
+async def test_stale_pages_are_revalidated_with_their_etag(serve, page_html, tmp_path):
+    seen_headers = []
+
+    async def page(request):
+        seen_headers.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.Response(
+            text=page_html("cached"), content_type="text/html", headers={"ETag": '"v1"'}
+        )
+
+    app = web.Application()
+    app.router.add_get("/page", page)
+    base = await serve(app)
+    async with AsyncCrawler(sink=SQLiteResultSink(tmp_path / "results.db")) as crawler:
+        crawler.cache.close()
+        crawler.cache = SmartCache(tmp_path / "cache", ttl=3600)
+        first = await crawler.fetch_url(f"{base}/page", "Machine Learning")
+        fresh = await crawler.fetch_url(f"{base}/page", "Machine Learning")
+        crawler.cache.conn.execute("UPDATE entries SET expires_at = 1")
+        revalidated = await crawler.fetch_url(f"{base}/page", "Machine Learning")
+
+    assert seen_headers == [None, '"v1"']
+    assert first["from_cache"] is False
+    assert fresh["from_cache"] is True and "revalidated" not in fresh
+    assert revalidated["revalidated"] is True
+    assert revalidated["content"] == first["content"]
+    assert revalidated["content_hash"] == first["content_hash"]
+
+
+@pytest.mark.asyncio
+async def test_bodies_are_capped_and_gated_by_type(serve):
+    async def streamed(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/html"})
+        await response.prepare(request)
+        for _ in range(10):
+            await response.write(b"x" * 1000)
+        return response
+
+    bodies = {
+        "/page": web.Response(text="<p>ok</p>", content_type="text/html"),
+        "/image": web.Response(body=b"\x89PNG", content_type="image/png"),
+        "/large": web.Response(text="x" * 5000, content_type="text/plain"),
+    }
+
+    async def fixed(request):
+        return bodies[request.path]
+
+    app = web.Application()
+    app.router.add_get("/streamed", streamed)
+    app.router.add_get("/{name}", fixed)
+    base = await serve(app)
+
+    async def untyped(reader, writer):
+        # aiohttp always labels what it serves; this server sends no Content-Type.
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 8\r\nConnection: close\r\n\r\n")
+        writer.write(b"\x00\x01binary")
+        await writer.drain()
+        writer.close()
+
+    raw = await asyncio.start_server(untyped, "127.0.0.1", 0)
+    untyped_url = f"http://127.0.0.1:{raw.sockets[0].getsockname()[1]}/untyped"
+
+    async def read(path):
+        url = untyped_url if path == "/untyped" else base + path
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as response:
+                return await read_body(response, max_bytes=4000, allowed_types=["text/*"])
+
+    data, digest = await read("/page")
+    assert data == b"<p>ok</p>"
+    assert digest == hashlib.sha256(data).hexdigest()
+    for path, reason in [
+        ("/image", "content type image/png"),
+        ("/large", "Content-Length 5000"),
+        ("/streamed", "exceeds 4000 bytes"),
+        ("/untyped", "binary body"),
+    ]:
+        with pytest.raises(BodyRejected, match=reason):
+            await read(path)
+    raw.close()
+    await raw.wait_closed()
+
+
+def test_body_decoding_and_document_types():
+    assert decode_body("café".encode("utf-8")) == ("café", "utf-8")
+    assert decode_body("café".encode("cp1252")) == ("café", "cp1252")
+    meta = b"<meta charset='iso-8859-1'><p>caf\xe9</p>"
+    assert decode_body(meta) == ("<meta charset='iso-8859-1'><p>café</p>", "iso8859-1")
+    assert decode_body(b"\xe9", "text/html; charset=utf-8")[1] == "utf-8-replaced"
+    assert document_type("application/pdf", "http://a.com/x") == "application/pdf"
+    assert document_type("application/octet-stream", "http://a.com/x.PDF") == "application/pdf"
+    assert document_type("text/html", "http://a.com/x.pdf") is None
+
+
+@pytest.mark.asyncio
+async def test_rejected_responses_are_not_retried(serve, page_html, frontier, tmp_path):
+    def image(request):
+        if request.path == "/logo":
+            return web.Response(body=b"\x89PNG", content_type="image/png")
+        return None
+
+    base = await serve(page_app(page_html, image))
+    queue(frontier, [f"{base}/logo", f"{base}/page"])
+    async with AsyncCrawler(sink=SQLiteResultSink(tmp_path / "results.db")) as crawler:
+        stats = await crawler.crawl_frontier(frontier)
+
+    assert stats == {"done": 1, "failed": 0, "rejected": 1}
+    state, attempts, error = frontier.conn.execute(
+        "SELECT state, attempts, last_error FROM frontier WHERE url LIKE '%/logo'"
+    ).fetchone()
+    assert (state, attempts) == ("failed", 1)
+    assert "image/png" in error
+
+
+def pdf_bytes(text, title):
+    pypdf = pytest.importorskip("pypdf")
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = pypdf.PdfWriter()
+    page = writer.add_blank_page(300, 200)
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    page[NameObject("/Resources")] = DictionaryObject(
+        {NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})}
+    )
+    contents = DecodedStreamObject()
+    contents.set_data(f"BT /F1 12 Tf 10 100 Td ({text}) Tj ET".encode("latin-1"))
+    page[NameObject("/Contents")] = writer._add_object(contents)
+    writer.add_metadata({"/Title": title})
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_pdfs_are_streamed_to_the_cache_and_extracted(serve, frontier, tmp_path):
+    document = pdf_bytes("neural networks design guide", "Network Design")
+
+    async def paper(request):
+        # Generic type: the .pdf extension decides.
+        return web.Response(body=document, content_type="application/octet-stream")
+
+    app = web.Application()
+    app.router.add_get("/paper.pdf", paper)
+    base = await serve(app)
+    queue(frontier, [f"{base}/paper.pdf"])
+
+    crawler = AsyncCrawler(sink=SQLiteResultSink(tmp_path / "results.db"))
+    crawler.cache.close()
+    crawler.cache = SmartCache(tmp_path / "cache")
+    cache = crawler.cache
+    crawled, _ = await crawl_topics(frontier, [TOPIC], None, recursive=False, crawler=crawler)
+
+    (result,) = read_results(tmp_path / "results.db")
+    assert crawled == 1
+    assert result["content_type"] == "application/pdf"
+    assert result["text"] == "neural networks design guide"
+    assert result["title"] == "Network Design"
+    assert result["relevance"] > 0
+    assert result["content_hash"] == hashlib.sha256(document).hexdigest()
+    assert not list((tmp_path / "cache" / "incoming").iterdir())
+
+    reopened = SmartCache(tmp_path / "cache")
+    try:
+        assert reopened.read_document(result["content_hash"]) == document
+        assert reopened.get_extracted(result["content_hash"])["title"] == "Network Design"
+        assert reopened.get_entry(f"{base}/paper.pdf")["binary"] is True
+    finally:
+        reopened.close()
+    assert cache.conn is None
+
+
+@pytest.mark.asyncio
+async def test_throttled_host_is_deferred_without_spending_attempts(
+    serve, page_html, frontier, tmp_path
+):
+    hits = []
+
+    def throttle(request):
+        if request.path == "/busy":
+            return web.Response(status=429, headers={"Retry-After": "60"})
+        return None
+
+    base = await serve(page_app(page_html, throttle, hits))
+    queue(frontier, [f"{base}/busy"])
+    async with AsyncCrawler(sink=SQLiteResultSink(tmp_path / "results.db")) as crawler:
+        crawl = asyncio.ensure_future(crawler.crawl_frontier(frontier))
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.05)
+                if frontier.counts()["pending"]:
+                    break
+        finally:
+            crawl.cancel()
+            await asyncio.gather(crawl, return_exceptions=True)
+
+    assert hits == ["/busy"]
+    attempts, state, next_eligible = frontier.conn.execute(
+        "SELECT attempts, state, next_eligible FROM frontier"
+    ).fetchone()
+    assert (attempts, state) == (0, "pending")
+    assert next_eligible > time.time() + 50
+
+
+@pytest.mark.asyncio
+async def test_failed_urls_are_counted_once(serve, page_html, frontier, tmp_path):
+    def broken(request):
+        return web.Response(status=500) if request.path == "/broken" else None
+
+    base = await serve(page_app(page_html, broken))
+    queue(frontier, [f"{base}/broken", f"{base}/fine"])
+    checkpoint = CrawlCheckpoint(tmp_path / "checkpoint.json")
+    async with AsyncCrawler(sink=SQLiteResultSink(tmp_path / "results.db")) as crawler:
+        stats = await crawler.crawl_frontier(
+            frontier, checkpoint=checkpoint, on_result=lambda item, result: None
+        )
+
+    assert stats == {"done": 1, "failed": 1, "rejected": 0}
+    assert frontier.counts()["failed"] == 1
+    assert (checkpoint.completed_urls, checkpoint.failed_urls) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_results_are_stored_before_urls_are_marked_done(
+    serve, page_html, frontier, tmp_path
+):
+    base = await serve(page_app(page_html))
+    queue(frontier, [f"{base}/page/{i}" for i in range(12)])
+    urls = {item_id: url for item_id, url in frontier.conn.execute("SELECT id, url FROM frontier")}
+    stored_when_done = []
+    mark_done = frontier.mark_done
+
+    def checked_mark_done(ids):
+        ids = list(ids)
+        stored = {row["url"] for row in read_results(tmp_path / "results.db")}
+        stored_when_done.extend(urls[item_id] in stored for item_id in ids)
+        mark_done(ids)
+
+    frontier.mark_done = checked_mark_done
+    sink = SQLiteResultSink(tmp_path / "results.db", batch_size=500, flush_interval=3600)
+    async with AsyncCrawler(sink=sink) as crawler:
+
+        async def persist(item, result):
+            await crawler.offload.run_io(crawler.save_result, result, item["topic_id"])
+
+        await crawler.crawl_frontier(frontier, batch_size=5, on_result=persist)
+
+    assert len(stored_when_done) == 12 and all(stored_when_done)
+
+
+def test_link_expander_scores_and_limits_links(frontier):
+    queue(frontier, ["http://a.com/seed"])
+    (item,) = frontier.pop_batch(1)
+    expander = LinkExpander(
+        frontier,
+        max_depth=2,
+        max_pages_per_domain=3,
+        max_links_per_page=10,
+        link_policy="priority_off_site",
+        priority_domains=["arxiv.org"],
+        exclude_domains=["spam.com"],
+    )
+    result = {
+        "relevance": 0.5,
+        "links": [
+            ("http://a.com/contact", "Contact"),
+            ("http://a.com/neural-networks", "Neural networks design guide"),
+            ("http://a.com/logo.png", "neural networks"),
+            ("https://arxiv.org/abs/1", "paper"),
+            ("http://other.com/neural-networks", "neural networks"),
+            ("http://spam.com/neural-networks", "neural networks"),
+            ("http://a.com/seed#top", "self"),
+            ("http://a.com/1", "one"),
+            ("http://a.com/2", "two"),
+        ],
+    }
+    candidates = expander.candidates(item, result, TOPIC["keywords"])
+    urls = [candidate["url"] for candidate in candidates]
+    assert urls[0] == "http://a.com/neural-networks"
+    assert "https://arxiv.org/abs/1" in urls
+    assert len([url for url in urls if url.startswith("http://a.com/")]) == 2
+    assert {candidate["depth"] for candidate in candidates} == {1}
+
+    assert expander.expand(item, result, TOPIC["keywords"]) == len(candidates)
+    assert expander.candidates({**item, "depth": 2}, result, TOPIC["keywords"]) == []
+    assert expander.candidates(item, {**result, "relevance": 0.0}, TOPIC["keywords"]) == []
+
+
+@pytest.mark.asyncio
+async def test_recursive_crawl_follows_relevant_links(serve, frontier, tmp_path):
+    site = {
+        "/seed": [("/neural-networks", "neural networks"), ("/about", "about us")],
+        "/neural-networks": [("/neural-networks/deep", "neural networks in depth")],
+        "/neural-networks/deep": [("/too-deep", "neural networks")],
+        "/about": [],
+    }
+
+    async def page(request):
+        links = "".join(
+            f"<a href='{href}'>{text}</a>" for href, text in site.get(request.path, [])
+        )
+        body = f"<p>neural networks and more neural networks</p>{links}"
+        return web.Response(text=f"<html><body>{body}</body></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{path:.*}", page)
+    base = await serve(app)
+    queue_discovered(frontier, TOPIC, [f"{base}/seed"], max_urls=10, recursive=True)
+
+    crawler = AsyncCrawler(sink=SQLiteResultSink(tmp_path / "results.db"))
+    crawled, _ = await crawl_topics(frontier, [TOPIC], None, recursive=True, crawler=crawler)
+
+    rows = dict(frontier.conn.execute("SELECT url, priority FROM frontier"))
+    assert crawled == 4
+    assert sorted(rows) == sorted(f"{base}{path}" for path in site)
+    assert rows[f"{base}/neural-networks"] > rows[f"{base}/about"]
+    depths = {row["url"]: row["depth"] for row in read_results(tmp_path / "results.db")}
+    assert depths[f"{base}/neural-networks/deep"] == 2
+
+
+@pytest.mark.asyncio
+async def test_resume_requeues_in_flight_urls(serve, page_html, fresh_output):
+    base = await serve(page_app(page_html))
+    discovered = {
+        "1": {"urls": [f"{base}/ml/{i}" for i in range(4)]},
+        "2": {"urls": [{"url": f"{base}/de/{i}"} for i in range(4)]},
+    }
+    (config.BASE_DIR / "discovered_urls_enhanced.json").write_text(json.dumps(discovered))
+
+    await crawl_all_topics(max_urls_per_topic=10, recursive=False)
+    checkpoint = CrawlCheckpoint.load()
+    assert sorted(checkpoint.completed_topics) == [1, 2]
+    assert checkpoint.completed_urls == 8
+
+    # Simulate a crash while topic 2 was being crawled.
+    with URLFrontier() as frontier:
+        frontier.conn.execute("UPDATE frontier SET state = 'in_flight' WHERE topic_id = 2")
+    checkpoint.completed_topics.remove(2)
+    checkpoint.save()
+
+    await crawl_all_topics(max_urls_per_topic=10, resume=True, recursive=False)
+    with URLFrontier() as frontier:
+        assert frontier.counts()["done"] == 8
+    assert sorted(CrawlCheckpoint.load().completed_topics) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_distributed_workers_split_the_crawl(serve, page_html, fresh_output):
+    base = await serve(page_app(page_html))
+    discovered = {
+        "1": {"urls": [f"{base}/ml/{i}" for i in range(6)]},
+        "2": {"urls": [f"{base}/de/{i}" for i in range(6)]},
+    }
+    (config.BASE_DIR / "discovered_urls_enhanced.json").write_text(json.dumps(discovered))
+
+    # The coordinator blocks while the worker processes crawl this server.
+    await asyncio.to_thread(crawl_distributed, workers=2, recursive=False)
+
+    stored = sorted(row["url"] for row in read_results(config.RESULTS_DB))
+    assert stored == sorted(discovered["1"]["urls"] + discovered["2"]["urls"])
+    assert not any(config.WORKERS_DIR.iterdir())
+    with ShardCoordinator() as coordinator:
+        workers = coordinator.workers()
+        assert coordinator.active_workers() == 0
+        topics, recursive = coordinator.run_settings()
+    assert len(workers) == 2
+    assert all(worker["finished_at"] for worker in workers)
+    assert ([topic["id"] for topic in topics], recursive) == ([1, 2], False)
+    assert sum(worker["done"] for worker in workers) == 12
+    assert sorted(CrawlCheckpoint.load().completed_topics) == [1, 2]
+
+
+def test_joining_workers_crawl_the_prepared_topics(monkeypatch, fresh_output):
+    launched = []
+    monkeypatch.setattr(
+        distributed,
+        "launch_workers",
+        lambda worker_ids, topics, recursive: launched.append((topics, recursive)) or {},
+    )
+    monkeypatch.setattr(distributed, "wait_for_workers", lambda *args: None)
+    distributed.join_crawl(workers=1)
+    assert launched == []
+
+    prepared = [{"id": 2, "name": "Data Engineering", "keywords": [], "weight": 2.0}]
+    with ShardCoordinator() as coordinator:
+        coordinator.reset(prepared, recursive=True)
+    distributed.join_crawl(workers=2)
+    assert launched == [(prepared, True)]
+
+
+def test_discovery_stream_skips_a_partly_written_record(tmp_path):
+    path = tmp_path / "discovered_urls.ndjson"
+    with DiscoveryStream(path) as stream:
+        stream.write({"tech_id": 1, "urls": ["http://a.com/old"]})
+        stream.write({"tech_id": 1, "urls": ["http://a.com/new"]})
+        stream.write({"tech_id": 2, "urls": []})
+    with path.open("a", encoding="utf-8") as handle:
+        handle.write('{"tech_id": 3, "urls"')
+
+    assert len(list(iter_records(path))) == 3
+    discovered = load_discovered(path)
+    assert sorted(discovered) == ["1", "2"]
+    assert discovered["1"]["urls"] == ["http://a.com/new"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_crawls_topics_while_discovery_runs(
+    monkeypatch, serve, page_html, fresh_output
+):
+    first_page = asyncio.Event()
+
+    def hit(request):
+        if request.path.startswith("/ml/"):
+            first_page.set()
+        return None
+
+    base = await serve(page_app(page_html, hit))
+    queries = {
+        name: EnhancedURLDiscovery().create_search_queries({"name": name})
+        for name in ("Machine Learning", "Data Engineering")
+    }
+    fixture = {queries["Machine Learning"][0]: [f"{base}/ml/{i}" for i in range(3)]}
+    for query in queries["Data Engineering"]:
+        fixture[query] = [f"{base}/de/{i}" for i in range(2)]
+    (config.BASE_DIR.parent / "search_fixture.json").write_text(json.dumps(fixture))
+
+    discover_topic = EnhancedURLDiscovery.discover_urls_for_tech
+
+    async def second_topic_waits_for_the_crawl(self, tech):
+        if tech["id"] == 2:
+            # Only finishes if topic 1 is crawled before discovery is over.
+            await asyncio.wait_for(first_page.wait(), 10)
+        return await discover_topic(self, tech)
+
+    monkeypatch.setattr(
+        EnhancedURLDiscovery, "discover_urls_for_tech", second_topic_waits_for_the_crawl
+    )
+    await pipeline.discover_and_crawl(max_urls_per_topic=10)
+
+    stored = sorted(row["url"] for row in read_results(config.RESULTS_DB))
+    expected = [f"{base}/ml/{i}" for i in range(3)] + [f"{base}/de/{i}" for i in range(2)]
+    assert stored == sorted(expected)
+    assert [record["tech_id"] for record in iter_records(config.DISCOVERY_STREAM_FILE)] == [1, 2]
+    assert sorted(CrawlCheckpoint.load().completed_topics) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_reports_the_crawl_error(monkeypatch, fresh_output):
+    async def broken_crawl(*args, **kwargs):
+        raise ValueError("crawl failed")
+
+    (config.BASE_DIR.parent / "search_fixture.json").write_text("{}", encoding="utf-8")
+    monkeypatch.setattr(pipeline, "crawl_topics", broken_crawl)
+    with pytest.raises(ValueError, match="crawl failed"):
+        await pipeline.discover_and_crawl(max_urls_per_topic=5)
+
+
+@pytest.mark.asyncio
+async def test_stream_pool_stays_bounded_and_reports_failures(serve, page_html, tmp_path):
+    def broken(request):
+        return web.Response(status=500) if request.path == "/page/0" else None
+
+    base = await serve(page_app(page_html, broken))
+    workers = 2
+    produced = []
+    handled = []
+    leads = []
+
+    def items():
+        for i in range(40):
+            produced.append(i)
+            leads.append(len(produced) - len(handled))
+            yield {"url": f"{base}/page/{i}", "topic_name": "Machine Learning"}
+
+    def on_result(item, result):
+        handled.append((item["url"].rsplit("/", 1)[1], result is not None))
+
+    async with AsyncCrawler(sink=SQLiteResultSink(tmp_path / "results.db")) as crawler:
+        await crawler.crawl_stream(items(), on_result, workers=workers)
+        batch = await crawler.crawl_batch(
+            [{"url": f"{base}/batch/{i}", "topic_name": "Machine Learning"} for i in range(5)]
+        )
+
+    assert len(handled) == 40
+    assert dict(handled)["0"] is False
+    assert sum(ok for _, ok in handled) == 39
+    # Work queue, fetch workers and done queue: a few items per worker at most.
+    assert max(leads) <= 5 * workers + 2
+    assert sorted(result["url"] for result in batch) == [f"{base}/batch/{i}" for i in range(5)]
@@ -0,0 +1,280 @@
+"""
+Tests for URL discovery: provider fan-out, retries and pacing, the search
+cache and topic discovery. Providers are local stand-ins, so no search
+engine is contacted.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import config
+from crawlers.discovery_stream import iter_records
+from crawlers.rate_limiter import DomainRateLimiter
+from crawlers.url_filter import URLFilter
+from discovery import url_discovery
+from discovery.enhanced_url_discovery import EnhancedURLDiscovery
+from discovery.search_cache import SearchCache
+from discovery.search_providers import ExecutorSearchProvider, FixtureProvider, ProviderThrottled
+
+TECH = {"id": 1, "name": "Machine Learning", "keywords": ["neural networks"]}
+
+
+class Throttled(FixtureProvider):
+    """Throttled on its first ``times`` queries, then answers from the fixture."""
+
+    def __init__(self, *args, retry_after=None, times=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+        self.times = times
+
+    async def _search(self, query, max_results):
+        if self.throttled < self.times:
+            raise ProviderThrottled(self.name, self.retry_after)
+        return await super()._search(query, max_results)
+
+
+class Overlap:
+    """Counts calls in progress and the most seen at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            self.running -= 1
+
+
+class Blocking(ExecutorSearchProvider):
+    """A synchronous client taking 0.1s per query."""
+
+    def __init__(self, name, executor, concurrency, threads):
+        super().__init__(executor, concurrency)
+        self.name = name
+        self.calls = Overlap()
+        self.threads = threads
+
+    def _search_sync(self, query, max_results):
+        with self.calls, self.threads:
+            time.sleep(0.1)
+        return [{"url": f"https://{self.name}.org/{query}"}]
+
+
+@pytest.mark.asyncio
+async def test_blocking_providers_share_a_bounded_executor():
+    threads = Overlap()
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        single = Blocking("single", executor, concurrency=1, threads=threads)
+        wide = Blocking("wide", executor, concurrency=3, threads=threads)
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(provider.search(f"q{i}", 10) for i in range(4) for provider in (single, wide))
+        )
+        elapsed = time.monotonic() - started
+    finally:
+        executor.shutdown(wait=True)
+
+    assert all(len(result) == 1 for result in results)
+    assert (single.calls.most, wide.calls.most, threads.most) == (1, 2, 2)
+    # Eight 0.1s calls on two threads: in parallel, but never more than two at once.
+    assert 0.35 <= elapsed < 0.8
+
+
+@pytest.mark.asyncio
+async def test_topic_queries_fan_out_to_every_provider_and_stop_early(monkeypatch):
+    monkeypatch.setattr(config, "DISCOVERY_QUERIES_PER_TOPIC", 3)
+    discovery = EnhancedURLDiscovery()
+    queries = discovery.create_search_queries(TECH)
+
+    class Slow(FixtureProvider):
+        name = "slow"
+
+    def fast_results(query):
+        return [f"https://site{queries.index(query)}-{i}.org/paper" for i in range(10)]
+
+    fast = FixtureProvider(fast_results)
+    slow = Slow(lambda query: ["https://slow.org/paper"], concurrency=3, latency=5)
+    discovery.providers = {"fixture": fast, "slow": slow}
+
+    started = time.monotonic()
+    result = await discovery.discover_urls_for_tech(TECH)
+    assert time.monotonic() - started < 2
+    assert result["count"] == 30
+    assert "https://slow.org/paper" not in result["urls"]
+    # Every query went to both providers at once; the slow ones were cancelled.
+    assert (fast.queries, slow.queries) == (3, 3)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with SearchCache(tmp_path / "search_cache.db", ttl=3600) as cache:
+        yield cache
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_share_one_query(cache):
+    provider = FixtureProvider({"neural networks": ["https://a.com/1"]}, latency=0.1, cache=cache)
+
+    first, second = await asyncio.gather(
+        provider.search("neural networks", 10), provider.search("Neural  Networks ", 10)
+    )
+    assert first == second
+    assert provider.queries == 1
+    assert cache.stats() == {"hits": 0, "misses": 1, "shared": 1, "entries": 1}
+
+    assert await provider.search("neural networks", 10) == first
+    assert provider.queries == 1
+    assert cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_waiter_keeps_the_shared_query(cache):
+    provider = FixtureProvider({"q": ["https://a.com/1"]}, latency=0.2, cache=cache)
+
+    first = asyncio.ensure_future(provider.search("q", 10))
+    second = asyncio.ensure_future(provider.search("q", 10))
+    await asyncio.sleep(0.05)
+    first.cancel()
+    assert [result["url"] for result in await second] == ["https://a.com/1"]
+    assert first.cancelled()
+    assert cache.get("fixture", "q", 10) is not None
+
+
+def test_cached_searches_expire_and_survive_reopen(tmp_path):
+    with SearchCache(tmp_path / "search_cache.db", ttl=3600) as cache:
+        cache.put("fixture", "Neural Networks", 10, [{"url": "https://a.com/1"}])
+    with SearchCache(tmp_path / "search_cache.db", ttl=3600) as cache:
+        assert cache.get("fixture", "neural  networks", 10) == [{"url": "https://a.com/1"}]
+        assert cache.get("fixture", "neural networks", 20) is None
+        assert cache.get("other", "neural networks", 10) is None
+        cache.conn.execute("UPDATE searches SET fetched_at = fetched_at - 7200")
+        assert cache.get("fixture", "neural networks", 10) is None
+
+
+@pytest.mark.asyncio
+async def test_failed_searches_are_not_cached(cache):
+    provider = Throttled({"q": ["https://a.com/1"]}, retry_after=0, times=10, cache=cache)
+
+    assert await provider.search("q", 10) == []
+    assert (provider.queries, provider.errors) == (3, 1)
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_throttled_query_waits_before_retrying_without_a_scheduler():
+    provider = Throttled({"q": ["https://a.com/1"]}, retry_after=0.3)
+
+    started = time.monotonic()
+    results = await provider.search("q", 10)
+    assert time.monotonic() - started >= 0.25
+    assert [result["url"] for result in results] == ["https://a.com/1"]
+    assert (provider.queries, provider.throttled, provider.errors) == (2, 1, 0)
+
+
+class Other(FixtureProvider):
+    name = "other"
+
+
+@pytest.mark.asyncio
+async def test_scheduler_paces_and_backs_off_each_provider_separately():
+    scheduler = DomainRateLimiter(
+        default_interval=0, burst=1, domain_intervals={"fixture": 0.2}, priority_domains=[]
+    )
+    paced = FixtureProvider({"q": ["https://a.com/1"]}, concurrency=3, scheduler=scheduler)
+    started = time.monotonic()
+    await asyncio.gather(*(paced.search(f"q{i}", 10) for i in range(3)))
+    assert time.monotonic() - started >= 0.35
+
+    throttled = Throttled({"q": ["https://a.com/1"]}, retry_after=0.5, scheduler=scheduler)
+    other = Other({"q": ["https://b.com/1"]}, scheduler=scheduler)
+    started = time.monotonic()
+    blocked = asyncio.ensure_future(throttled.search("q", 10))
+    await asyncio.sleep(0.05)
+    assert [result["url"] for result in await other.search("q", 10)] == ["https://b.com/1"]
+    assert time.monotonic() - started < 0.45
+    assert [result["url"] for result in await blocked] == ["https://a.com/1"]
+    assert time.monotonic() - started >= 0.45
+    assert throttled.stats() == {"queries": 2, "errors": 0, "throttled": 1}
+
+
+@pytest.mark.asyncio
+async def test_topic_discovery_filters_and_ranks_urls():
+    discovery = EnhancedURLDiscovery()
+    discovery.url_filter = URLFilter(exclude_domains=["spam.com"], priority_domains=["arxiv.org"])
+    queries = discovery.create_search_queries(TECH)
+    assert len(queries) == 2
+    discovery.providers = {
+        "fixture": FixtureProvider(
+            {
+                queries[0]: [
+                    "https://example.com/guide?utm_source=feed",
+                    "https://spam.com/paper",
+                    "https://arxiv.org/abs/1",
+                ],
+                queries[1]: ["https://www.example.com/guide", "https://example.com/login"],
+            }
+        )
+    }
+
+    result = await discovery.discover_urls_for_tech(TECH)
+    assert result["urls"] == ["https://arxiv.org/abs/1", "https://example.com/guide"]
+    assert result["count"] == 2
+
+
+def duckduckgo(throttle=0, retry_after=None):
+    """Stands in for ``search_duckduckgo``: throttled on its first ``throttle`` calls."""
+    calls = []
+
+    def search(query, max_results):
+        calls.append(query)
+        if len(calls) <= throttle:
+            raise ProviderThrottled("duckduckgo", retry_after)
+        return [{"url": f"https://example.com/{len(calls)}", "query": query}]
+
+    return search, calls
+
+
+def test_single_topic_discovery_retries_throttled_queries(monkeypatch):
+    search, calls = duckduckgo(throttle=1, retry_after=0.2)
+    monkeypatch.setattr(url_discovery, "search_duckduckgo", search)
+    scheduler = DomainRateLimiter(default_interval=0, domain_intervals={}, priority_domains=[])
+
+    started = time.monotonic()
+    urls = url_discovery.discover_urls_for_topic(TECH, max_queries=2, scheduler=scheduler)
+    assert time.monotonic() - started >= 0.15
+    queries = url_discovery.build_search_queries(TECH["name"], TECH["keywords"])[:2]
+    assert calls == [queries[0]] + queries
+    assert [url["query"] for url in urls] == queries
+
+    search, calls = duckduckgo(throttle=10, retry_after=0)
+    monkeypatch.setattr(url_discovery, "search_duckduckgo", search)
+    assert url_discovery.discover_urls_for_topic(TECH, max_queries=1, scheduler=scheduler) == []
+    assert len(calls) == config.DISCOVERY_MAX_RETRIES + 1
+
+
+def test_topics_without_queries_are_still_reported(monkeypatch, tmp_path):
+    empty = {"id": 3, "name": "Empty", "keywords": []}
+    build = url_discovery.build_search_queries
+    monkeypatch.setattr(config, "TECHNOLOGIES", [TECH, empty])
+    monkeypatch.setattr(config, "DISCOVERY_CACHE_TTL", 0)
+    monkeypatch.setattr(
+        url_discovery,
+        "build_search_queries",
+        lambda name, keywords: [] if name == "Empty" else build(name, keywords),
+    )
+    monkeypatch.setattr(url_discovery, "search_duckduckgo", duckduckgo()[0])
+
+    discovered = url_discovery.discover_all_urls(tmp_path / "discovered_urls.json")
+    assert (discovered[1]["count"], discovered[3]["count"]) == (5, 0)
+    records = list(iter_records(config.DISCOVERY_STREAM_FILE))
+    assert sorted(record["tech_id"] for record in records) == [1, 3]
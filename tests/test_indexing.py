@@ -0,0 +1,226 @@
+"""
+Tests for the vector store and hybrid search. A small bag-of-words embedder
+stands in for the sentence-transformers model.
+"""
+import zlib
+
+import aiohttp
+import numpy as np
+import pytest
+
+from crawlers.result_sink import SQLiteResultSink
+from indexing.document_chunker import chunk_text
+from indexing.query_vectordb import HybridSearcher, fts_query, search_app
+from indexing.rag_indexer import run
+from indexing.vector_store import VectorStore
+
+DIM = 64
+
+
+class WordEmbedder:
+    """Hashes words into ``DIM`` buckets; texts sharing words score higher."""
+
+    model_name = "test-words"
+    dim = DIM
+
+    def __init__(self):
+        self.texts = 0
+
+    def encode(self, texts):
+        self.texts += len(texts)
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % DIM] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+def document(content_hash, topic_id, text):
+    return {
+        "content_hash": content_hash,
+        "url": f"https://example.com/{content_hash}",
+        "title": content_hash,
+        "topic_id": topic_id,
+        "topic_name": {1: "Machine Learning", 2: "Data Engineering"}[topic_id],
+    }, (content_hash, 0, text)
+
+
+def index(store, *documents):
+    documents, chunks = zip(*documents)
+    vectors = WordEmbedder().encode([text for _, _, text in chunks])
+    store.add(list(documents), list(chunks), vectors)
+
+
+def test_unflushed_documents_are_rolled_back_on_reopen(tmp_path):
+    store = VectorStore(tmp_path / "index")
+    index(store, document("a", 1, "neural networks"), document("b", 2, "data pipelines"))
+    store.flush()
+    index(store, document("c", 1, "training neural networks"))
+    assert store.seen(["a", "b", "c"]) == {"a", "b", "c"}
+    # Crash before the pending shard is written.
+    store.conn.close()
+    store.conn = None
+
+    with VectorStore(tmp_path / "index") as store:
+        assert store.seen(["a", "b", "c"]) == {"a", "b"}
+        assert store.stats() == {"documents": 2, "vectors": 2, "shards": 1}
+        chunks = store.conn.execute("SELECT COUNT(*) FROM chunks_fts").fetchone()[0]
+        assert chunks == 2
+        index(store, document("c", 1, "training neural networks"))
+    with VectorStore(tmp_path / "index") as store:
+        assert store.stats() == {"documents": 3, "vectors": 3, "shards": 2}
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    with VectorStore(tmp_path / "index") as store:
+        index(store, document("a", 1, "neural networks"))
+        with pytest.raises(ValueError, match="dimensions"):
+            store.add([], [("b", 0, "text")], np.zeros((1, DIM + 1), dtype=np.float32))
+
+
+def test_chunks_overlap_and_end_on_boundaries():
+    text = " ".join(f"Sentence number {i} is about neural networks." for i in range(40))
+    chunks = chunk_text(text, chunk_size=200, chunk_overlap=40)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split()[0] in previous
+    assert chunk_text("   \n\n  ") == []
+
+
+def write_results(path, *records):
+    with SQLiteResultSink(path) as sink:
+        for content_hash, topic_id, text in records:
+            sink.add(
+                {
+                    "url": f"https://example.com/{content_hash}/{topic_id}",
+                    "topic_name": "Machine Learning",
+                    "content_hash": content_hash,
+                    "timestamp": "2024-01-01T00:00:00",
+                    "text": text,
+                },
+                topic_id,
+            )
+
+
+def test_indexer_only_embeds_new_documents(tmp_path):
+    def write(*records):
+        write_results(tmp_path / "results.db", *records)
+
+    write(("a", 1, "neural networks " * 200), ("b", 1, "data pipelines"), ("empty", 1, ""))
+    embedder = WordEmbedder()
+    stats = run(tmp_path / "results.db", tmp_path / "index", batch_size=4, embedder=embedder)
+    assert (stats["indexed"], stats["skipped"], stats["documents"]) == (2, 1, 2)
+    assert stats["vectors"] == stats["chunks"] == embedder.texts > 2
+
+    write(("a", 2, "neural networks " * 200), ("c", 2, "stream processing"))
+    embedder = WordEmbedder()
+    stats = run(tmp_path / "results.db", tmp_path / "index", merge=True, embedder=embedder)
+    assert (stats["indexed"], stats["chunks"], embedder.texts) == (1, 1, 1)
+    assert (stats["documents"], stats["shards"]) == (3, 1)
+    with VectorStore(tmp_path / "index") as store:
+        topics = store.conn.execute(
+            "SELECT topic_id FROM document_topics WHERE content_hash = 'a' ORDER BY topic_id"
+        ).fetchall()
+    assert topics == [(1,), (2,)]
+
+
+def test_repeated_documents_keep_every_topic(tmp_path):
+    write_results(
+        tmp_path / "results.db",
+        ("a", 1, "neural networks in data pipelines"),
+        ("b", 1, "gradient descent " * 100),
+        ("a", 2, "neural networks in data pipelines"),
+        ("b", 2, "gradient descent " * 100),
+        ("blank", 1, "   "),
+        ("blank", 2, "   "),
+    )
+    # One chunk per batch: "a" is committed before its second copy is read.
+    stats = run(tmp_path / "results.db", tmp_path / "index", batch_size=1, embedder=WordEmbedder())
+    assert (stats["indexed"], stats["documents"]) == (2, 2)
+
+    with VectorStore(tmp_path / "index") as store:
+        topics = store.conn.execute(
+            "SELECT content_hash, topic_id FROM document_topics ORDER BY content_hash, topic_id"
+        ).fetchall()
+    assert topics == [("a", 1), ("a", 2), ("b", 1), ("b", 2)]
+    searcher = HybridSearcher(tmp_path / "index", embedder=WordEmbedder())
+    try:
+        hits = searcher.search("neural networks", mode="keyword", topics=["Data Engineering"])
+        assert [hit["content_hash"] for hit in hits] == ["a"]
+    finally:
+        searcher.close()
+
+
+@pytest.fixture
+def searcher(tmp_path):
+    with VectorStore(tmp_path / "index") as store:
+        index(
+            store,
+            document("ml", 1, "neural networks learn representations"),
+            document("de", 2, "data pipelines move data between systems"),
+            document("both", 2, "neural networks inside data pipelines"),
+        )
+        store.add_topics([("both", 1)])
+    searcher = HybridSearcher(tmp_path / "index", embedder=WordEmbedder())
+    yield searcher
+    searcher.close()
+
+
+@pytest.mark.parametrize("mode", ["keyword", "semantic", "hybrid"])
+def test_search_filters_by_topic(searcher, mode):
+    everything = searcher.search("neural networks data pipelines", k=10, mode=mode)
+    assert {hit["content_hash"] for hit in everything} == {"ml", "de", "both"}
+
+    ml = searcher.search("neural networks data pipelines", k=10, mode=mode, topics=[1])
+    assert {hit["content_hash"] for hit in ml} == {"ml", "both"}
+    de = searcher.search("data pipelines", k=10, mode=mode, topics=["Data Engineering"])
+    assert {hit["content_hash"] for hit in de} == {"de", "both"}
+
+
+def test_query_embeddings_are_cached(searcher):
+    first = searcher.search("Neural  networks", k=3, mode="semantic")
+    assert searcher.search("neural networks", k=3, mode="semantic") == first
+    assert (searcher.embedding_misses, searcher.embedding_hits) == (1, 1)
+
+
+def test_mapped_and_loaded_shards_agree(tmp_path, searcher):
+    loaded = HybridSearcher(tmp_path / "index", embedder=WordEmbedder(), mmap=False)
+    try:
+        for mode in ("semantic", "hybrid"):
+            assert loaded.search("data pipelines", mode=mode) == searcher.search(
+                "data pipelines", mode=mode
+            )
+    finally:
+        loaded.close()
+
+
+def test_keyword_queries_are_escaped():
+    assert fts_query('neural "networks" OR NOT data-pipelines') == (
+        '"neural" OR "networks" OR "or" OR "not" OR "data" OR "pipelines"'
+    )
+    assert fts_query("?!") == ""
+
+
+@pytest.mark.asyncio
+async def test_search_service_answers_over_http(serve, searcher):
+    base = await serve(search_app(searcher))
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            f"{base}/search", params=[("q", "neural networks"), ("k", "2"), ("topic", "1")]
+        ) as response:
+            body = await response.json()
+        async with session.get(f"{base}/search", params={"q": "x", "mode": "fuzzy"}) as bad:
+            assert bad.status == 400
+        async with session.get(f"{base}/search") as missing:
+            assert missing.status == 400
+
+    assert body["query"] == "neural networks"
+    assert len(body["results"]) == 2
+    assert {hit["content_hash"] for hit in body["results"]} == {"ml", "both"}
+
+
+def test_unknown_topic_is_an_error(searcher):
+    with pytest.raises(ValueError, match="No configured topic"):
+        searcher.search("neural networks", topics=["astronomy"])
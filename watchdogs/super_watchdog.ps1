@@ -177,10 +177,18 @@ function Start-URLDiscoveryAsync {
 }
 
 function Start-Crawler {
-    Write-Log "Starting async crawler..." "Yellow"
+    param([switch]$Resume)
+
+    $crawlerArgs = @($CrawlerScript)
+    if ($Resume) {
+        Write-Log "Starting async crawler (resuming from checkpoint)..." "Yellow"
+        $crawlerArgs += "--resume"
+    } else {
+        Write-Log "Starting async crawler..." "Yellow"
+    }
 
     $process = Start-Process -FilePath $VenvPython `
-                             -ArgumentList $CrawlerScript `
+                             -ArgumentList $crawlerArgs `
                              -WorkingDirectory $ProjectRoot `
                              -PassThru `
                              -NoNewWindow `
@@ -234,7 +242,7 @@ function Invoke-IntelligentRestart {
     }
 
     Write-Log "Restarting crawler with updated URL list..." "Green"
-    return Start-Crawler
+    return Start-Crawler -Resume
 }
 
 Write-Log "=========================================" "Green"